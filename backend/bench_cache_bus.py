@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Cache Bus Benchmark - measures how long an invalidation published by one process
+takes to reach the others over the PostgreSQL LISTEN/NOTIFY bus (cache_bus.py).
+
+    python bench_cache_bus.py                          # 1, 4 and 8 subscriber processes
+    python bench_cache_bus.py --subscribers 2 16 --messages 2000
+
+Uses the database from .env. Each subscriber process reports the latencies from
+bus.stats(), the same numbers /api/health shows for a running server.
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+
+def count_bench(received):
+    return sum(1 for payload in received if isinstance(payload, int))
+
+def subscriber(ready, done, results, messages):
+    os.environ['CACHE_BUS'] = 'postgres'
+    from cache_bus import bus
+    received = []
+    bus.subscribe('bench', lambda payload: received.append(payload))
+    # Let the listener thread connect and LISTEN before the publisher starts
+    while 'bench' not in bus.stats()['channels'] and not received:
+        bus.publish('bench', 'ping')
+        time.sleep(0.05)
+    ready.put(os.getpid())
+    done.wait()
+    deadline = time.monotonic() + 5
+    while count_bench(received) < messages and time.monotonic() < deadline:
+        time.sleep(0.01)
+    results.put((count_bench(received), bus.stats()['channels']['bench']))
+
+def run(subscribers, messages, interval):
+    """Return (messages delivered, worst subscriber latency stats)"""
+    context = multiprocessing.get_context('spawn')
+    ready, results, done = context.Queue(), context.Queue(), context.Event()
+    processes = [context.Process(target=subscriber, args=(ready, done, results, messages)) for _ in range(subscribers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get()
+
+    os.environ['CACHE_BUS'] = 'postgres'
+    from cache_bus import bus
+    # Numbered, identical messages still queued would be sent once
+    for i in range(messages):
+        bus.publish('bench', i)
+        time.sleep(interval)
+    done.set()
+    stats = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    delivered = sum(count for count, _ in stats)
+    worst = max((latency['latency_ms'] for _, latency in stats), key=lambda latency: latency['p99'])
+    return delivered, worst
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cache invalidation propagation')
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[1, 4, 8], help='subscriber process counts')
+    parser.add_argument('--messages', type=int, default=500, help='messages published per run (default: 500)')
+    parser.add_argument('--rate', type=float, default=500, help='messages per second (default: 500)')
+    args = parser.parse_args()
+
+    print(f"\n{args.messages} invalidations at {args.rate:.0f}/s, latency of the slowest subscriber\n")
+    print(f"{'subscribers':>11} | {'delivered':>9} | {'p50':>8} | {'p99':>8} | {'max':>8}")
+    print('-' * 57)
+    for subscribers in args.subscribers:
+        delivered, latency = run(subscribers, args.messages, 1 / args.rate)
+        print(f"{subscribers:>11} | {delivered:>4}/{args.messages * subscribers:<4} | {latency['p50']:>6.2f}ms | "
+              f"{latency['p99']:>6.2f}ms | {latency['max']:>6.2f}ms")
+
+if __name__ == '__main__':
+    main()
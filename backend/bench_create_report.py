@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Create Report Benchmark - bursts of concurrent POST /api/reports, once with the
+per-request commit and once with the group commit queue (REPORT_GROUP_COMMIT,
+see write_queue.py). Reports per second and latency percentiles for each.
+
+    python bench_create_report.py                       # 1, 8 and 32 concurrent clients
+    python bench_create_report.py --clients 16 64 --requests 50 --rtt-ms 5
+
+Uses the database from .env, optionally through latency_proxy.py. The benchmark
+users and their reports are deleted afterwards.
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+import uuid
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * p), len(samples) - 1)]
+
+def burst(server, tokens, requests):
+    """Every token's client sends `requests` reports at once, return (seconds, latencies)"""
+    latencies = []
+    errors = []
+    start_barrier = threading.Barrier(len(tokens))
+
+    def client(token):
+        test_client = server.app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        start_barrier.wait()
+        for i in range(requests):
+            started = time.perf_counter()
+            response = test_client.post('/api/reports', headers=headers, json={
+                'latitude': 44.43 + i * 1e-4, 'longitude': 26.10, 'type': 'ACCIDENT', 'description': 'bench'
+            })
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 201:
+                errors.append(response.status_code)
+
+    threads = [threading.Thread(target=client, args=(token,)) for token in tokens]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise RuntimeError(f"{len(errors)} requests failed: {sorted(set(errors))}")
+    return time.perf_counter() - started, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-request commit vs group commit of reports')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32], help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=50, help='reports per client (default: 50)')
+    parser.add_argument('--rtt-ms', type=float, default=0, help='simulated round-trip time to the database')
+    args = parser.parse_args()
+
+    os.environ['REPORT_GROUP_COMMIT'] = '1'
+    proxy = None
+    if args.rtt_ms:
+        from db import DB_CONFIG
+        from latency_proxy import LatencyProxy
+        proxy = LatencyProxy(DB_CONFIG['host'], DB_CONFIG['port'], args.rtt_ms).start()
+        DB_CONFIG['host'], DB_CONFIG['port'] = '127.0.0.1', proxy.port
+    import server
+    from db import get_db
+    group_commit_writer = server.report_writer
+
+    prefix = f"bench_{uuid.uuid4().hex[:8]}"
+    client = server.app.test_client()
+    tokens = []
+    for i in range(max(args.clients)):
+        account = {'username': f'{prefix}_{i}', 'email': f'{prefix}_{i}@example.com', 'password': 'benchmark'}
+        tokens.append(client.post('/api/auth/register', json=account).get_json()['token'])
+
+    print(f"\n{args.requests} reports per client, RTT {args.rtt_ms:.0f} ms\n")
+    print(f"{'clients':>7} | {'path':<17} | {'reports/s':>9} | {'p50':>8} | {'p99':>8}")
+    print('-' * 63)
+    try:
+        for clients in args.clients:
+            for name, writer in (('per-request', None), ('group commit', group_commit_writer)):
+                server.report_writer = writer
+                burst(server, tokens[:clients], 2)  # warm up
+                seconds, latencies = burst(server, tokens[:clients], args.requests)
+                print(f"{clients:>7} | {name:<17} | {len(latencies) / seconds:>9.0f} | "
+                      f"{statistics.median(latencies) * 1000:>6.1f}ms | {percentile(latencies, 0.99) * 1000:>6.1f}ms")
+        stats = group_commit_writer.stats()
+        print(f"\nGroup commit: {stats['committed']} reports in {stats['batches']} commits "
+              f"(avg {stats['avg_batch_size']} per commit)")
+    finally:
+        conn = get_db()
+        conn.execute('DELETE FROM users WHERE username LIKE %s', (f'{prefix}_%',))
+        conn.commit()
+        conn.close()
+        if proxy:
+            proxy.close()
+
+if __name__ == '__main__':
+    main()
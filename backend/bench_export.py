@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Export Benchmark - measures throughput and peak memory of export.py for every
+format, next to loading everything with fetchall() first (what view_db.py does).
+
+    python bench_export.py                  # exports all reports
+    python bench_export.py --dataset votes
+
+Uses the database from .env. Each export runs twice: once for throughput and
+once under tracemalloc for the peak memory allocated by Python.
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime
+from db import get_db
+from export import EXPORT_COLUMNS, EXPORT_QUERIES, export_stream, parquet_available
+
+def fetchall_export(conn, dataset, time_from, time_to):
+    """Baseline: load every row into memory, then encode them as NDJSON"""
+    cursor = conn.cursor()
+    cursor.execute(EXPORT_QUERIES[dataset], {'from': time_from, 'to': time_to, 'types': None})
+    rows = cursor.fetchall()
+    cursor.close()
+    columns = [name for name, _ in EXPORT_COLUMNS[dataset]]
+    yield ''.join(json.dumps({name: row[name] for name in columns}, default=str) + '\n' for row in rows).encode('utf-8')
+
+def run(export, conn):
+    """Consume an export, return (bytes written, seconds)"""
+    start = time.perf_counter()
+    written = sum(len(data) for data in export(conn))
+    conn.commit()
+    return written, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bulk export')
+    parser.add_argument('--dataset', choices=sorted(EXPORT_QUERIES), default='reports')
+    args = parser.parse_args()
+
+    time_from, time_to = datetime(1970, 1, 1), datetime.utcnow()
+    conn = get_db()
+    rows = conn.execute(
+        f"SELECT COUNT(*) as count FROM ({EXPORT_QUERIES[args.dataset]}) export",
+        {'from': time_from, 'to': time_to, 'types': None}
+    ).fetchone()['count']
+    conn.commit()
+
+    exports = {'fetchall + ndjson': lambda c: fetchall_export(c, args.dataset, time_from, time_to)}
+    for export_format in ('ndjson', 'csv', 'parquet'):
+        if export_format == 'parquet' and not parquet_available():
+            continue
+        exports[f'stream {export_format}'] = (
+            lambda c, f=export_format: export_stream(c, args.dataset, f, time_from, time_to)
+        )
+
+    print(f"\nExporting {rows} {args.dataset}\n")
+    print(f"{'method':<18} | {'size':>9} | {'time':>7} | {'rows/s':>9} | {'peak memory':>11}")
+    print('-' * 67)
+    for name, export in exports.items():
+        written, seconds = run(export, conn)
+        tracemalloc.start()
+        run(export, conn)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:<18} | {written / 1e6:>7.1f}MB | {seconds:>6.2f}s | {rows / seconds:>9.0f} | {peak / 1e6:>9.1f}MB")
+
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Geofence Benchmark - matching new reports against area subscriptions with the grid
+index from geofence.py, next to checking every subscription (brute force).
+
+    python bench_geofence.py                              # 10k, 100k and 300k subscriptions
+    python bench_geofence.py --subscriptions 500000 --reports 50000
+
+Runs in memory, no database needed. Areas and reports are spread over Romania,
+denser around a few cities like real users would be.
+"""
+
+import argparse
+import math
+import random
+import statistics
+import time
+from geo import haversine_m, point_in_polygon
+from geofence import Area, GeofenceIndex
+
+# (lat, lon) of cities where most areas and reports are
+CITIES = [(44.43, 26.10), (46.77, 23.59), (45.75, 21.23), (47.16, 27.59), (44.18, 28.63), (45.65, 25.60)]
+ROMANIA = (43.6, 20.3, 48.2, 29.7)
+TYPES = ['POLICE', 'ACCIDENT', 'POTHOLE', 'TRAFFIC_JAM']
+
+def random_point(rng):
+    if rng.random() < 0.7:
+        lat, lon = rng.choice(CITIES)
+        return lat + rng.gauss(0, 0.08), lon + rng.gauss(0, 0.1)
+    return rng.uniform(ROMANIA[0], ROMANIA[2]), rng.uniform(ROMANIA[1], ROMANIA[3])
+
+def random_area(rng, area_id):
+    lat, lon = random_point(rng)
+    types = rng.sample(TYPES, rng.randint(1, 2)) if rng.random() < 0.5 else None
+    if rng.random() < 0.8:
+        return Area(area_id, area_id, types, center=(lat, lon), radius_m=rng.uniform(200, 10000))
+    # Star-shaped polygon around the point, up to about 5 km across
+    vertices = rng.randint(4, 10)
+    polygon = []
+    for i in range(vertices):
+        angle = 2 * math.pi * (i + rng.random() * 0.5) / vertices
+        radius = rng.uniform(0.005, 0.025)
+        polygon.append((lat + radius * math.sin(angle), lon + radius * math.cos(angle)))
+    return Area(area_id, area_id, types, polygon=polygon)
+
+def brute_force(areas, lat, lon, type_name):
+    """Every area, with the exact great-circle test for circles"""
+    return [
+        area for area in areas
+        if (area.types is None or type_name in area.types) and (
+            point_in_polygon(lat, lon, area.polygon) if area.polygon
+            else haversine_m(area.center[0], area.center[1], lat, lon) <= area.radius_m
+        )
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark geofence matching')
+    parser.add_argument('--subscriptions', type=int, nargs='+', default=[10000, 100000, 300000])
+    parser.add_argument('--reports', type=int, default=20000, help='reports matched per run (default: 20000)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"\n{args.reports} reports per run\n")
+    print(f"{'subscriptions':>13} | {'build':>7} | {'reports/s':>9} | {'p50':>8} | {'p99':>8} | "
+          f"{'matches':>7} | {'brute force':>11}")
+    print('-' * 86)
+    for count in args.subscriptions:
+        rng = random.Random(args.seed)
+        areas = [random_area(rng, i) for i in range(count)]
+        start = time.perf_counter()
+        index = GeofenceIndex()
+        for area in areas:
+            index.add(area)
+        build = time.perf_counter() - start
+
+        reports = [(*random_point(rng), rng.choice(TYPES)) for _ in range(args.reports)]
+        timings = []
+        matches = 0
+        start = time.perf_counter()
+        for lat, lon, type_name in reports:
+            started = time.perf_counter()
+            matches += len(index.match(lat, lon, type_name))
+            timings.append(time.perf_counter() - started)
+        elapsed = time.perf_counter() - start
+        timings.sort()
+
+        # Same answers as checking every area, on a sample
+        sample = reports[:50]
+        start = time.perf_counter()
+        for lat, lon, type_name in sample:
+            expected = {area.id for area in brute_force(areas, lat, lon, type_name)}
+            if expected != {area.id for area in index.match(lat, lon, type_name)}:
+                raise AssertionError(f"index and brute force disagree at {lat}, {lon}")
+        brute = (time.perf_counter() - start) / len(sample)
+
+        print(f"{count:>13} | {build:>6.1f}s | {args.reports / elapsed:>9.0f} | "
+              f"{statistics.median(timings) * 1e6:>6.0f}us | {timings[int(len(timings) * 0.99)] * 1e6:>6.0f}us | "
+              f"{matches / args.reports:>7.1f} | {brute * 1000:>9.1f}ms")
+
+if __name__ == '__main__':
+    main()
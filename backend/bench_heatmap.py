@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Heatmap Benchmark - concurrent reporters in one geohash cell over a slow network,
+and /api/heatmap over growing time ranges on a year of history.
+
+    python bench_heatmap.py                                 # 16 reporters at 20 ms RTT, 200k reports
+    python bench_heatmap.py --reporters 32 --rtt-ms 50 --reports 500000
+
+Runs against a scratch database (roadalert_heatmapbench) on the server from .env,
+migrated with migrate.py, reached through latency_proxy.py. History is spread
+evenly over Romania and the last 400 days, like check_query_plans.py seeds it.
+The scratch database is dropped afterwards.
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+import psycopg
+from dotenv import load_dotenv
+import migrate
+from latency_proxy import LatencyProxy
+
+load_dotenv()
+
+BENCH_DB = 'roadalert_heatmapbench'
+ROMANIA = (43.6, 20.3, 48.2, 29.7)
+BUCHAREST = (44.3, 25.9, 44.6, 26.3)
+
+def seed(conn, reports):
+    conn.execute("SELECT create_report_partitions(3, (CURRENT_DATE - INTERVAL '400 days')::date)")
+    conn.execute('''
+        INSERT INTO users (username, email, password_hash)
+        SELECT 'user' || g, 'user' || g || '@example.com', 'x' FROM generate_series(1, 1000) g
+    ''')
+    conn.execute('''
+        INSERT INTO reports (user_id, type_id, latitude, longitude, description, status, created_at, expires_at)
+        SELECT 1 + g %% 1000, 1 + g %% 4, 43.6 + random() * 4.6, 20.3 + random() * 9.4, '', 'EXPIRED', t, t + INTERVAL '30 seconds'
+        FROM (SELECT g, NOW() - random() * INTERVAL '400 days' AS t FROM generate_series(1, %s) g) history
+    ''', (reports,))
+    conn.execute('SELECT fold_report_heatmap()')
+    conn.execute('ANALYZE')
+
+def percentile(timings, p):
+    return timings[min(int(len(timings) * p), len(timings) - 1)]
+
+def bench_reporters(server, reporters, per_reporter):
+    """Every reporter posts per_reporter reports at the same spot, all at the same time"""
+    client = server.app.test_client()
+    headers = []
+    for i in range(reporters):
+        account = {'username': f'reporter{i}', 'email': f'reporter{i}@example.com', 'password': 'reporter'}
+        token = client.post('/api/auth/register', json=account).get_json()['token']
+        headers.append({'Authorization': f'Bearer {token}'})
+
+    timings, errors = [], []
+    def report(header):
+        client = server.app.test_client()
+        for _ in range(per_reporter):
+            started = time.perf_counter()
+            response = client.post('/api/reports', headers=header,
+                                   json={'latitude': 44.4268, 'longitude': 26.1025, 'type': 'ACCIDENT'})
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 201:
+                errors.append(response.status_code)
+    threads = [threading.Thread(target=report, args=(header,)) for header in headers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return len(timings) / elapsed, statistics.median(timings), percentile(timings, 0.99), len(errors)
+
+def bench_queries(server, runs):
+    client = server.app.test_client()
+    print(f"\n{'box':>9} | {'range':>8} | {'precision':>9} | {'cells':>6} | {'p50':>8} | {'p99':>8}")
+    print('-' * 64)
+    for name, box in [('Bucharest', BUCHAREST), ('Romania', ROMANIA)]:
+        for days in [1, 30, 365]:
+            url = (f"/api/heatmap?min_lat={box[0]}&min_lon={box[1]}&max_lat={box[2]}&max_lon={box[3]}"
+                   f"&from={(server.datetime.utcnow() - server.timedelta(days=days)).isoformat()}")
+            client.get(url)  # warm up
+            timings = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            heatmap = response.get_json()['heatmap']
+            print(f"{name:>9} | {days:>6}d | {heatmap['precision']:>9} | {len(heatmap['cells']):>6} | "
+                  f"{statistics.median(timings):>6.1f}ms | {percentile(timings, 0.99):>6.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark heatmap writes and queries')
+    parser.add_argument('--reporters', type=int, default=16, help='concurrent reporters in one cell (default: 16)')
+    parser.add_argument('--reports-each', type=int, default=20, help='reports per reporter (default: 20)')
+    parser.add_argument('--rtt-ms', type=float, default=20, help='round trip to the database (default: 20)')
+    parser.add_argument('--reports', type=int, default=200000, help='reports of history (default: 200000)')
+    parser.add_argument('--runs', type=int, default=10, help='measured requests per query (default: 10)')
+    args = parser.parse_args()
+
+    admin = psycopg.connect(**{**migrate.DB_CONFIG, 'dbname': 'postgres'}, autocommit=True)
+    admin.execute(f'DROP DATABASE IF EXISTS "{BENCH_DB}"')
+    admin.execute(f'CREATE DATABASE "{BENCH_DB}"')
+    proxy = LatencyProxy(migrate.DB_CONFIG['host'], migrate.DB_CONFIG['port'], 0).start()
+    try:
+        with psycopg.connect(**{**migrate.DB_CONFIG, 'dbname': BENCH_DB}, autocommit=True) as conn:
+            migrate.migrate(conn)
+            print(f"Seeding {args.reports} reports...")
+            seed(conn, args.reports)
+
+        # server.py reads these when it is imported
+        os.environ.update({'DB_NAME': BENCH_DB, 'DB_HOST': '127.0.0.1', 'DB_PORT': str(proxy.port),
+                           'CACHE_BUS': 'local'})
+        import server
+
+        proxy.rtt_ms = args.rtt_ms
+        rate, p50, p99, errors = bench_reporters(server, args.reporters, args.reports_each)
+        print(f"\n{args.reporters} reporters in one cell at {args.rtt_ms:.0f} ms RTT: "
+              f"{rate:.0f} reports/s, p50 {p50:.0f} ms, p99 {p99:.0f} ms, {errors} errors")
+
+        proxy.rtt_ms = 0
+        bench_queries(server, args.runs)
+    finally:
+        proxy.close()
+        admin.execute(f'DROP DATABASE IF EXISTS "{BENCH_DB}" WITH (FORCE)')
+        admin.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Route Corridor Benchmark - POST /api/reports/route for a route across the country
+(Timisoara - Bucharest - Constanta, about 800 km), with more and more active reports.
+
+    python bench_route_corridor.py                          # 10k and 100k active reports
+    python bench_route_corridor.py --reports 1000 50000 --width-m 500
+
+Uses the database from .env. The active reports are spread over Romania, denser
+around a few cities, and some are put next to the route. Every run checks the
+answer against measuring a sample of reports against every segment of the route.
+The benchmark user and their reports are deleted afterwards.
+"""
+
+import argparse
+import json
+import math
+import random
+import statistics
+import time
+import uuid
+
+# Route through these cities, with a point about every 100 m
+WAYPOINTS = [(45.75, 21.23), (45.10, 22.90), (44.32, 23.80), (44.43, 26.10), (44.18, 28.63)]
+CITIES = [(44.43, 26.10), (46.77, 23.59), (45.75, 21.23), (47.16, 27.59), (44.18, 28.63), (45.65, 25.60)]
+
+def make_route(rng):
+    from geo import haversine_m
+    path = [WAYPOINTS[0]]
+    for start, end in zip(WAYPOINTS, WAYPOINTS[1:]):
+        steps = int(haversine_m(*start, *end) / 100)
+        for step in range(1, steps + 1):
+            t = step / steps
+            # Roads are not straight lines
+            wiggle = 0.02 * math.sin(t * 40) if step < steps else 0
+            path.append((start[0] + (end[0] - start[0]) * t + wiggle, start[1] + (end[1] - start[1]) * t))
+    return path
+
+def seed(conn, user_id, path, count, rng):
+    """Insert `count` active reports, 1% of them within about 300 m of the route"""
+    rows = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.01:
+            lat, lon = rng.choice(path)
+            lat, lon = lat + rng.uniform(-0.003, 0.003), lon + rng.uniform(-0.004, 0.004)
+        elif roll < 0.7:
+            lat, lon = rng.choice(CITIES)
+            lat, lon = lat + rng.gauss(0, 0.08), lon + rng.gauss(0, 0.1)
+        else:
+            lat, lon = rng.uniform(43.6, 48.2), rng.uniform(20.3, 29.7)
+        rows.append((lat, lon))
+    conn.execute('''
+        INSERT INTO reports (user_id, type_id, latitude, longitude, description, status, created_at, expires_at)
+        SELECT %s, 1, lat, lon, 'bench', 'ACTIVE', NOW(), NOW() + INTERVAL '1 hour'
+        FROM unnest(%s::float8[], %s::float8[]) AS p(lat, lon)
+    ''', (user_id, [lat for lat, _ in rows], [lon for _, lon in rows]))
+    conn.commit()
+    conn.execute('ANALYZE reports')
+    conn.commit()
+
+def check(conn, corridor, result_ids):
+    """Compare the endpoint with every segment of the route, on a sample of reports"""
+    rows = conn.execute('''
+        SELECT id, latitude, longitude FROM reports
+        WHERE status = 'ACTIVE' AND expires_at > NOW() ORDER BY random() LIMIT 300
+    ''').fetchall()
+    for row in rows:
+        lat, lon = float(row['latitude']), float(row['longitude'])
+        inside = corridor.distance(lat, lon) <= corridor.width_m
+        # Reports the endpoint cut off at ROUTE_MAX_REPORTS are not an error
+        if inside != (row['id'] in result_ids) and not (inside and len(result_ids) >= 500):
+            raise AssertionError(f"report {row['id']} at {lat}, {lon}: expected inside={inside}")
+    return len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the route corridor endpoint')
+    parser.add_argument('--reports', type=int, nargs='+', default=[10000, 100000], help='active reports')
+    parser.add_argument('--width-m', type=float, default=200, help='corridor width (default: 200)')
+    parser.add_argument('--runs', type=int, default=20, help='measured requests per size (default: 20)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    import server
+    from corridor import RouteCorridor
+    from db import get_db
+
+    rng = random.Random(args.seed)
+    path = make_route(rng)
+    corridor = RouteCorridor([lat for lat, _ in path], [lon for _, lon in path], args.width_m)
+    client = server.app.test_client()
+    name = f"bench_{uuid.uuid4().hex[:8]}"
+    account = {'username': name, 'email': f'{name}@example.com', 'password': 'benchmark'}
+    registered = client.post('/api/auth/register', json=account).get_json()
+    headers = {'Authorization': f"Bearer {registered['token']}"}
+    conn = get_db()
+
+    print(f"\nRoute of {len(path)} points, {corridor.length_m / 1000:.0f} km, {len(corridor.chunks)} chunks, "
+          f"width {args.width_m:.0f} m, median / p99 of {args.runs} requests\n")
+    print(f"{'active reports':>14} | {'on route':>8} | {'p50':>8} | {'p99':>8} | {'all active reports':>18}")
+    print('-' * 70)
+    try:
+        seeded = 0
+        for count in sorted(args.reports):
+            seed(conn, registered['user']['id'], path, count - seeded, rng)
+            seeded = count
+
+            body = json.dumps({'path': path, 'width_m': args.width_m})
+            request = {'headers': headers, 'data': body, 'content_type': 'application/json'}
+            client.post('/api/reports/route', **request)  # warm up
+            timings = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                response = client.post('/api/reports/route', **request)
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise RuntimeError(f"route request failed: {response.get_json()}")
+            timings.sort()
+            reports = response.get_json()['reports']
+            check(conn, corridor, {report['id'] for report in reports})
+
+            # What the map did before: download every active report
+            started = time.perf_counter()
+            conn.execute('''
+                SELECT id, latitude, longitude FROM reports WHERE status = 'ACTIVE' AND expires_at > NOW()
+            ''').fetchall()
+            download = (time.perf_counter() - started) * 1000
+
+            print(f"{count:>14} | {len(reports):>8} | {statistics.median(timings):>6.1f}ms | "
+                  f"{timings[min(int(len(timings) * 0.99), len(timings) - 1)]:>6.1f}ms | {download:>16.1f}ms")
+    finally:
+        conn.execute('DELETE FROM users WHERE username = %s', (name,))
+        conn.commit()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
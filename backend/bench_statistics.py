@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Statistics Benchmark - compares running the /api/statistics queries one after
+another (how get_statistics used to work) with run_statistics_queries(), which
+sends them all in one pipeline, at several simulated network round-trip times.
+
+    python bench_statistics.py                       # RTTs 0, 5, 20 and 50 ms
+    python bench_statistics.py --rtt-ms 0 30 --runs 20
+
+Uses the database from .env through latency_proxy.py.
+"""
+
+import argparse
+import statistics
+import time
+from db import DB_CONFIG, connect
+from latency_proxy import LatencyProxy
+from server import STATISTICS_QUERIES, run_statistics_queries
+
+def run_sequential(conn):
+    """The previous implementation: one query, one round trip, at a time"""
+    results = {}
+    cursor = conn.cursor()
+    for name, sql in STATISTICS_QUERIES.items():
+        cursor.execute(sql)
+        results[name] = cursor.fetchall()
+    cursor.close()
+    return results
+
+def measure(conn, run, runs):
+    """Return the latencies of `runs` calls to run(conn), in milliseconds"""
+    run(conn)  # warm up caches and the connection
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run(conn)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sequential vs pipelined statistics queries')
+    parser.add_argument('--rtt-ms', type=float, nargs='+', default=[0, 5, 20, 50], help='simulated round-trip times')
+    parser.add_argument('--runs', type=int, default=10, help='measured runs per RTT (default: 10)')
+    args = parser.parse_args()
+
+    print(f"\n{len(STATISTICS_QUERIES)} queries per request, median / max of {args.runs} runs\n")
+    print(f"{'RTT':>8} | {'sequential':>19} | {'pipelined':>19} | {'speedup':>7}")
+    print('-' * 64)
+    for rtt in args.rtt_ms:
+        proxy = LatencyProxy(DB_CONFIG['host'], DB_CONFIG['port'], rtt).start()
+        conn = connect('127.0.0.1', proxy.port)
+        sequential = measure(conn, run_sequential, args.runs)
+        pipelined = measure(conn, run_statistics_queries, args.runs)
+        conn.close()
+        proxy.close()
+
+        seq_median = statistics.median(sequential)
+        pipe_median = statistics.median(pipelined)
+        print(f"{rtt:>6.0f}ms | {seq_median:>8.1f} / {max(sequential):>6.1f}ms | "
+              f"{pipe_median:>8.1f} / {max(pipelined):>6.1f}ms | {seq_median / pipe_median:>6.1f}x")
+
+if __name__ == '__main__':
+    main()
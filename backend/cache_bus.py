@@ -0,0 +1,241 @@
+"""
+Cache invalidation bus - tells every server process that data it may have cached
+has changed.
+
+Routes publish a message on a channel ('reports', 'users', ...) after they commit a
+write. Every process, including the one that published, calls the callbacks
+subscribed to that channel, which evict or patch what they cached.
+
+Backends (CACHE_BUS):
+    postgres  LISTEN/NOTIFY on the primary database (default). One listener thread
+              and one publisher thread per process. publish() only queues the
+              message: the publisher sends everything queued in one round trip,
+              identical messages still waiting are sent once.
+    local     Delivers to the subscribers of this process only, for tests and
+              single-process runs.
+
+Every message carries the time it was queued, so stats() reports how long messages
+take to reach this process. Subscribers get a None payload, meaning "drop
+everything", when messages may have been lost: after the listener reconnects, and
+on the channels of a batch the publisher could not send at first (it is sent again
+once the database is back) or of messages dropped from a full queue.
+"""
+
+import atexit
+import json
+import os
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from psycopg import sql
+from db import DB_CONFIG, connect
+
+CACHE_BUS = os.getenv('CACHE_BUS', 'postgres')
+
+# NOTIFY channels are shared by every database on the server, prefix them with ours
+CHANNEL_PREFIX = f"{DB_CONFIG['database']}_"
+
+# Latencies kept per channel for stats()
+LATENCY_SAMPLES = 1000
+
+class LocalBus:
+    """In-process bus, also the subscriber bookkeeping and metrics of PostgresBus"""
+
+    backend = 'local'
+
+    def __init__(self):
+        self.subscribers = defaultdict(list)
+        self.received = defaultdict(int)
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+        self.lock = threading.Lock()
+
+    def subscribe(self, channel, callback):
+        """Call callback(payload) for every message published on channel"""
+        with self.lock:
+            self.subscribers[channel].append(callback)
+
+    def publish(self, channel, payload=None):
+        """Send a JSON-serializable payload to every subscriber of channel"""
+        self._deliver(channel, self._message(payload))
+
+    def _message(self, payload):
+        return {'payload': payload, 'sent_at': time.time(), 'pid': os.getpid()}
+
+    def _deliver(self, channel, message):
+        latency = max(time.time() - message['sent_at'], 0)
+        with self.lock:
+            self.received[channel] += 1
+            self.latencies[channel].append(latency)
+            callbacks = list(self.subscribers[channel])
+        for callback in callbacks:
+            try:
+                callback(message['payload'])
+            except Exception as e:
+                print(f"Cache bus subscriber error on {channel}: {e}")
+
+    def _reset(self):
+        """Tell every subscriber that messages may have been missed"""
+        with self.lock:
+            callbacks = [callback for subscribers in self.subscribers.values() for callback in subscribers]
+        for callback in callbacks:
+            try:
+                callback(None)
+            except Exception as e:
+                print(f"Cache bus subscriber error on reset: {e}")
+
+    def stats(self):
+        """Messages received and propagation latency in milliseconds, per channel"""
+        with self.lock:
+            result = {}
+            for channel, count in self.received.items():
+                samples = sorted(self.latencies[channel])
+                result[channel] = {
+                    'received': count,
+                    'latency_ms': {
+                        'avg': round(statistics.fmean(samples) * 1000, 2),
+                        'p50': round(samples[len(samples) // 2] * 1000, 2),
+                        'p99': round(samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1000, 2),
+                        'max': round(samples[-1] * 1000, 2)
+                    }
+                }
+        return {'backend': self.backend, 'channels': result}
+
+class PostgresBus(LocalBus):
+    """Bus over PostgreSQL LISTEN/NOTIFY, reaches every process connected to the primary"""
+
+    backend = 'postgres'
+
+    # How often the listener wakes up to LISTEN on newly subscribed channels
+    POLL_SECONDS = 1.0
+    # Messages waiting to be sent at most, the oldest are dropped beyond that
+    PUBLISH_QUEUE_MAX = 10000
+    # Pause before sending again after a failed batch
+    PUBLISH_RETRY_SECONDS = 1.0
+
+    def __init__(self):
+        super().__init__()
+        self.publish_conn = None
+        self.publish_lock = threading.Lock()
+        self.publish_ready = threading.Condition(self.publish_lock)
+        # (channel, payload as JSON) -> message, in the order they were queued
+        self.pending = {}
+        # Channels whose subscribers must drop everything once publishing works again
+        self.reset_channels = set()
+        self.published = 0
+        self.publish_failures = 0
+        self.listener_started = False
+        self.publisher_started = False
+
+    def subscribe(self, channel, callback):
+        super().subscribe(channel, callback)
+        with self.lock:
+            if self.listener_started:
+                return
+            self.listener_started = True
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def publish(self, channel, payload=None):
+        """Queue a message for the publisher thread, without waiting for the database"""
+        key = (channel, json.dumps(payload, sort_keys=True))
+        with self.publish_lock:
+            if key not in self.pending:
+                self.pending[key] = self._message(payload)
+                self._trim_pending()
+            self.publish_ready.notify()
+            if not self.publisher_started:
+                self.publisher_started = True
+                threading.Thread(target=self._publish_pending, daemon=True).start()
+                atexit.register(self.flush)
+
+    def _trim_pending(self):
+        while len(self.pending) > self.PUBLISH_QUEUE_MAX:
+            key = next(iter(self.pending))
+            del self.pending[key]
+            self.reset_channels.add(key[0])
+
+    def _publish_pending(self):
+        while True:
+            with self.publish_lock:
+                while not self.pending and not self.reset_channels:
+                    self.publish_ready.wait()
+            if not self.flush():
+                time.sleep(self.PUBLISH_RETRY_SECONDS)
+
+    def flush(self):
+        """Send everything queued in one round trip, return False if it has to be retried"""
+        with self.publish_lock:
+            batch, self.pending = self.pending, {}
+            resets, self.reset_channels = self.reset_channels, set()
+        if not batch and not resets:
+            return True
+        notifies = [(CHANNEL_PREFIX + channel, json.dumps(message)) for (channel, _), message in batch.items()]
+        notifies += [(CHANNEL_PREFIX + channel, json.dumps(self._message(None))) for channel in sorted(resets)]
+        try:
+            self._send(notifies)
+            self.published += len(notifies)
+            return True
+        except Exception as e:
+            self.publish_failures += 1
+            print(f"Cache bus publish error, retrying {len(notifies)} messages: {e}")
+            with self.publish_lock:
+                # The batch goes first again, newer copies of its messages merge into it.
+                # A failed send may still have reached some processes, or the database
+                # may stay down until this process exits: subscribers of these channels
+                # reload from the database once publishing works again.
+                self.pending = {**batch, **self.pending}
+                self.reset_channels |= resets | {channel for channel, _ in batch}
+                self._trim_pending()
+            return False
+
+    def _send(self, notifies):
+        """NOTIFY every (channel, payload), in order, in one statement"""
+        # Retry once on a fresh connection, the old one may have been closed by the server
+        for attempt in range(2):
+            try:
+                if self.publish_conn is None or self.publish_conn.closed:
+                    self.publish_conn = connect(DB_CONFIG['host'], DB_CONFIG['port'], autocommit=True)
+                self.publish_conn.execute(
+                    'SELECT pg_notify(n.channel, n.payload) FROM unnest(%s::text[], %s::text[]) AS n(channel, payload)',
+                    [list(column) for column in zip(*notifies)]
+                )
+                return
+            except Exception:
+                self.publish_conn = None
+                if attempt:
+                    raise
+
+    def stats(self):
+        result = super().stats()
+        with self.publish_lock:
+            result['publish'] = {
+                'pending': len(self.pending),
+                'published': self.published,
+                'failures': self.publish_failures
+            }
+        return result
+
+    def _listen(self):
+        connected_before = False
+        while True:
+            try:
+                with connect(DB_CONFIG['host'], DB_CONFIG['port'], autocommit=True) as conn:
+                    listening = set()
+                    if connected_before:
+                        self._reset()
+                    connected_before = True
+                    while True:
+                        with self.lock:
+                            channels = set(self.subscribers) - listening
+                        for channel in channels:
+                            conn.execute(sql.SQL('LISTEN {}').format(sql.Identifier(CHANNEL_PREFIX + channel)))
+                            listening.add(channel)
+                        for notify in conn.notifies(timeout=self.POLL_SECONDS):
+                            self._deliver(notify.channel[len(CHANNEL_PREFIX):], json.loads(notify.payload))
+            except Exception as e:
+                print(f"Cache bus listener error, reconnecting: {e}")
+                time.sleep(1)
+
+BUS_BACKENDS = {'local': LocalBus, 'postgres': PostgresBus}
+
+bus = BUS_BACKENDS[CACHE_BUS]()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Degraded Mode Check - runs the API against the database from .env through
+latency_proxy.py, makes the database hang and checks that the API keeps answering:
+reads come from the last good snapshot (marked stale), the circuit breaker opens
+(but not on statement timeouts), writes and cache bus publishes fail or return
+fast, the health check stays fast, a stalled statement is cut off, and everything
+is fresh again once the database is back.
+
+    python check_degraded_mode.py               # both cache buses, exit code 1 if any check failed
+    python check_degraded_mode.py --bus local
+
+A user is registered for the check and deleted afterwards.
+"""
+
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+from latency_proxy import LatencyProxy
+
+load_dotenv()
+
+# A database that takes this long to answer is as good as down
+HANG_RTT_MS = 30000
+CONNECT_TIMEOUT_SECONDS = 2
+BREAKER_FAILURES = 3
+BREAKER_RESET_SECONDS = 3
+
+failed = []
+
+def check(name, ok, detail=''):
+    print(f"{'ok  ' if ok else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+    if not ok:
+        failed.append(name)
+
+def timed_get(client, url, headers):
+    started = time.perf_counter()
+    response = client.get(url, headers=headers)
+    return response, time.perf_counter() - started
+
+def run(cache_bus):
+    # Slots must be given back when requests end, not when their connections are collected
+    gc.disable()
+    proxy = LatencyProxy(os.getenv('DB_HOST', 'localhost'), os.getenv('DB_PORT', '5432'), 1).start()
+    # The server and db.py read these when imported
+    os.environ.update({
+        'DB_HOST': '127.0.0.1',
+        'DB_PORT': str(proxy.port),
+        'DB_CONNECT_TIMEOUT_SECONDS': str(CONNECT_TIMEOUT_SECONDS),
+        'DB_BREAKER_FAILURES': str(BREAKER_FAILURES),
+        'DB_BREAKER_RESET_SECONDS': str(BREAKER_RESET_SECONDS),
+        'CACHE_BUS': cache_bus
+    })
+    import psycopg
+    import db
+    import server
+
+    app = server.app
+    client = app.test_client()
+    name = f"degraded_{uuid.uuid4().hex[:8]}"
+    account = {'username': name, 'email': f'{name}@example.com', 'password': 'degraded'}
+    registered = client.post('/api/auth/register', json=account).get_json()
+    headers = {'Authorization': f"Bearer {registered['token']}"}
+
+    try:
+        print(f"\nDatabase through a proxy on port {proxy.port}, {cache_bus} cache bus\n")
+        reports = client.get('/api/reports', headers=headers).get_json()
+        statistics = client.get('/api/statistics', headers=headers).get_json()
+        check('fresh reports while the database answers', reports['success'] and not reports.get('stale'))
+        check('fresh statistics while the database answers', statistics['success'] and not statistics.get('stale'))
+
+        # Statements over budget on a database that answers fail alone
+        for _ in range(BREAKER_FAILURES):
+            conn = db.get_db()
+            try:
+                conn.execute("SET statement_timeout = 50; SELECT pg_sleep(1)")
+            except psycopg.errors.QueryCanceled:
+                pass
+            conn.close()
+        check('statement timeouts leave the circuit breaker closed', db.breaker.state == 'closed', str(db.breaker.stats()))
+
+        # A statement over its budget after checkout: the snapshot is served and the
+        # connection slot given back right away
+        blocker = db.connect(db.DB_CONFIG['host'], db.DB_CONFIG['port'])
+        blocker.execute('LOCK TABLE users IN ACCESS EXCLUSIVE MODE')
+        budget_ms = server.ROUTE_QUERY_BUDGETS_MS['get_statistics']
+        server.ROUTE_QUERY_BUDGETS_MS['get_statistics'] = 300
+        server._statistics_cache['statistics'] = None
+        response = client.get('/api/statistics', headers=headers)
+        server.ROUTE_QUERY_BUDGETS_MS['get_statistics'] = budget_ms
+        blocker.close()
+        check('statement over budget fails alone and gives its slot back',
+              response.get_json().get('stale') and db.database_status()['connections'] == 0,
+              f"{db.database_status()['connections']} slots in use")
+
+        # A statement on an open connection, then the network stalls
+        db.set_query_budget(500)
+        conn = db.connect(db.DB_CONFIG['host'], db.DB_CONFIG['port'])
+        db.set_query_budget(db.DB_STATEMENT_TIMEOUT_MS)
+        proxy.rtt_ms = HANG_RTT_MS
+        started = time.perf_counter()
+        try:
+            conn.execute('SELECT 1')
+            error = None
+        except psycopg.OperationalError as e:
+            error = e
+        elapsed = time.perf_counter() - started
+        conn.close()
+        check('stalled statement cut off after its budget', error is not None and elapsed < 2,
+              f"{elapsed:.1f}s, budget 0.5s + {db.STALLED_GRACE_SECONDS:.0f}s grace")
+
+        # The statistics would otherwise come from the 30 s cache, not the snapshot
+        server._statistics_cache['statistics'] = None
+        results = []
+        def read(url):
+            results.append((url, *timed_get(app.test_client(), url, headers)))
+        threads = [threading.Thread(target=read, args=(url,))
+                   for url in ['/api/reports', '/api/statistics'] * 4]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        slowest = max(elapsed for _, _, elapsed in results)
+        check('reads served stale while the database hangs',
+              all(response.status_code == 200 and response.get_json().get('stale') for _, response, _ in results),
+              f"{len(results)} concurrent requests, slowest {slowest:.1f}s")
+        check('no request waits longer than the connect timeout', slowest < CONNECT_TIMEOUT_SECONDS + 1)
+        check('circuit breaker open', db.breaker.state == 'open', str(db.breaker.stats()))
+
+        response, elapsed = timed_get(client, '/api/reports', headers)
+        check('open breaker answers without trying the database', response.get_json().get('stale') and elapsed < 0.2,
+              f"{elapsed * 1000:.0f}ms")
+        response, elapsed = timed_get(client, '/api/reports?limit=7', headers)
+        check('page without a snapshot is 503', response.status_code == 503, f"{elapsed * 1000:.0f}ms")
+        started = time.perf_counter()
+        response = client.post('/api/reports', headers=headers, json={'latitude': 44.43, 'longitude': 26.1, 'type': 'POLICE'})
+        elapsed = time.perf_counter() - started
+        check('write fails fast with the breaker open', response.status_code >= 500 and elapsed < 0.2,
+              f"{response.status_code} in {elapsed * 1000:.0f}ms")
+        started = time.perf_counter()
+        server.bus.publish('reports', {'user_id': registered['user']['id']})
+        elapsed = time.perf_counter() - started
+        check('publishing does not wait for the database', elapsed < 0.05, f"{elapsed * 1000:.1f}ms")
+        response, elapsed = timed_get(client, '/api/health', headers)
+        check('health check answers', response.status_code == 200 and elapsed < 0.2,
+              f"{elapsed * 1000:.0f}ms, breaker {response.get_json()['database']['breaker']['state']}")
+
+        proxy.rtt_ms = 1
+        time.sleep(BREAKER_RESET_SECONDS)
+        reports = client.get('/api/reports', headers=headers).get_json()
+        check('fresh reports once the database is back', reports['success'] and not reports.get('stale'))
+        check('circuit breaker closed', db.breaker.state == 'closed', str(db.breaker.stats()))
+        check('every connection slot given back', db.database_status()['connections'] == 0,
+              f"{db.database_status()['connections']} in use")
+        if cache_bus == 'postgres':
+            deadline = time.monotonic() + 10
+            while server.bus.stats()['publish']['pending'] and time.monotonic() < deadline:
+                time.sleep(0.1)
+            check('messages queued during the outage are published', not server.bus.stats()['publish']['pending'],
+                  str(server.bus.stats()['publish']))
+    finally:
+        proxy.rtt_ms = 1
+        conn = db.get_db()
+        conn.execute('DELETE FROM users WHERE username = %s', (name,))
+        conn.commit()
+        conn.close()
+        proxy.close()
+
+    print(f"\n{'All checks passed' if not failed else f'{len(failed)} checks failed'}")
+    return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the API while the database hangs')
+    parser.add_argument('--bus', choices=['postgres', 'local'], help='cache bus (default: both, one after the other)')
+    args = parser.parse_args()
+    if args.bus:
+        sys.exit(0 if run(args.bus) else 1)
+    # server.py picks its cache bus when imported, so each one runs in its own process
+    results = [subprocess.run([sys.executable, __file__, '--bus', bus]).returncode for bus in ('postgres', 'local')]
+    sys.exit(1 if any(results) else 0)
+
+if __name__ == '__main__':
+    main()
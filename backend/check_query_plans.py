@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Query Plan Check - calls every API route against a seeded scratch database, runs
+EXPLAIN on each query the route executes and fails if a query degrades to a
+sequential scan where an index should be used.
+
+    python check_query_plans.py            # exit code 1 if any plan regressed
+    python check_query_plans.py --keep     # keep the scratch database afterwards
+
+The scratch database (roadalert_plancheck) is created on the server from .env,
+migrated with migrate.py and filled with generated data, so the planner sees
+production-like table sizes. The user needs permission to create databases.
+"""
+
+import argparse
+import atexit
+import os
+import sys
+import psycopg
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+import migrate
+
+load_dotenv()
+
+PLANCHECK_DB = os.getenv('PLANCHECK_DB', 'roadalert_plancheck')
+
+# Seq scans on these tables are always fine, they only hold a few rows
+SMALL_TABLES = {'incident_types', 'schema_migrations'}
+
+# A seq scan is a regression when it filters a table of at least MIN_TABLE_ROWS rows
+# down to less than MAX_SELECTIVITY of it - that is the job of an index.
+# Seq scans without a filter (full-table aggregates in get_statistics) are allowed.
+MIN_TABLE_ROWS = 1000
+MAX_SELECTIVITY = 0.1
+
+class ExplainCursor(psycopg.Cursor):
+    """Cursor that records the plan of every statement before running it"""
+    route = None
+    plans = []
+
+    def execute(self, query, params=None, **kwargs):
+        if query.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')):
+            super().execute('EXPLAIN (FORMAT JSON) ' + query, params)
+            plan = self.fetchone()['QUERY PLAN'][0]['Plan']
+            ExplainCursor.plans.append((ExplainCursor.route, query, plan))
+        return super().execute(query, params, **kwargs)
+
+    def executemany(self, query, params_seq, **kwargs):
+        # Every statement of the batch has the same plan shape, explain the first one
+        params_seq = list(params_seq)
+        if params_seq:
+            super().execute('EXPLAIN (FORMAT JSON) ' + query, params_seq[0])
+            plan = self.fetchone()['QUERY PLAN'][0]['Plan']
+            ExplainCursor.plans.append((ExplainCursor.route, query, plan))
+        return super().executemany(query, params_seq, **kwargs)
+
+def admin_connect():
+    """Connect to the maintenance database, used to create and drop the scratch database"""
+    return psycopg.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432'),
+        dbname='postgres',
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', ''),
+        sslmode=os.getenv('DB_SSLMODE', 'prefer'),
+        autocommit=True
+    )
+
+def seed(conn, users, reports):
+    """Fill the scratch database with about 13 months of history plus a few live reports"""
+    conn.execute("SELECT create_report_partitions(3, (CURRENT_DATE - INTERVAL '400 days')::date)")
+    conn.execute('''
+        INSERT INTO users (username, email, password_hash, reputation_score)
+        SELECT 'user' || g, 'user' || g || '@example.com', 'x', g %% 100
+        FROM generate_series(1, %s) g
+    ''', (users,))
+    # Historical reports, all expired 30 seconds after they were created and marked EXPIRED
+    conn.execute('''
+        INSERT INTO reports (user_id, type_id, latitude, longitude, description, status, created_at, expires_at)
+        SELECT 1 + g %% %s, 1 + g %% 4, 43.6 + random() * 4.6, 20.3 + random() * 9.4, '', 'EXPIRED', t, t + INTERVAL '30 seconds'
+        FROM (SELECT g, NOW() - random() * INTERVAL '400 days' AS t FROM generate_series(1, %s) g) history
+    ''', (users, reports))
+    # Reports that are live right now (about 0.5%)
+    conn.execute('''
+        INSERT INTO reports (user_id, type_id, latitude, longitude, description, status, created_at, expires_at)
+        SELECT 1 + g %% %s, 1 + g %% 4, 43.6 + random() * 4.6, 20.3 + random() * 9.4, '', 'ACTIVE', NOW(), NOW() + INTERVAL '1 hour'
+        FROM generate_series(1, %s) g
+    ''', (users, max(reports // 200, 1)))
+    conn.execute('''
+        INSERT INTO report_votes (report_id, report_created_at, user_id, vote_type)
+        SELECT id, created_at, 1 + (id::bigint * 7919) %% %s, CASE WHEN id %% 3 = 0 THEN 'remove' ELSE 'keep' END
+        FROM reports WHERE id %% 2 = 0
+    ''', (users,))
+    # The heatmap tiers are filled in the background by heatmap.py otherwise
+    conn.execute('SELECT fold_report_heatmap()')
+    conn.execute('ANALYZE')
+
+def call_routes(client):
+    """Exercise every route the way the frontend does"""
+    def call(route, method, url, **kwargs):
+        ExplainCursor.route = route
+        response = getattr(client, method)(url, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{route} returned {response.status_code}: {response.get_json()}")
+        return response.get_json()
+
+    account = {'username': 'plancheck', 'email': 'plancheck@example.com', 'password': 'plancheck'}
+    call('register', 'post', '/api/auth/register', json=account)
+    token = call('login', 'post', '/api/auth/login', json=account)['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    call('get_profile', 'get', '/api/user/profile', headers=headers)
+    report = call('create_report', 'post', '/api/reports', headers=headers,
+                  json={'latitude': 44.43, 'longitude': 26.10, 'type': 'ACCIDENT'})['report']
+    # A retry with an idempotency key looks up the report created the first time
+    for _ in range(2):
+        call('create_report', 'post', '/api/reports', headers={**headers, 'Idempotency-Key': 'plancheck'},
+             json={'latitude': 44.43, 'longitude': 26.10, 'type': 'ACCIDENT'})
+    page = call('get_reports', 'get', '/api/reports?limit=20', headers=headers)
+    call('get_reports', 'get', f"/api/reports?limit=20&cursor={page['next_cursor']}", headers=headers)
+    call('get_reports', 'get', '/api/reports?limit=500&min_lat=44.3&min_lon=25.9&max_lat=44.6&max_lon=26.3', headers=headers)
+    call('get_reports_along_route', 'post', '/api/reports/route', headers=headers,
+         json={'path': [[45.75, 21.23], [45.10, 22.90], [44.43, 26.10]], 'width_m': 500})
+    call('vote_on_report', 'post', f"/api/reports/{report['id']}/vote", headers=headers, json={'vote': 'keep'})
+    call('vote_on_report', 'post', f"/api/reports/{report['id']}/vote", headers=headers, json={'vote': 'remove'})
+    call('get_statistics', 'get', '/api/statistics')
+    page = call('get_leaderboard', 'get', '/api/leaderboard')
+    call('get_leaderboard', 'get', f"/api/leaderboard?cursor={page['next_cursor']}")
+    call('get_heatmap', 'get', '/api/heatmap?min_lat=44.3&min_lon=25.9&max_lat=44.6&max_lon=26.3')
+
+def find_seq_scans(plan, table_rows):
+    """Yield (table, plan rows, table rows) for every seq scan that should have used an index"""
+    if plan['Node Type'] == 'Seq Scan' and 'Filter' in plan:
+        table = plan['Relation Name']
+        rows = table_rows.get(table, 0)
+        if table not in SMALL_TABLES and rows >= MIN_TABLE_ROWS and plan['Plan Rows'] < rows * MAX_SELECTIVITY:
+            yield table, plan['Plan Rows'], rows
+    for child in plan.get('Plans', []):
+        yield from find_seq_scans(child, table_rows)
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that the API queries use indexes')
+    parser.add_argument('--users', type=int, default=20000, help='number of seeded users (default: 20000)')
+    parser.add_argument('--reports', type=int, default=200000, help='number of seeded reports (default: 200000)')
+    parser.add_argument('--keep', action='store_true', help='do not drop the scratch database afterwards')
+    args = parser.parse_args()
+
+    admin = admin_connect()
+    admin.execute(f'DROP DATABASE IF EXISTS "{PLANCHECK_DB}"')
+    admin.execute(f'CREATE DATABASE "{PLANCHECK_DB}"')
+
+    failures = 0
+    try:
+        conn = psycopg.connect(**{**migrate.DB_CONFIG, 'dbname': PLANCHECK_DB}, autocommit=True)
+        migrate.migrate(conn)
+        print(f"Seeding {args.users} users and {args.reports} reports...")
+        seed(conn, args.users, args.reports)
+        table_rows = {
+            name: rows for name, rows in
+            conn.execute("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'").fetchall()
+        }
+        conn.close()
+
+        # server.py reads DB_NAME when it is imported. Reputation credits are flushed
+        # below instead of by the background thread, cache invalidations stay in-process.
+        os.environ['DB_NAME'] = PLANCHECK_DB
+        os.environ['REPUTATION_FLUSH_SECONDS'] = '3600'
+        os.environ['CACHE_BUS'] = 'local'
+        import db
+        import reputation
+        import server
+
+        def get_explaining_db():
+            return psycopg.connect(
+                **{**migrate.DB_CONFIG, 'dbname': PLANCHECK_DB},
+                row_factory=dict_row,
+                cursor_factory=ExplainCursor
+            )
+        # Reads go through db.get_read_db, which falls back to db.get_db without replicas
+        server.get_db = db.get_db = reputation.get_db = get_explaining_db
+        call_routes(server.app.test_client())
+        ExplainCursor.route = 'reputation_flush'
+        reputation.flush(sweep_orphans=True)
+        # The scratch database is gone by exit, there is nothing left to flush into
+        atexit.unregister(reputation.flush)
+
+        for route, query, plan in ExplainCursor.plans:
+            summary = ' '.join(query.split())[:90]
+            problems = list(find_seq_scans(plan, table_rows))
+            if problems:
+                failures += 1
+                print(f"FAIL {route}: {summary}")
+                for table, plan_rows, rows in problems:
+                    print(f"     Seq Scan on {table} keeps ~{plan_rows:.0f} of {rows:.0f} rows")
+            else:
+                print(f"ok   {route}: {summary}")
+    finally:
+        if not args.keep:
+            admin.execute(f'DROP DATABASE IF EXISTS "{PLANCHECK_DB}" WITH (FORCE)')
+        admin.close()
+
+    print(f"\n{len(ExplainCursor.plans)} queries checked, {failures} regressed")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Route corridors - which reports lie within a given distance of a driving route,
+and how far along the route they are.
+
+The route is a polyline, given as its latitudes and longitudes. It is cut into
+chunks of consecutive segments, each about two kilometers of road (long segments
+are split first). Every chunk's bounding box, grown by the corridor width, is one
+lookup in the spatial index on active reports (see server.py), so the database
+only returns reports near the route instead of every report in the route's overall
+bounding box. A candidate is then measured against the segments of the chunks it
+was found in, not against the whole route, and only those chunks' segments are
+ever prepared for measuring.
+
+Distances are measured on a flat projection around each segment, which for
+segments of a few kilometers is within a few meters of the great-circle distance.
+"""
+
+import math
+from bisect import bisect_right
+from itertools import accumulate
+from geo import EARTH_RADIUS_M
+
+# Meters per degree of latitude
+METERS_PER_DEGREE = math.radians(1) * EARTH_RADIUS_M
+
+# Chunks cover about this many meters of road, or twice the corridor width if more
+CHUNK_MIN_METERS = 2000
+
+def _segment_lengths(lats, lons):
+    """Length in meters of every segment of the polyline, on a flat projection"""
+    cos, radians, hypot = math.cos, math.radians, math.hypot
+    return [
+        hypot((lon2 - lon1) * cos(radians(lat1)), lat2 - lat1) * METERS_PER_DEGREE
+        for lat1, lon1, lat2, lon2 in zip(lats, lons, lats[1:], lons[1:])
+    ]
+
+class RouteCorridor:
+    """A polyline and a corridor width, cut into chunks for index lookups"""
+
+    def __init__(self, lats, lons, width_m, max_length_m=None):
+        """The route's points are given as a list of latitudes and one of longitudes.
+        Raise ValueError if the route is longer than max_length_m."""
+        self.width_m = width_m
+        self.chunk_m = max(CHUNK_MIN_METERS, 2 * width_m)
+        self.lats = list(lats)
+        self.lons = list(lons)
+        lengths = _segment_lengths(self.lats, self.lons)
+        self.length_m = sum(lengths)
+        if max_length_m is not None and self.length_m > max_length_m:
+            raise ValueError('Route too long')
+        if lengths and max(lengths) > self.chunk_m:
+            self._split_long_segments(lengths)
+            lengths = _segment_lengths(self.lats, self.lons)
+        # Distance along the route to every point
+        self.offsets = [0.0, *accumulate(lengths)]
+        self.chunks = self._chunk()
+        self._projected = {}
+
+    def _split_long_segments(self, lengths):
+        """Insert points so that no segment is longer than a chunk"""
+        lats, lons = self.lats[:1], self.lons[:1]
+        for i, length in enumerate(lengths):
+            pieces = math.ceil(length / self.chunk_m)
+            for piece in range(1, pieces):
+                t = piece / pieces
+                lats.append(self.lats[i] + (self.lats[i + 1] - self.lats[i]) * t)
+                lons.append(self.lons[i] + (self.lons[i + 1] - self.lons[i]) * t)
+            lats.append(self.lats[i + 1])
+            lons.append(self.lons[i + 1])
+        self.lats, self.lons = lats, lons
+
+    def _chunk(self):
+        """Return [(first point, last point), ...], consecutive chunks covering every segment"""
+        chunks = []
+        first = 0
+        segments = len(self.offsets) - 1
+        while first < segments:
+            # Up to the last point within chunk_m of road from the first one
+            last = max(first + 1, bisect_right(self.offsets, self.offsets[first] + self.chunk_m) - 1)
+            chunks.append((first, last))
+            first = last
+        return chunks
+
+    def boxes(self):
+        """Return (min_lat, min_lon, max_lat, max_lon) of every chunk, grown by the width"""
+        boxes = []
+        dlat = self.width_m / METERS_PER_DEGREE
+        for first, last in self.chunks:
+            lats = self.lats[first:last + 1]
+            lons = self.lons[first:last + 1]
+            min_lat, max_lat = min(lats), max(lats)
+            dlon = dlat / max(math.cos(math.radians(max(abs(min_lat), abs(max_lat)))), 1e-6)
+            boxes.append((min_lat - dlat, min(lons) - dlon, max_lat + dlat, max(lons) + dlon))
+        return boxes
+
+    def _segments(self, chunk_id):
+        """The segments of a chunk, projected for locate(): (start lat, start lon, meters
+        per degree of longitude, vector in meters, squared length, offset, length)"""
+        segments = self._projected.get(chunk_id)
+        if segments is None:
+            segments = []
+            first, last = self.chunks[chunk_id]
+            for i in range(first, last):
+                lat1, lon1, lat2, lon2 = self.lats[i], self.lons[i], self.lats[i + 1], self.lons[i + 1]
+                meters_per_lon = math.cos(math.radians((lat1 + lat2) / 2)) * METERS_PER_DEGREE
+                sx, sy = (lon2 - lon1) * meters_per_lon, (lat2 - lat1) * METERS_PER_DEGREE
+                segments.append((lat1, lon1, meters_per_lon, sx, sy, sx * sx + sy * sy,
+                                 self.offsets[i], self.offsets[i + 1] - self.offsets[i]))
+            self._projected[chunk_id] = segments
+        return segments
+
+    def locate(self, lat, lon, chunk_ids):
+        """Return (distance from the route, distance along the route) of a point, or None
+        if it is outside the corridor. Only the segments of chunk_ids are checked.
+
+        If the route passes the point more than once, the first pass counts."""
+        best = None
+        width2 = self.width_m * self.width_m
+        for chunk_id in sorted(chunk_ids):
+            for lat1, lon1, meters_per_lon, sx, sy, length2, offset, length in self._segments(chunk_id):
+                # Meters east / north of the segment's start, then to its closest point
+                px, py = (lon - lon1) * meters_per_lon, (lat - lat1) * METERS_PER_DEGREE
+                t = (px * sx + py * sy) / length2 if length2 else 0.0
+                t = 0.0 if t < 0 else 1.0 if t > 1 else t
+                dx, dy = px - t * sx, py - t * sy
+                distance2 = dx * dx + dy * dy
+                if distance2 <= width2:
+                    if best is None or distance2 < best[0]:
+                        best = (distance2, offset + t * length)
+                elif best is not None:
+                    # Left the corridor again after the first pass
+                    return math.sqrt(best[0]), best[1]
+        return (math.sqrt(best[0]), best[1]) if best else None
+
+    def distance(self, lat, lon):
+        """Distance in meters from a point to the closest segment of the whole route"""
+        best = math.inf
+        for chunk_id in range(len(self.chunks)):
+            for lat1, lon1, meters_per_lon, sx, sy, length2, _, _ in self._segments(chunk_id):
+                px, py = (lon - lon1) * meters_per_lon, (lat - lat1) * METERS_PER_DEGREE
+                t = min(1.0, max(0.0, (px * sx + py * sy) / length2)) if length2 else 0.0
+                best = min(best, math.hypot(px - t * sx, py - t * sy))
+        return best
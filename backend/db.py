@@ -0,0 +1,403 @@
+"""
+Database connections - the primary database plus optional read replicas.
+
+Writes always go to the primary. Read-only routes call get_read_db(), which picks a
+healthy replica whose replication lag is within DB_REPLICA_MAX_LAG_SECONDS. A user
+who has just written reads from the primary for a short while, so they always see
+their own changes.
+
+A slow or unreachable database must not hold every worker thread:
+- connecting gives up after DB_CONNECT_TIMEOUT_SECONDS,
+- every statement has a time budget, DB_STATEMENT_TIMEOUT_MS unless the request set
+  its own with set_query_budget(). The server cancels statements running longer, and
+  a connection whose statement has had no answer a second after its budget (a stalled
+  network) is cut off on our side,
+- at most DB_MAX_CONNECTIONS connections are open per process, a request waits at most
+  DB_CHECKOUT_TIMEOUT_SECONDS for one,
+- after DB_BREAKER_FAILURES connection failures in a row (failing to connect, or a
+  connection lost mid statement) the circuit breaker opens: get_db() returns None at
+  once, without trying, and every DB_BREAKER_RESET_SECONDS one request is let through
+  to see if the database is back.
+"""
+
+import contextlib
+import itertools
+import os
+import socket
+import threading
+import time
+import weakref
+import psycopg
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', '5432'),
+    'database': os.getenv('DB_NAME', 'roadalert'),
+    'user': os.getenv('DB_USER', 'postgres'),
+    'password': os.getenv('DB_PASSWORD', '')
+}
+
+# Read replicas as comma separated host or host:port, they share the primary's database and credentials
+DB_REPLICAS = [address.strip() for address in os.getenv('DB_REPLICAS', '').split(',') if address.strip()]
+
+# Replicas further behind the primary than this are taken out of rotation
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', 5))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv('DB_REPLICA_CHECK_INTERVAL_SECONDS', 2))
+
+# A replica can be up to max lag + one check interval behind, so after a write the
+# user's reads stay on the primary at least that long
+READ_YOUR_WRITES_SECONDS = float(os.getenv(
+    'DB_READ_YOUR_WRITES_SECONDS',
+    REPLICA_MAX_LAG_SECONDS + REPLICA_CHECK_INTERVAL_SECONDS
+))
+
+# Seconds since the last replayed transaction, or 0 if the replica has replayed
+# everything it received from the primary. NULL if its WAL receiver is not streaming,
+# or has heard nothing from the primary for longer than wal_receiver_timeout: the
+# replica then receives nothing, so having replayed everything says nothing about
+# how far behind it is. Reading pg_stat_wal_receiver needs pg_read_all_stats.
+REPLICA_LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN receiver.status IS DISTINCT FROM 'streaming'
+            OR receiver.last_msg_receipt_time < NOW() - GREATEST(
+                current_setting('wal_receiver_timeout')::interval, INTERVAL '1 minute') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 1e9)
+    END AS lag
+    FROM (SELECT 1) AS one LEFT JOIN pg_stat_wal_receiver AS receiver ON true
+'''
+
+# ==================== TIMEOUTS AND CIRCUIT BREAKER ====================
+
+DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv('DB_CONNECT_TIMEOUT_SECONDS', 3))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 5000))
+DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', 20))
+DB_CHECKOUT_TIMEOUT_SECONDS = float(os.getenv('DB_CHECKOUT_TIMEOUT_SECONDS', 2))
+DB_BREAKER_FAILURES = int(os.getenv('DB_BREAKER_FAILURES', 5))
+DB_BREAKER_RESET_SECONDS = float(os.getenv('DB_BREAKER_RESET_SECONDS', 10))
+
+# How long after its budget a statement without any answer is cut off on our side
+STALLED_GRACE_SECONDS = 1.0
+
+class CircuitBreaker:
+    """Counts database failures in a row and stops new attempts once there are too many.
+
+    closed: everything goes through. open: nothing does, until reset_seconds have
+    passed; then it is half open and lets one attempt through every reset_seconds,
+    the first success closes it again.
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.next_attempt_at = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Whether to try the database now"""
+        if self.state == 'closed':
+            return True
+        with self.lock:
+            if time.monotonic() < self.next_attempt_at:
+                return False
+            self.state = 'half_open'
+            self.next_attempt_at = time.monotonic() + self.reset_seconds
+            return True
+
+    def record_success(self):
+        if self.state == 'closed' and not self.failures:
+            return
+        with self.lock:
+            if self.state != 'closed':
+                print("Database circuit breaker closed, the database is back")
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                if self.state == 'closed':
+                    print(f"Database circuit breaker open after {self.failures} failures in a row")
+                    self.opened_at = time.monotonic()
+                self.state = 'open'
+                self.next_attempt_at = time.monotonic() + self.reset_seconds
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'open_seconds': round(time.monotonic() - self.opened_at, 1) if self.state != 'closed' else None
+        }
+
+breaker = CircuitBreaker(DB_BREAKER_FAILURES, DB_BREAKER_RESET_SECONDS)
+_slots = threading.BoundedSemaphore(DB_MAX_CONNECTIONS)
+_slots_in_use = 0
+_slots_lock = threading.Lock()
+_budget = threading.local()
+
+def set_query_budget(ms):
+    """Statement time budget in ms for the connections this thread opens from now on"""
+    _budget.ms = ms
+
+class _Watchdog:
+    """Cuts off connections whose statement has had no answer long after its budget"""
+
+    def __init__(self):
+        self.deadlines = {}
+        self.lock = threading.Lock()
+        self.started = False
+
+    def watch(self, conn, seconds):
+        with self.lock:
+            token = object()
+            self.deadlines[token] = (time.monotonic() + seconds, conn)
+            if not self.started:
+                self.started = True
+                threading.Thread(target=self._run, daemon=True).start()
+            return token
+
+    def done(self, token):
+        with self.lock:
+            self.deadlines.pop(token, None)
+
+    def _run(self):
+        while True:
+            time.sleep(0.1)
+            now = time.monotonic()
+            with self.lock:
+                for token, (deadline, conn) in list(self.deadlines.items()):
+                    if now < deadline:
+                        continue
+                    del self.deadlines[token]
+                    # Shutting down the socket (through a duplicate of it) makes the
+                    # waiting statement fail with a connection error right away
+                    try:
+                        with socket.socket(fileno=os.dup(conn.fileno())) as sock:
+                            sock.shutdown(socket.SHUT_RDWR)
+                    except (OSError, psycopg.Error):
+                        pass
+
+_watchdog = _Watchdog()
+
+@contextlib.contextmanager
+def query_guard(conn):
+    """Run statements on conn with its deadline, report the outcome to the circuit breaker"""
+    budget_ms = getattr(conn, 'budget_ms', None)
+    conn_breaker = getattr(conn, 'breaker', None)
+    token = _watchdog.watch(conn, budget_ms / 1000 + STALLED_GRACE_SECONDS) if budget_ms else None
+    try:
+        yield
+    except psycopg.Error:
+        # Only a lost connection (or one cut off above) counts against the database. A
+        # statement timeout, lock timeout or deadlock is an answer from a working server
+        # and fails just this request.
+        if conn_breaker:
+            if conn.broken or conn.closed:
+                conn_breaker.record_failure()
+            else:
+                conn_breaker.record_success()
+        raise
+    else:
+        if conn_breaker:
+            conn_breaker.record_success()
+    finally:
+        if token:
+            _watchdog.done(token)
+
+class GuardedCursor(psycopg.Cursor):
+    def execute(self, query, params=None, **kwargs):
+        with query_guard(self.connection):
+            return super().execute(query, params, **kwargs)
+
+    def executemany(self, query, params_seq, **kwargs):
+        with query_guard(self.connection):
+            return super().executemany(query, params_seq, **kwargs)
+
+class GuardedConnection(psycopg.Connection):
+    """Connection whose statements run under query_guard(), giving back its slot when closed"""
+    budget_ms = None
+    breaker = None
+    slot = None
+
+    def commit(self):
+        with query_guard(self):
+            super().commit()
+
+    def close(self):
+        super().close()
+        if self.slot:
+            self.slot()
+
+def _acquire_slot():
+    global _slots_in_use
+    if not _slots.acquire(timeout=DB_CHECKOUT_TIMEOUT_SECONDS):
+        return False
+    with _slots_lock:
+        _slots_in_use += 1
+    return True
+
+def _release_slot():
+    global _slots_in_use
+    with _slots_lock:
+        _slots_in_use -= 1
+    _slots.release()
+
+def connect(host, port, **kwargs):
+    """Open a connection to host:port with the configured database and credentials"""
+    budget_ms = getattr(_budget, 'ms', DB_STATEMENT_TIMEOUT_MS)
+    kwargs.setdefault('connect_timeout', DB_CONNECT_TIMEOUT_SECONDS)
+    conn = GuardedConnection.connect(
+        host=host,
+        port=port,
+        dbname=DB_CONFIG['database'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        sslmode=os.getenv('DB_SSLMODE', 'prefer'),
+        row_factory=dict_row,
+        cursor_factory=GuardedCursor,
+        options=f'-c statement_timeout={budget_ms}',
+        **kwargs
+    )
+    conn.budget_ms = budget_ms
+    return conn
+
+def checkout(host, port, breaker=None):
+    """Open a connection for a request, holding one of the DB_MAX_CONNECTIONS slots until
+    it is closed. Raise ConnectionError if no slot frees up in time or the breaker is open."""
+    if breaker and not breaker.allow():
+        raise ConnectionError('circuit breaker open')
+    if not _acquire_slot():
+        raise ConnectionError(f'no free connection slot within {DB_CHECKOUT_TIMEOUT_SECONDS}s')
+    try:
+        conn = connect(host, port)
+    except Exception:
+        _release_slot()
+        if breaker:
+            breaker.record_failure()
+        raise
+    conn.breaker = breaker
+    # Called by close(), or when the connection is garbage collected without it
+    conn.slot = weakref.finalize(conn, _release_slot)
+    return conn
+
+def database_status():
+    """Circuit breaker and connection slots, for the health check endpoint (no query)"""
+    return {
+        'breaker': breaker.stats(),
+        'connections': _slots_in_use,
+        'max_connections': DB_MAX_CONNECTIONS
+    }
+
+def get_db():
+    """Get a connection to the primary, or None if it is unavailable"""
+    try:
+        return checkout(DB_CONFIG['host'], DB_CONFIG['port'], breaker)
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return None
+
+# ==================== READ REPLICAS ====================
+
+class Replica:
+    """A read replica and the result of its last health check"""
+
+    def __init__(self, address):
+        host, _, port = address.partition(':')
+        self.host = host
+        self.port = port or DB_CONFIG['port']
+        self.healthy = False
+        self.lag = None
+
+    def check(self):
+        """Measure replication lag and put the replica in or out of rotation"""
+        try:
+            with connect(self.host, self.port, connect_timeout=2, autocommit=True) as conn:
+                lag = conn.execute(REPLICA_LAG_SQL).fetchone()['lag']
+            if lag is None:
+                raise RuntimeError('WAL receiver not streaming from the primary')
+            self.lag = float(lag)
+            healthy = self.lag <= REPLICA_MAX_LAG_SECONDS
+            if healthy != self.healthy:
+                state = 'back in rotation' if healthy else f'out of rotation, {self.lag:.1f}s behind'
+                print(f"Replica {self.host}:{self.port} {state}")
+        except Exception as e:
+            if self.healthy:
+                print(f"Replica {self.host}:{self.port} out of rotation: {e}")
+            healthy = False
+            self.lag = None
+        self.healthy = healthy
+
+_replicas = [Replica(address) for address in DB_REPLICAS]
+_round_robin = itertools.count()
+_monitor_lock = threading.Lock()
+_monitor_started = False
+
+# user_id -> time.monotonic() of the user's last write
+_last_write_at = {}
+
+def _monitor_replicas():
+    while True:
+        time.sleep(REPLICA_CHECK_INTERVAL_SECONDS)
+        for replica in _replicas:
+            replica.check()
+
+def _start_replica_monitor():
+    """Check the replicas once and keep checking them in a background thread"""
+    global _monitor_started
+    with _monitor_lock:
+        if _monitor_started:
+            return
+        _monitor_started = True
+    for replica in _replicas:
+        replica.check()
+    threading.Thread(target=_monitor_replicas, daemon=True).start()
+
+def note_write(user_id):
+    """Remember that a user just wrote, so their next reads go to the primary"""
+    now = time.monotonic()
+    _last_write_at[user_id] = now
+    if len(_last_write_at) > 10000:
+        for uid, written_at in list(_last_write_at.items()):
+            if now - written_at > READ_YOUR_WRITES_SECONDS:
+                _last_write_at.pop(uid, None)
+
+def get_read_db(user_id=None):
+    """Get a connection for read-only queries, from a replica when one is usable"""
+    if not _replicas:
+        return get_db()
+    written_at = _last_write_at.get(user_id)
+    if written_at is not None and time.monotonic() - written_at < READ_YOUR_WRITES_SECONDS:
+        return get_db()
+
+    _start_replica_monitor()
+    healthy = [replica for replica in _replicas if replica.healthy]
+    start = next(_round_robin)
+    for i in range(len(healthy)):
+        replica = healthy[(start + i) % len(healthy)]
+        try:
+            return checkout(replica.host, replica.port)
+        except ConnectionError as e:
+            # No free slot, not the replica's fault
+            print(f"Database connection error: {e}")
+            return None
+        except Exception as e:
+            print(f"Replica {replica.host}:{replica.port} out of rotation: {e}")
+            replica.healthy = False
+    return get_db()
+
+def replica_status():
+    """Health of every configured replica, for the health check endpoint"""
+    return [
+        {'host': f"{replica.host}:{replica.port}", 'healthy': replica.healthy, 'lag_seconds': replica.lag}
+        for replica in _replicas
+    ]
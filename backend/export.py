@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Bulk Export - streams reports or votes out of the database as NDJSON, CSV or
+Parquet. Rows are read through a server-side cursor in chunks, so memory use
+stays the same no matter how many rows are exported.
+
+    python export.py reports --format csv --from 2025-01-01 --to 2025-02-01 -o reports.csv
+    python export.py votes --types POLICE,ACCIDENT > votes.ndjson
+
+The same export is available over HTTP at /api/export/<dataset> (see server.py).
+Parquet needs pyarrow (pip install pyarrow).
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from db import get_read_db
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+# Rows fetched from the server-side cursor at a time
+EXPORT_CHUNK_ROWS = 5000
+
+# Columns of each dataset with their Parquet type
+EXPORT_COLUMNS = {
+    'reports': [
+        ('id', 'int32'), ('user_id', 'int32'), ('username', 'string'), ('type_name', 'string'),
+        ('latitude', 'float64'), ('longitude', 'float64'), ('description', 'string'),
+        ('status', 'string'), ('created_at', 'timestamp'), ('expires_at', 'timestamp')
+    ],
+    'votes': [
+        ('id', 'int32'), ('report_id', 'int32'), ('type_name', 'string'), ('user_id', 'int32'),
+        ('vote_type', 'string'), ('created_at', 'timestamp')
+    ]
+}
+
+# Filtered on created_at, which also limits the reports partitions that are read
+EXPORT_QUERIES = {
+    'reports': '''
+        SELECT r.id, r.user_id, u.username, it.type_name, r.latitude::float8 as latitude,
+               r.longitude::float8 as longitude, r.description, r.status, r.created_at, r.expires_at
+        FROM reports r
+        LEFT JOIN users u ON r.user_id = u.id
+        LEFT JOIN incident_types it ON r.type_id = it.id
+        WHERE r.created_at >= %(from)s AND r.created_at < %(to)s
+          AND (%(types)s::text[] IS NULL OR it.type_name = ANY(%(types)s))
+    ''',
+    'votes': '''
+        SELECT v.id, v.report_id, it.type_name, v.user_id, v.vote_type, v.created_at
+        FROM report_votes v
+        JOIN reports r ON r.id = v.report_id AND r.created_at = v.report_created_at
+        LEFT JOIN incident_types it ON r.type_id = it.id
+        WHERE v.created_at >= %(from)s AND v.created_at < %(to)s
+          AND (%(types)s::text[] IS NULL OR it.type_name = ANY(%(types)s))
+    '''
+}
+
+def parquet_available():
+    """Whether the optional pyarrow dependency for Parquet exports is installed"""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def iter_chunks(conn, dataset, time_from, time_to, types=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield lists of at most chunk_rows rows, read through a server-side cursor"""
+    with conn.cursor(name=f'export_{dataset}') as cursor:
+        cursor.execute(EXPORT_QUERIES[dataset], {'from': time_from, 'to': time_to, 'types': types})
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                return
+            yield rows
+
+def _text_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def ndjson_stream(chunks, columns):
+    """Encode chunks of rows as newline-delimited JSON"""
+    for rows in chunks:
+        yield ''.join(
+            json.dumps({name: _text_value(row[name]) for name, _ in columns}) + '\n' for row in rows
+        ).encode('utf-8')
+
+def csv_stream(chunks, columns):
+    """Encode chunks of rows as CSV with a header line"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for rows in chunks:
+        writer.writerows([_text_value(row[name]) for name, _ in columns] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+class _ChunkSink:
+    """Write-only file for pyarrow that hands out what was written since the last drain()"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+def parquet_stream(chunks, columns):
+    """Encode chunks of rows as a Parquet file with one row group per chunk"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {'int32': pa.int32(), 'float64': pa.float64(), 'string': pa.string(), 'timestamp': pa.timestamp('us')}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    for rows in chunks:
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def export_stream(conn, dataset, export_format, time_from, time_to, types=None):
+    """Yield the export of a dataset as bytes, chunk by chunk"""
+    encoders = {'ndjson': ndjson_stream, 'csv': csv_stream, 'parquet': parquet_stream}
+    chunks = iter_chunks(conn, dataset, time_from, time_to, types)
+    return encoders[export_format](chunks, EXPORT_COLUMNS[dataset])
+
+def main():
+    parser = argparse.ArgumentParser(description='Export reports or votes')
+    parser.add_argument('dataset', choices=sorted(EXPORT_QUERIES))
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+    parser.add_argument('--from', dest='time_from', type=datetime.fromisoformat, default=datetime(1970, 1, 1),
+                        help='only rows created at or after this ISO date/time (UTC)')
+    parser.add_argument('--to', dest='time_to', type=datetime.fromisoformat, default=None,
+                        help='only rows created before this ISO date/time (UTC, default: now)')
+    parser.add_argument('--types', help='comma separated incident types, e.g. POLICE,ACCIDENT')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args()
+
+    if args.format == 'parquet' and not parquet_available():
+        sys.exit('Parquet export needs pyarrow: pip install pyarrow')
+
+    conn = get_read_db()
+    if not conn:
+        sys.exit(1)
+    types = args.types.split(',') if args.types else None
+    time_to = args.time_to or datetime.utcnow()
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for data in export_stream(conn, args.dataset, args.format, args.time_from, time_to, types):
+            out.write(data)
+    finally:
+        if args.output:
+            out.close()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
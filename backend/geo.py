@@ -0,0 +1,128 @@
+"""
+Geographic helpers - geohash encoding/decoding, bounding box coverage, distances
+and point-in-area tests.
+
+Geohash cells are rectangles: every character adds 5 bits, alternately splitting
+longitude and latitude in half. A cell's hash is a prefix of the hashes of all
+cells inside it.
+
+Distances are great-circle distances on a spherical Earth, precise to about 0.5%,
+plenty for alert radii and route corridors.
+"""
+
+import math
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+def geohash_encode(lat, lon, precision):
+    """Return the geohash of the cell containing (lat, lon), same as geohash_encode() in SQL"""
+    lat_min, lat_max = -90.0, 90.0
+    lon_min, lon_max = -180.0, 180.0
+    even = True
+    bits = 0
+    char = 0
+    geohash = []
+    while len(geohash) < precision:
+        if even:
+            mid = (lon_min + lon_max) / 2
+            if lon >= mid:
+                char = char * 2 + 1
+                lon_min = mid
+            else:
+                char = char * 2
+                lon_max = mid
+        else:
+            mid = (lat_min + lat_max) / 2
+            if lat >= mid:
+                char = char * 2 + 1
+                lat_min = mid
+            else:
+                char = char * 2
+                lat_max = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            geohash.append(GEOHASH_BASE32[char])
+            bits = 0
+            char = 0
+    return ''.join(geohash)
+
+def geohash_bounds(geohash):
+    """Return (min_lat, min_lon, max_lat, max_lon) of a geohash cell"""
+    lat_min, lat_max = -90.0, 90.0
+    lon_min, lon_max = -180.0, 180.0
+    even = True
+    for c in geohash:
+        value = GEOHASH_BASE32.index(c)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_min + lon_max) / 2
+                if bit:
+                    lon_min = mid
+                else:
+                    lon_max = mid
+            else:
+                mid = (lat_min + lat_max) / 2
+                if bit:
+                    lat_min = mid
+                else:
+                    lat_max = mid
+            even = not even
+    return lat_min, lon_min, lat_max, lon_max
+
+def geohash_cell_size(precision):
+    """Return (height, width) in degrees of a geohash cell at this precision"""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+def geohash_cover(min_lat, min_lon, max_lat, max_lon, precision):
+    """Return the geohash cells at this precision that intersect the bounding box"""
+    height, width = geohash_cell_size(precision)
+    first = geohash_bounds(geohash_encode(min_lat, min_lon, precision))
+    cells = []
+    lat = first[0] + height / 2
+    while lat - height / 2 <= max_lat:
+        lon = first[1] + width / 2
+        while lon - width / 2 <= max_lon:
+            cells.append(geohash_encode(lat, lon, precision))
+            lon += width
+        lat += height
+    # Points on the edge of the world map to the same cell, keep each cell once
+    return list(dict.fromkeys(cells))
+
+EARTH_RADIUS_M = 6371008.8
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters between two points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+def circle_bounds(lat, lon, radius_m):
+    """Return (min_lat, min_lon, max_lat, max_lon) of a box containing the circle"""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+def polygon_bounds(polygon):
+    """Return (min_lat, min_lon, max_lat, max_lon) of a polygon given as [(lat, lon), ...]"""
+    lats = [lat for lat, _ in polygon]
+    lons = [lon for _, lon in polygon]
+    return min(lats), min(lons), max(lats), max(lons)
+
+def point_in_polygon(lat, lon, polygon):
+    """Whether (lat, lon) is inside the polygon [(lat, lon), ...], by ray casting"""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lat_i > lat) != (lat_j > lat) and lon < (lon_j - lon_i) * (lat - lat_i) / (lat_j - lat_i) + lon_i:
+            inside = not inside
+        j = i
+    return inside
@@ -0,0 +1,105 @@
+"""
+Geofence matching - finds the area subscriptions that contain a new report.
+
+Subscriptions are circles or polygons with an optional set of incident types. They
+are kept in memory in a uniform grid: every subscription is listed in each grid cell
+its bounding box overlaps. Matching a report looks up the single cell containing
+it and runs the exact circle / polygon test on that cell's subscriptions only, so
+the cost depends on how many areas overlap the report, not on how many exist.
+
+Areas are limited in size (see server.py), which bounds the cells per subscription.
+"""
+
+import math
+import threading
+from geo import EARTH_RADIUS_M, circle_bounds, haversine_m, point_in_polygon, polygon_bounds
+
+# Grid cell size in degrees, about 5.5 x 3.9 km in Romania
+GRID_CELL_DEGREES = 0.05
+
+class Area:
+    """One subscription: a circle (center + radius) or a polygon, and its incident types"""
+
+    __slots__ = ('id', 'user_id', 'types', 'center', 'radius_m', 'polygon', 'bounds', 'lon_scale', 'radius_deg2')
+
+    def __init__(self, id, user_id, types=None, center=None, radius_m=None, polygon=None):
+        self.id = id
+        self.user_id = user_id
+        self.types = frozenset(types) if types else None
+        self.center = tuple(center) if center else None
+        self.radius_m = radius_m
+        self.polygon = [tuple(point) for point in polygon] if polygon else None
+        if self.polygon:
+            self.bounds = polygon_bounds(self.polygon)
+        else:
+            self.bounds = circle_bounds(self.center[0], self.center[1], radius_m)
+            # Circles are tested on a flat projection around their center first, it is
+            # within 0.3% of the great-circle distance for radii up to 50 km
+            self.lon_scale = math.cos(math.radians(self.center[0]))
+            self.radius_deg2 = math.degrees(radius_m / EARTH_RADIUS_M) ** 2
+
+    def contains(self, lat, lon):
+        if self.polygon:
+            return point_in_polygon(lat, lon, self.polygon)
+        dlat = lat - self.center[0]
+        dlon = (lon - self.center[1]) * self.lon_scale
+        distance2 = dlat * dlat + dlon * dlon
+        if distance2 < self.radius_deg2 * 0.98:
+            return True
+        if distance2 > self.radius_deg2 * 1.02:
+            return False
+        return haversine_m(self.center[0], self.center[1], lat, lon) <= self.radius_m
+
+class GeofenceIndex:
+    """Grid index of areas, safe to use from several threads"""
+
+    def __init__(self, cell_degrees=GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        self.areas = {}
+        self.lock = threading.Lock()
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def _cells_of(self, area):
+        min_lat, min_lon, max_lat, max_lon = area.bounds
+        (row_min, col_min), (row_max, col_max) = self._cell(min_lat, min_lon), self._cell(max_lat, max_lon)
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                yield row, col
+
+    def add(self, area):
+        """Add an area, replacing the one with the same id"""
+        with self.lock:
+            self._remove(area.id)
+            self.areas[area.id] = area
+            for cell in self._cells_of(area):
+                self.cells.setdefault(cell, []).append(area)
+
+    def remove(self, area_id):
+        with self.lock:
+            self._remove(area_id)
+
+    def _remove(self, area_id):
+        area = self.areas.pop(area_id, None)
+        if area is None:
+            return
+        for cell in self._cells_of(area):
+            # Copy on write, so match() never sees a list while it changes
+            remaining = [other for other in self.cells[cell] if other.id != area_id]
+            if remaining:
+                self.cells[cell] = remaining
+            else:
+                del self.cells[cell]
+
+    def match(self, lat, lon, type_name):
+        """Return the areas containing (lat, lon) that want reports of type_name"""
+        candidates = self.cells.get(self._cell(lat, lon), ())
+        return [
+            area for area in candidates
+            if (area.types is None or type_name in area.types) and area.contains(lat, lon)
+        ]
+
+    def __len__(self):
+        return len(self.areas)
@@ -0,0 +1,53 @@
+"""
+Heatmap rollup folding - new and deleted reports reach the heatmap tiers in batches.
+
+The trigger on reports only appends a row per report to report_heatmap_delta (see
+migrations/V010__heatmap_tiers.sql), so reports in the same cell never wait on each
+other. Every HEATMAP_FOLD_SECONDS a background thread calls fold_report_heatmap(),
+which adds the deltas to the hourly, daily and monthly rollups and deletes them in
+one transaction. Every process runs the thread; a fold already running elsewhere
+makes the others skip that round.
+
+/api/heatmap therefore lags behind new reports by up to HEATMAP_FOLD_SECONDS.
+"""
+
+import os
+import threading
+import time
+from db import get_db
+
+HEATMAP_FOLD_SECONDS = float(os.getenv('HEATMAP_FOLD_SECONDS', 5))
+
+_lock = threading.Lock()
+_folder_started = False
+
+def fold():
+    """Add pending report deltas to the heatmap rollups, return the number folded"""
+    conn = get_db()
+    if not conn:
+        return 0
+    try:
+        folded = conn.execute('SELECT fold_report_heatmap() AS folded').fetchone()['folded']
+        conn.commit()
+        return folded
+    except Exception as e:
+        # Nothing was deleted, the deltas are folded by the next round
+        conn.rollback()
+        print(f"Heatmap fold error: {e}")
+        return 0
+    finally:
+        conn.close()
+
+def _fold_periodically():
+    while True:
+        time.sleep(HEATMAP_FOLD_SECONDS)
+        fold()
+
+def start_folder():
+    """Start the background fold thread, once per process"""
+    global _folder_started
+    with _lock:
+        if _folder_started:
+            return
+        _folder_started = True
+    threading.Thread(target=_fold_periodically, daemon=True).start()
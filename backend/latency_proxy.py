@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Latency Proxy - a TCP proxy that delays every packet, to simulate a remote
+database (e.g. Azure) with a local PostgreSQL.
+
+    python latency_proxy.py --listen 6432 --target localhost:5432 --rtt-ms 20
+    DB_PORT=6432 python server.py
+
+Data in each direction is delivered rtt/2 after it was received, without
+holding back the data behind it, so pipelined traffic behaves like on a real
+network link.
+"""
+
+import argparse
+import queue
+import socket
+import threading
+import time
+
+class LatencyProxy:
+    """Forwards connections from listen_port to target, adding rtt_ms of round-trip latency"""
+
+    def __init__(self, target_host, target_port, rtt_ms, listen_port=0):
+        self.target = (target_host, int(target_port))
+        self.rtt_ms = rtt_ms
+        self.server = socket.create_server(('127.0.0.1', listen_port))
+        self.port = self.server.getsockname()[1]
+
+    def start(self):
+        """Accept connections in a background thread and return self"""
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client):
+        try:
+            upstream = socket.create_connection(self.target)
+        except OSError:
+            client.close()
+            return
+        for sock in (client, upstream):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        threading.Thread(target=self._pipe, args=(client, upstream), daemon=True).start()
+        threading.Thread(target=self._pipe, args=(upstream, client), daemon=True).start()
+
+    def _pipe(self, src, dst):
+        """Copy src to dst, delivering every chunk half a round trip after it arrived"""
+        pending = queue.Queue()
+
+        def deliver():
+            while True:
+                deliver_at, data = pending.get()
+                time.sleep(max(0, deliver_at - time.monotonic()))
+                try:
+                    if not data:
+                        dst.shutdown(socket.SHUT_WR)
+                        return
+                    dst.sendall(data)
+                except OSError:
+                    return
+
+        threading.Thread(target=deliver, daemon=True).start()
+        while True:
+            try:
+                data = src.recv(65536)
+            except OSError:
+                data = b''
+            pending.put((time.monotonic() + self.rtt_ms / 2000, data))
+            if not data:
+                return
+
+    def close(self):
+        self.server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='TCP proxy that adds network latency')
+    parser.add_argument('--listen', type=int, default=6432, help='local port to listen on (default: 6432)')
+    parser.add_argument('--target', default='localhost:5432', help='host:port to forward to (default: localhost:5432)')
+    parser.add_argument('--rtt-ms', type=float, default=20, help='added round-trip time in ms (default: 20)')
+    args = parser.parse_args()
+
+    host, _, port = args.target.partition(':')
+    proxy = LatencyProxy(host, port or 5432, args.rtt_ms, args.listen).start()
+    print(f"Forwarding localhost:{proxy.port} -> {args.target} with {args.rtt_ms}ms RTT (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        proxy.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Database Migrations - applies the versioned SQL files in migrations/ in order.
+
+Files are named V<version>__<description>.sql. Each one runs in its own transaction
+and is recorded in schema_migrations together with a checksum of its contents, so
+an already applied migration is never run twice and editing one is detected.
+
+    python migrate.py           # apply pending migrations
+    python migrate.py --status  # list migrations and whether they are applied
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import psycopg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connection details
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', '5432'),
+    'dbname': os.getenv('DB_NAME', 'roadalert'),
+    'user': os.getenv('DB_USER', 'postgres'),
+    'password': os.getenv('DB_PASSWORD', ''),
+    'sslmode': os.getenv('DB_SSLMODE', 'prefer')
+}
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^V(\d+)__(\w+)\.sql$')
+
+# Arbitrary key for pg_advisory_lock, so two processes never migrate at the same time
+MIGRATION_LOCK_ID = 727271
+
+def load_migrations():
+    """Return (version, name, sql, checksum) for every migration file, ordered by version"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, filename), encoding='utf-8') as f:
+            sql = f.read()
+        checksum = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+        migrations.append((int(match.group(1)), match.group(2), sql, checksum))
+    migrations.sort()
+    return migrations
+
+def get_applied(conn):
+    """Return {version: checksum} of the migrations already applied"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum VARCHAR(64) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    rows = conn.execute('SELECT version, checksum FROM schema_migrations').fetchall()
+    return {version: checksum for version, checksum in rows}
+
+def migrate(conn):
+    """Apply all pending migrations and return the versions that were applied"""
+    conn.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+    try:
+        applied = get_applied(conn)
+        newly_applied = []
+        for version, name, sql, checksum in load_migrations():
+            if version in applied:
+                if applied[version] != checksum:
+                    raise RuntimeError(f"Migration V{version:03d}__{name} was modified after it was applied")
+                continue
+            print(f"Applying V{version:03d}__{name}...")
+            with conn.transaction():
+                conn.execute(sql)
+                conn.execute(
+                    'INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)',
+                    (version, name, checksum)
+                )
+            newly_applied.append(version)
+        return newly_applied
+    finally:
+        conn.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+
+def print_status(conn):
+    """Print every migration and whether it has been applied"""
+    applied = get_applied(conn)
+    for version, name, sql, checksum in load_migrations():
+        if version not in applied:
+            state = 'pending'
+        elif applied[version] != checksum:
+            state = 'MODIFIED'
+        else:
+            state = 'applied'
+        print(f"V{version:03d}__{name}: {state}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply RoadAlert database migrations')
+    parser.add_argument('--status', action='store_true', help='only show which migrations are applied')
+    args = parser.parse_args()
+
+    conn = psycopg.connect(**DB_CONFIG, autocommit=True)
+    try:
+        if args.status:
+            print_status(conn)
+        else:
+            applied = migrate(conn)
+            print(f"Applied {len(applied)} migration(s), database is up to date")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+-- RoadAlert - Initial schema
+-- Same tables as the original database.sql. Everything uses IF NOT EXISTS so that
+-- databases created with the old database.sql can be brought under migrate.py.
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    reputation_score INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS incident_types (
+    id SERIAL PRIMARY KEY,
+    type_name VARCHAR(50) UNIQUE NOT NULL,
+    icon_url VARCHAR(255)
+);
+
+CREATE TABLE IF NOT EXISTS reports (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    type_id INTEGER REFERENCES incident_types(id),
+    latitude DECIMAL(10, 8) NOT NULL,
+    longitude DECIMAL(11, 8) NOT NULL,
+    description TEXT,
+    status VARCHAR(20) DEFAULT 'ACTIVE',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP  -- TTL: reports expire after this time unless extended
+);
+
+ALTER TABLE reports ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP;
+
+-- Legacy - for general votes
+CREATE TABLE IF NOT EXISTS votes (
+    id SERIAL PRIMARY KEY,
+    report_id INTEGER REFERENCES reports(id) ON DELETE CASCADE,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    vote_type VARCHAR(10) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(report_id, user_id)
+);
+
+-- Keep/remove voting system
+CREATE TABLE IF NOT EXISTS report_votes (
+    id SERIAL PRIMARY KEY,
+    report_id INTEGER REFERENCES reports(id) ON DELETE CASCADE,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    vote_type VARCHAR(10) NOT NULL CHECK (vote_type IN ('keep', 'remove')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(report_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
+CREATE INDEX IF NOT EXISTS idx_reports_status ON reports(status);
+CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports(created_at);
+CREATE INDEX IF NOT EXISTS idx_reports_location ON reports(latitude, longitude);
+CREATE INDEX IF NOT EXISTS idx_votes_report_id ON votes(report_id);
+CREATE INDEX IF NOT EXISTS idx_report_votes_report_id ON report_votes(report_id);
+
+INSERT INTO incident_types (type_name, icon_url) VALUES
+    ('ACCIDENT', '/icons/accident.png'),
+    ('POLICE', '/icons/police.png'),
+    ('POTHOLE', '/icons/pothole.png'),
+    ('TRAFFIC_JAM', '/icons/traffic.png')
+ON CONFLICT (type_name) DO NOTHING;
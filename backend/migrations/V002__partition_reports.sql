@@ -0,0 +1,160 @@
+-- RoadAlert - Monthly partitioning of reports and report_votes
+-- Converts the tables from V001 in place, existing rows are copied into the partitions.
+-- The conversion is skipped if reports is already partitioned.
+--
+-- reports is partitioned by created_at. report_votes carries a copy of its report's
+-- created_at (report_created_at) and is partitioned on it, so every vote lives in the
+-- same month as its report and a month can be archived as a unit.
+
+-- Create the monthly partitions from p_from up to p_months_ahead months after the current month.
+-- Returns the number of tables created.
+CREATE OR REPLACE FUNCTION create_report_partitions(p_months_ahead INTEGER DEFAULT 3, p_from DATE DEFAULT CURRENT_DATE)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_from)::date;
+    v_last DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => p_months_ahead))::date;
+    v_suffix TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    WHILE v_month <= v_last LOOP
+        v_suffix := to_char(v_month, 'YYYY_MM');
+        IF to_regclass('public.reports_' || v_suffix) IS NULL
+           AND to_regclass('archive.reports_' || v_suffix) IS NULL THEN
+            EXECUTE format('CREATE TABLE public.%I PARTITION OF public.reports FOR VALUES FROM (%L) TO (%L)',
+                           'reports_' || v_suffix, v_month, (v_month + INTERVAL '1 month')::date);
+            v_created := v_created + 1;
+        END IF;
+        IF to_regclass('public.report_votes_' || v_suffix) IS NULL
+           AND to_regclass('archive.report_votes_' || v_suffix) IS NULL THEN
+            EXECUTE format('CREATE TABLE public.%I PARTITION OF public.report_votes FOR VALUES FROM (%L) TO (%L)',
+                           'report_votes_' || v_suffix, v_month, (v_month + INTERVAL '1 month')::date);
+            v_created := v_created + 1;
+        END IF;
+        v_month := (v_month + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+
+-- Detach every month older than p_retain_months and move it to the archive schema.
+-- The votes partition is detached first, then the reports partition of the same month.
+-- Returns the names of the archived tables.
+CREATE OR REPLACE FUNCTION archive_report_partitions(p_retain_months INTEGER DEFAULT 13)
+RETURNS SETOF TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => p_retain_months))::date;
+    v_part TEXT;
+    v_votes TEXT;
+    v_fk TEXT;
+BEGIN
+    CREATE SCHEMA IF NOT EXISTS archive;
+
+    FOR v_part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.reports'::regclass
+          AND c.relname ~ '^reports_[0-9]{4}_[0-9]{2}$'
+          AND to_date(substr(c.relname, 9), 'YYYY_MM') < v_cutoff
+        ORDER BY c.relname
+    LOOP
+        v_votes := 'report_votes_' || substr(v_part, 9);
+
+        IF to_regclass('public.' || v_votes) IS NOT NULL THEN
+            EXECUTE format('ALTER TABLE public.report_votes DETACH PARTITION public.%I', v_votes);
+            -- The detached table keeps its foreign key to reports, which would block detaching the report month
+            FOR v_fk IN
+                SELECT conname FROM pg_constraint
+                WHERE conrelid = format('public.%I', v_votes)::regclass
+                  AND contype = 'f'
+                  AND confrelid = 'public.reports'::regclass
+            LOOP
+                EXECUTE format('ALTER TABLE public.%I DROP CONSTRAINT %I', v_votes, v_fk);
+            END LOOP;
+            EXECUTE format('ALTER TABLE public.%I SET SCHEMA archive', v_votes);
+            RETURN NEXT 'archive.' || v_votes;
+        END IF;
+
+        EXECUTE format('ALTER TABLE public.reports DETACH PARTITION public.%I', v_part);
+        EXECUTE format('ALTER TABLE public.%I SET SCHEMA archive', v_part);
+        RETURN NEXT 'archive.' || v_part;
+    END LOOP;
+END;
+$$;
+
+-- Convert the existing tables (only if reports is not partitioned yet)
+DO $$
+DECLARE
+    v_oldest DATE;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'public.reports'::regclass) THEN
+        RAISE NOTICE 'reports is already partitioned, skipping conversion';
+        RETURN;
+    END IF;
+
+    ALTER TABLE reports RENAME TO reports_unpartitioned;
+    ALTER TABLE report_votes RENAME TO report_votes_unpartitioned;
+
+    CREATE TABLE reports (
+        id INTEGER NOT NULL DEFAULT nextval('reports_id_seq'),
+        user_id INTEGER CONSTRAINT reports_user_id_fkey REFERENCES users(id) ON DELETE CASCADE,
+        type_id INTEGER CONSTRAINT reports_type_id_fkey REFERENCES incident_types(id),
+        latitude DECIMAL(10, 8) NOT NULL,
+        longitude DECIMAL(11, 8) NOT NULL,
+        description TEXT,
+        status VARCHAR(20) DEFAULT 'ACTIVE',
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP  -- TTL: reports expire after this time unless extended
+    ) PARTITION BY RANGE (created_at);
+
+    CREATE TABLE report_votes (
+        id INTEGER NOT NULL DEFAULT nextval('report_votes_id_seq'),
+        report_id INTEGER NOT NULL,
+        report_created_at TIMESTAMP NOT NULL,  -- copy of reports.created_at, the partition key
+        user_id INTEGER CONSTRAINT report_votes_user_id_fkey REFERENCES users(id) ON DELETE CASCADE,
+        vote_type VARCHAR(10) NOT NULL CONSTRAINT report_votes_vote_type_check CHECK (vote_type IN ('keep', 'remove')),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) PARTITION BY RANGE (report_created_at);
+
+    SELECT date_trunc('month', COALESCE(MIN(created_at), CURRENT_TIMESTAMP))::date
+    INTO v_oldest
+    FROM reports_unpartitioned;
+    PERFORM create_report_partitions(3, v_oldest);
+
+    INSERT INTO reports (id, user_id, type_id, latitude, longitude, description, status, created_at, expires_at)
+    SELECT id, user_id, type_id, latitude, longitude, description, status,
+           COALESCE(created_at, CURRENT_TIMESTAMP), expires_at
+    FROM reports_unpartitioned;
+
+    INSERT INTO report_votes (id, report_id, report_created_at, user_id, vote_type, created_at)
+    SELECT v.id, v.report_id, r.created_at, v.user_id, v.vote_type, v.created_at
+    FROM report_votes_unpartitioned v
+    JOIN reports r ON r.id = v.report_id;
+
+    -- Keep the id sequences alive when the old tables are dropped
+    ALTER SEQUENCE reports_id_seq OWNED BY NONE;
+    ALTER SEQUENCE report_votes_id_seq OWNED BY NONE;
+
+    -- CASCADE also drops the legacy votes -> reports foreign key, which cannot point at a partitioned id
+    DROP TABLE report_votes_unpartitioned;
+    DROP TABLE reports_unpartitioned CASCADE;
+
+    ALTER SEQUENCE reports_id_seq OWNED BY reports.id;
+    ALTER SEQUENCE report_votes_id_seq OWNED BY report_votes.id;
+
+    -- The partition key has to be part of every unique constraint
+    ALTER TABLE reports ADD CONSTRAINT reports_pkey PRIMARY KEY (id, created_at);
+    ALTER TABLE report_votes ADD CONSTRAINT report_votes_pkey PRIMARY KEY (id, report_created_at);
+    ALTER TABLE report_votes ADD CONSTRAINT report_votes_report_id_user_id_key
+        UNIQUE (report_id, report_created_at, user_id);
+    ALTER TABLE report_votes ADD CONSTRAINT report_votes_report_fkey
+        FOREIGN KEY (report_id, report_created_at) REFERENCES reports(id, created_at) ON DELETE CASCADE;
+
+    CREATE INDEX idx_reports_status ON reports(status);
+    CREATE INDEX idx_reports_created_at ON reports(created_at);
+    CREATE INDEX idx_reports_location ON reports(latitude, longitude);
+    CREATE INDEX idx_report_votes_report_id ON report_votes(report_id);
+END;
+$$;
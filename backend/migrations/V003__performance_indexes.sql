@@ -0,0 +1,21 @@
+-- RoadAlert - Indexes for the hot queries in server.py
+-- check_query_plans.py verifies that the routes actually use them.
+
+-- Active report filter: get_reports and the active count in get_statistics
+CREATE INDEX IF NOT EXISTS idx_reports_status_expires_at ON reports(status, expires_at);
+-- Replaced by the index above, which starts with status
+DROP INDEX IF EXISTS idx_reports_status;
+
+-- Time-range statistics (last 7/30 days, last 12 months): idx_reports_created_at (V001)
+
+-- Votes of the current user in get_reports
+CREATE INDEX IF NOT EXISTS idx_report_votes_user_id ON report_votes(user_id);
+
+-- One vote per user and report: report_votes_report_id_user_id_key (V002), which also
+-- serves the per-report vote counts, so the separate report_id index is redundant
+DROP INDEX IF EXISTS idx_report_votes_report_id;
+
+-- Login and register lookups use the indexes behind the UNIQUE constraints on
+-- users(email) and users(username); the plain indexes from V001 duplicate them
+DROP INDEX IF EXISTS idx_users_email;
+DROP INDEX IF EXISTS idx_users_username;
@@ -0,0 +1,95 @@
+-- RoadAlert - Spatio-temporal rollup of reports for the heatmap endpoint
+-- One row per geohash cell (precision 5, about 4.9 x 4.9 km), hour and incident type.
+-- A trigger on reports keeps it up to date, so /api/heatmap never reads raw reports.
+-- Archiving a reports partition does not fire the trigger, the history stays in the rollup.
+
+-- Same algorithm as geo.geohash_encode() in Python
+CREATE OR REPLACE FUNCTION geohash_encode(p_lat DOUBLE PRECISION, p_lon DOUBLE PRECISION, p_precision INTEGER)
+RETURNS TEXT
+LANGUAGE plpgsql IMMUTABLE STRICT AS $$
+DECLARE
+    v_base32 CONSTANT TEXT := '0123456789bcdefghjkmnpqrstuvwxyz';
+    v_lat_min DOUBLE PRECISION := -90;
+    v_lat_max DOUBLE PRECISION := 90;
+    v_lon_min DOUBLE PRECISION := -180;
+    v_lon_max DOUBLE PRECISION := 180;
+    v_mid DOUBLE PRECISION;
+    v_even BOOLEAN := TRUE;
+    v_bits INTEGER := 0;
+    v_char INTEGER := 0;
+    v_hash TEXT := '';
+BEGIN
+    WHILE length(v_hash) < p_precision LOOP
+        IF v_even THEN
+            v_mid := (v_lon_min + v_lon_max) / 2;
+            IF p_lon >= v_mid THEN
+                v_char := v_char * 2 + 1;
+                v_lon_min := v_mid;
+            ELSE
+                v_char := v_char * 2;
+                v_lon_max := v_mid;
+            END IF;
+        ELSE
+            v_mid := (v_lat_min + v_lat_max) / 2;
+            IF p_lat >= v_mid THEN
+                v_char := v_char * 2 + 1;
+                v_lat_min := v_mid;
+            ELSE
+                v_char := v_char * 2;
+                v_lat_max := v_mid;
+            END IF;
+        END IF;
+        v_even := NOT v_even;
+        v_bits := v_bits + 1;
+        IF v_bits = 5 THEN
+            v_hash := v_hash || substr(v_base32, v_char + 1, 1);
+            v_bits := 0;
+            v_char := 0;
+        END IF;
+    END LOOP;
+    RETURN v_hash;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS report_heatmap (
+    hour TIMESTAMP NOT NULL,
+    geohash VARCHAR(5) NOT NULL,
+    type_id INTEGER NOT NULL REFERENCES incident_types(id),
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, geohash, type_id)
+);
+
+CREATE OR REPLACE FUNCTION report_heatmap_update()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        IF NEW.type_id IS NOT NULL THEN
+            INSERT INTO report_heatmap (hour, geohash, type_id, count)
+            VALUES (date_trunc('hour', NEW.created_at), geohash_encode(NEW.latitude, NEW.longitude, 5), NEW.type_id, 1)
+            ON CONFLICT (hour, geohash, type_id) DO UPDATE SET count = report_heatmap.count + 1;
+        END IF;
+        RETURN NEW;
+    END IF;
+
+    -- Reports removed by votes were false alarms, they should not show up as hotspots
+    UPDATE report_heatmap SET count = count - 1
+    WHERE hour = date_trunc('hour', OLD.created_at)
+      AND geohash = geohash_encode(OLD.latitude, OLD.longitude, 5)
+      AND type_id = OLD.type_id;
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_reports_heatmap ON reports;
+CREATE TRIGGER trg_reports_heatmap
+    AFTER INSERT OR DELETE ON reports
+    FOR EACH ROW EXECUTE FUNCTION report_heatmap_update();
+
+-- Backfill from the existing reports
+INSERT INTO report_heatmap (hour, geohash, type_id, count)
+SELECT date_trunc('hour', created_at), geohash_encode(latitude, longitude, 5), type_id, COUNT(*)
+FROM reports
+WHERE type_id IS NOT NULL
+GROUP BY 1, 2, 3
+ON CONFLICT (hour, geohash, type_id) DO UPDATE SET count = EXCLUDED.count;
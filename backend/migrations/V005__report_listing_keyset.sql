@@ -0,0 +1,10 @@
+-- RoadAlert - Keyset pagination of GET /api/reports
+-- The listing walks this index newest first and stops after one page. For that to
+-- stay cheap, expired reports must leave the ACTIVE status: the server marks them
+-- EXPIRED periodically (sweep_expired_reports in server.py), this catches up the
+-- reports that expired before.
+
+UPDATE reports SET status = 'EXPIRED'
+WHERE status = 'ACTIVE' AND expires_at <= NOW();
+
+CREATE INDEX IF NOT EXISTS idx_reports_status_created_at_id ON reports(status, created_at DESC, id DESC);
@@ -0,0 +1,65 @@
+-- RoadAlert - Per-user counters and reputation leaderboard
+-- report_count and vote_count are kept up to date by create_report and vote_on_report,
+-- so the top reporters and the leaderboard never group the reports or votes tables.
+-- reputation_ranks counts the users per reputation score. A user's rank is 1 + the
+-- number of users with a higher score, read from this small table instead of users.
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS report_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS vote_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE users SET reputation_score = 0 WHERE reputation_score IS NULL;
+ALTER TABLE users ALTER COLUMN reputation_score SET NOT NULL;
+
+-- Backfill from the existing rows
+UPDATE users u SET report_count = c.count
+FROM (SELECT user_id, COUNT(*) AS count FROM reports GROUP BY user_id) c
+WHERE c.user_id = u.id;
+
+UPDATE users u SET vote_count = c.count
+FROM (SELECT user_id, COUNT(*) AS count FROM report_votes GROUP BY user_id) c
+WHERE c.user_id = u.id;
+
+-- Leaderboard pages (score, then id for a stable order) and top reporters
+CREATE INDEX IF NOT EXISTS idx_users_reputation_score_id ON users(reputation_score DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_report_count ON users(report_count DESC);
+
+CREATE TABLE IF NOT EXISTS reputation_ranks (
+    score INTEGER PRIMARY KEY,
+    users INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION reputation_ranks_update()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.reputation_score = NEW.reputation_score THEN
+        RETURN NEW;
+    END IF;
+    -- Scores only go up, so the old score row is always locked before the new one
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE reputation_ranks SET users = users - 1 WHERE score = OLD.reputation_score;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO reputation_ranks (score, users) VALUES (NEW.reputation_score, 1)
+        ON CONFLICT (score) DO UPDATE SET users = reputation_ranks.users + 1;
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_users_reputation_ranks ON users;
+CREATE TRIGGER trg_users_reputation_ranks
+    AFTER INSERT OR DELETE OR UPDATE OF reputation_score ON users
+    FOR EACH ROW EXECUTE FUNCTION reputation_ranks_update();
+
+INSERT INTO reputation_ranks (score, users)
+SELECT reputation_score, COUNT(*) FROM users GROUP BY reputation_score
+ON CONFLICT (score) DO UPDATE SET users = EXCLUDED.users;
+
+-- Competition ranking (1, 2, 2, 4): users with the same score share a rank
+CREATE OR REPLACE FUNCTION reputation_rank(p_score INTEGER)
+RETURNS BIGINT
+LANGUAGE sql STABLE AS $$
+    SELECT 1 + COALESCE(SUM(users), 0) FROM reputation_ranks WHERE score > p_score;
+$$;
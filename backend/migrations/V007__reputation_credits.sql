@@ -0,0 +1,13 @@
+-- RoadAlert - Write-behind reputation
+-- vote_on_report appends one row per new vote here instead of updating users, and
+-- reputation.py adds them to users.reputation_score / vote_count in batches,
+-- deleting them in the same statement. Rows only stay here until the next flush.
+
+CREATE TABLE IF NOT EXISTS reputation_credits (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Credits left behind by a process that died are found by age, see reputation.py
+CREATE INDEX IF NOT EXISTS idx_reputation_credits_created_at ON reputation_credits (created_at);
@@ -0,0 +1,38 @@
+-- RoadAlert - Area subscriptions and alerts
+-- Users subscribe to a circle or polygon and (optionally) some incident types. New
+-- reports are matched against all subscriptions in memory (geofence.py) and every
+-- match is stored as a notification, which the map polls.
+
+CREATE TABLE IF NOT EXISTS area_subscriptions (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    name VARCHAR(100) NOT NULL DEFAULT '',
+    -- NULL means every incident type
+    types TEXT[],
+    -- A circle has center and radius, a polygon has its [[lat, lon], ...] vertices
+    center_latitude DOUBLE PRECISION,
+    center_longitude DOUBLE PRECISION,
+    radius_m DOUBLE PRECISION,
+    polygon JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT area_subscriptions_shape_check CHECK (
+        (polygon IS NULL AND center_latitude IS NOT NULL AND center_longitude IS NOT NULL AND radius_m > 0)
+        OR (polygon IS NOT NULL AND center_latitude IS NULL AND radius_m IS NULL)
+    )
+);
+
+CREATE INDEX IF NOT EXISTS idx_area_subscriptions_user_id ON area_subscriptions(user_id);
+
+-- The report's type and location are copied, so notifications outlive the report
+CREATE TABLE IF NOT EXISTS area_notifications (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    subscription_id INTEGER NOT NULL REFERENCES area_subscriptions(id) ON DELETE CASCADE,
+    report_id INTEGER NOT NULL,
+    type_name VARCHAR(50) NOT NULL,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_area_notifications_user_id_id ON area_notifications(user_id, id);
@@ -0,0 +1,8 @@
+-- RoadAlert - Spatial index for incidents along a route (POST /api/reports/route)
+-- A GiST index on the location of active reports, built into PostgreSQL (no PostGIS).
+-- The route endpoint looks up one small box per piece of the route, each an index
+-- search that only visits the reports inside that box.
+
+CREATE INDEX IF NOT EXISTS idx_reports_active_location ON reports
+    USING gist (point(longitude::float8, latitude::float8))
+    WHERE status = 'ACTIVE';
@@ -0,0 +1,110 @@
+-- RoadAlert - Heatmap rollup off the report transaction, plus daily and monthly tiers
+-- The V004 trigger upserted one shared row per cell, hour and type, which stayed locked
+-- until the report's transaction committed, so everyone reporting in the same cell
+-- queued behind each other. The trigger now only appends to report_heatmap_delta, and
+-- fold_report_heatmap() (run every few seconds by heatmap.py) adds the deltas to the
+-- rollups in one batch.
+--
+-- Hourly cells hardly aggregate anything over long ranges, so there are two coarser
+-- tiers: per day at precision 5 and per month at precision 4 (about 39 x 19.5 km).
+-- /api/heatmap reads whole months and days from them and only the edges of the range
+-- from the hourly one. Each tier is also indexed on the geohash first, for small
+-- bounding boxes over long ranges; "C" ordering makes a prefix a contiguous range.
+
+CREATE TABLE IF NOT EXISTS report_heatmap_delta (
+    created_at TIMESTAMP NOT NULL,
+    latitude DECIMAL(10, 8) NOT NULL,
+    longitude DECIMAL(11, 8) NOT NULL,
+    type_id INTEGER NOT NULL,
+    delta SMALLINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS report_heatmap_daily (
+    day DATE NOT NULL,
+    geohash VARCHAR(5) NOT NULL,
+    type_id INTEGER NOT NULL REFERENCES incident_types(id),
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, geohash, type_id)
+);
+
+CREATE TABLE IF NOT EXISTS report_heatmap_monthly (
+    month DATE NOT NULL,
+    geohash VARCHAR(4) NOT NULL,
+    type_id INTEGER NOT NULL REFERENCES incident_types(id),
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, geohash, type_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_report_heatmap_geohash ON report_heatmap ((geohash COLLATE "C"), hour);
+CREATE INDEX IF NOT EXISTS idx_report_heatmap_daily_geohash ON report_heatmap_daily ((geohash COLLATE "C"), day);
+CREATE INDEX IF NOT EXISTS idx_report_heatmap_monthly_geohash ON report_heatmap_monthly ((geohash COLLATE "C"), month);
+
+CREATE OR REPLACE FUNCTION report_heatmap_update()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        IF NEW.type_id IS NOT NULL THEN
+            INSERT INTO report_heatmap_delta VALUES (NEW.created_at, NEW.latitude, NEW.longitude, NEW.type_id, 1);
+        END IF;
+        RETURN NEW;
+    END IF;
+
+    -- Reports removed by votes were false alarms, they should not show up as hotspots
+    IF OLD.type_id IS NOT NULL THEN
+        INSERT INTO report_heatmap_delta VALUES (OLD.created_at, OLD.latitude, OLD.longitude, OLD.type_id, -1);
+    END IF;
+    RETURN OLD;
+END;
+$$;
+
+-- Add the committed deltas to every tier and delete them, return how many were folded.
+-- Runs in one process at a time, the others return 0 at once.
+CREATE OR REPLACE FUNCTION fold_report_heatmap()
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_folded INTEGER;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('fold_report_heatmap')) THEN
+        RETURN 0;
+    END IF;
+
+    WITH folded AS (
+        DELETE FROM report_heatmap_delta RETURNING created_at, latitude, longitude, type_id, delta
+    ), cells AS (
+        SELECT date_trunc('hour', created_at) AS hour, geohash_encode(latitude, longitude, 5) AS geohash,
+               type_id, SUM(delta)::INTEGER AS count, COUNT(*) AS deltas
+        FROM folded
+        GROUP BY 1, 2, 3
+    ), hourly AS (
+        INSERT INTO report_heatmap (hour, geohash, type_id, count)
+        SELECT hour, geohash, type_id, count FROM cells
+        ON CONFLICT (hour, geohash, type_id) DO UPDATE SET count = report_heatmap.count + EXCLUDED.count
+    ), daily AS (
+        INSERT INTO report_heatmap_daily (day, geohash, type_id, count)
+        SELECT hour::date, geohash, type_id, SUM(count) FROM cells GROUP BY 1, 2, 3
+        ON CONFLICT (day, geohash, type_id) DO UPDATE SET count = report_heatmap_daily.count + EXCLUDED.count
+    ), monthly AS (
+        INSERT INTO report_heatmap_monthly (month, geohash, type_id, count)
+        SELECT date_trunc('month', hour)::date, LEFT(geohash, 4), type_id, SUM(count) FROM cells GROUP BY 1, 2, 3
+        ON CONFLICT (month, geohash, type_id) DO UPDATE SET count = report_heatmap_monthly.count + EXCLUDED.count
+    )
+    SELECT COALESCE(SUM(deltas), 0) INTO v_folded FROM cells;
+
+    RETURN v_folded;
+END;
+$$;
+
+-- Backfill the new tiers from the hourly rollup, which still has archived months
+INSERT INTO report_heatmap_daily (day, geohash, type_id, count)
+SELECT hour::date, geohash, type_id, SUM(count)
+FROM report_heatmap
+GROUP BY 1, 2, 3
+ON CONFLICT (day, geohash, type_id) DO UPDATE SET count = EXCLUDED.count;
+
+INSERT INTO report_heatmap_monthly (month, geohash, type_id, count)
+SELECT date_trunc('month', hour)::date, LEFT(geohash, 4), type_id, SUM(count)
+FROM report_heatmap
+GROUP BY 1, 2, 3
+ON CONFLICT (month, geohash, type_id) DO UPDATE SET count = EXCLUDED.count;
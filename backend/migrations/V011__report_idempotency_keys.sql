@@ -0,0 +1,17 @@
+-- RoadAlert - Idempotency keys for new reports
+-- A client that got no answer for POST /api/reports (a timeout, or a 503 saying the
+-- report may still be saved) retries with the same Idempotency-Key header and gets
+-- the report created the first time instead of a duplicate. The statement inserting
+-- a report claims its key first and skips the report if the key was taken (see
+-- INSERT_REPORT_SQL in server.py). partition_maintenance.py deletes keys after a day.
+
+CREATE TABLE IF NOT EXISTS report_idempotency_keys (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    idempotency_key VARCHAR(100) NOT NULL,
+    -- reports is partitioned, so no foreign key: the report may have been deleted since
+    report_id INTEGER NOT NULL,
+    report_created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_report_idempotency_keys_created_at ON report_idempotency_keys (report_created_at);
@@ -0,0 +1,101 @@
+-- RoadAlert - Tree-shaped reputation rank counts
+-- reputation_ranks (V006) had one row per score, so a rank summed every higher
+-- score, and every registration updated the score 0 row. reputation_rank_counts
+-- keeps the same counts at 6 levels: level 0 counts the users per score, level n
+-- per block of 64^n scores (bucket = score >> 6n). A user's rank adds, on each
+-- level, the at most 63 buckets above theirs inside the same parent bucket, so a
+-- lookup reads at most 6 * 63 rows however many users and scores there are.
+-- Only scores above 0 are counted: scores never go below 0 (every credit adds
+-- one), so nobody ranks below a 0 score and new users touch no counter.
+
+CREATE TABLE IF NOT EXISTS reputation_rank_counts (
+    level SMALLINT NOT NULL,
+    bucket INTEGER NOT NULL,
+    users INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (level, bucket)
+);
+
+DROP TRIGGER IF EXISTS trg_users_reputation_ranks ON users;
+DROP FUNCTION IF EXISTS reputation_ranks_update();
+DROP TABLE IF EXISTS reputation_ranks;
+
+-- Runs once per statement with the net change per bucket, and locks the counter
+-- rows in (level, bucket) order, so concurrent reputation flushes updating the
+-- same users in a different order cannot deadlock on them. old_users / new_users
+-- only exist for the events that have them, hence one query per event.
+CREATE OR REPLACE FUNCTION reputation_rank_counts_update() RETURNS TRIGGER AS $$
+DECLARE
+    scores INTEGER[];
+    deltas INTEGER[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(reputation_score), array_agg(1) INTO scores, deltas
+        FROM new_users WHERE reputation_score > 0;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(reputation_score), array_agg(-1) INTO scores, deltas
+        FROM old_users WHERE reputation_score > 0;
+    ELSE
+        SELECT array_agg(s.score), array_agg(s.delta) INTO scores, deltas
+        FROM new_users n
+        JOIN old_users o ON o.id = n.id AND o.reputation_score <> n.reputation_score
+        CROSS JOIN LATERAL (VALUES (n.reputation_score, 1), (o.reputation_score, -1)) AS s(score, delta)
+        WHERE s.score > 0;
+    END IF;
+
+    IF scores IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO reputation_rank_counts AS c (level, bucket, users)
+    SELECT l.level, s.score >> (6 * l.level), SUM(s.delta)
+    FROM unnest(scores, deltas) AS s(score, delta)
+    CROSS JOIN generate_series(0, 5) AS l(level)
+    GROUP BY 1, 2
+    HAVING SUM(s.delta) <> 0
+    ORDER BY 1, 2
+    ON CONFLICT (level, bucket) DO UPDATE SET users = c.users + EXCLUDED.users;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables rule out UPDATE OF reputation_score, so the update trigger fires
+-- for every users update; when no score changed it writes nothing. Each event needs
+-- its own trigger.
+DROP TRIGGER IF EXISTS trg_users_rank_counts_insert ON users;
+CREATE TRIGGER trg_users_rank_counts_insert
+    AFTER INSERT ON users
+    REFERENCING NEW TABLE AS new_users
+    FOR EACH STATEMENT EXECUTE FUNCTION reputation_rank_counts_update();
+
+DROP TRIGGER IF EXISTS trg_users_rank_counts_update ON users;
+CREATE TRIGGER trg_users_rank_counts_update
+    AFTER UPDATE ON users
+    REFERENCING OLD TABLE AS old_users NEW TABLE AS new_users
+    FOR EACH STATEMENT EXECUTE FUNCTION reputation_rank_counts_update();
+
+DROP TRIGGER IF EXISTS trg_users_rank_counts_delete ON users;
+CREATE TRIGGER trg_users_rank_counts_delete
+    AFTER DELETE ON users
+    REFERENCING OLD TABLE AS old_users
+    FOR EACH STATEMENT EXECUTE FUNCTION reputation_rank_counts_update();
+
+-- Backfill from the existing rows
+DELETE FROM reputation_rank_counts;
+INSERT INTO reputation_rank_counts (level, bucket, users)
+SELECT l.level, u.reputation_score >> (6 * l.level), COUNT(*)
+FROM users u CROSS JOIN generate_series(0, 5) AS l(level)
+WHERE u.reputation_score > 0
+GROUP BY 1, 2;
+
+-- 1 + the number of users with a higher score. On each level below the top those are
+-- the buckets after the user's own up to the end of its parent bucket; on the top
+-- level (score >> 30, at most 2 buckets above 0) every bucket after it.
+CREATE OR REPLACE FUNCTION reputation_rank(p_score INTEGER) RETURNS BIGINT AS $$
+    SELECT 1 + COALESCE(SUM(c.users), 0)
+    FROM generate_series(0, 5) AS l(level)
+    JOIN reputation_rank_counts c
+      ON c.level = l.level
+     AND c.bucket > p_score >> (6 * l.level)
+     AND c.bucket <= CASE WHEN l.level = 5 THEN 2147483647
+                          ELSE (p_score >> (6 * l.level + 6) << 6) + 63 END;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Partition Maintenance - creates upcoming monthly partitions of reports/report_votes
+and archives old months. Run it daily from cron, e.g.:
+
+    0 3 * * * cd /path/to/backend && python3 partition_maintenance.py --export-dir /var/backups/roadalert
+
+Requires the migrations (python migrate.py) to have been applied to the database.
+"""
+
+import argparse
+import gzip
+import os
+import psycopg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connection details
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', '5432'),
+    'dbname': os.getenv('DB_NAME', 'roadalert'),
+    'user': os.getenv('DB_USER', 'postgres'),
+    'password': os.getenv('DB_PASSWORD', ''),
+    'sslmode': os.getenv('DB_SSLMODE', 'prefer')
+}
+
+def export_table(cursor, table, export_dir):
+    """Stream an archived table into a gzipped CSV file and return its path"""
+    schema, name = table.split('.')
+    path = os.path.join(export_dir, f"{name}.csv.gz")
+    with gzip.open(path, 'wb') as f:
+        with cursor.copy(f'COPY "{schema}"."{name}" TO STDOUT (FORMAT csv, HEADER)') as copy:
+            for chunk in copy:
+                f.write(chunk)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description='Create and archive monthly report partitions')
+    parser.add_argument('--months-ahead', type=int, default=3,
+                        help='create partitions up to this many months in the future (default: 3)')
+    parser.add_argument('--retain-months', type=int, default=13,
+                        help='archive months older than this (default: 13, statistics look back 12 months)')
+    parser.add_argument('--export-dir',
+                        help='export archived partitions to gzipped CSV here and drop them from the database')
+    args = parser.parse_args()
+
+    conn = psycopg.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT create_report_partitions(%s)', (args.months_ahead,))
+    print(f"Created {cursor.fetchone()[0]} new partition(s)")
+
+    cursor.execute('SELECT * FROM archive_report_partitions(%s)', (args.retain_months,))
+    archived = [row[0] for row in cursor.fetchall()]
+    # Clients retry a report within minutes, its idempotency key is not needed after a day
+    cursor.execute("DELETE FROM report_idempotency_keys WHERE report_created_at < NOW() - INTERVAL '1 day'")
+    print(f"Deleted {cursor.rowcount} old idempotency key(s)")
+    conn.commit()
+    for table in archived:
+        print(f"Archived {table}")
+
+    if args.export_dir:
+        os.makedirs(args.export_dir, exist_ok=True)
+        # Export everything in the archive schema, including tables left over from earlier runs
+        cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = 'archive' ORDER BY tablename")
+        for (name,) in cursor.fetchall():
+            path = export_table(cursor, f'archive.{name}', args.export_dir)
+            cursor.execute(f'DROP TABLE archive."{name}"')
+            conn.commit()
+            print(f"Exported archive.{name} to {path}")
+
+    cursor.close()
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Reputation write-behind - votes credit reputation without writing to users.
+
+vote_on_report appends a row to reputation_credits in its own transaction and, once
+committed, hands the row id to buffer_credit(). A background thread flushes the
+buffered ids every REPUTATION_FLUSH_SECONDS in one statement that deletes those
+credits and adds them to users.reputation_score and users.vote_count, so a credit
+is applied exactly once even if two flushes race.
+
+If the process dies before flushing, its credits are still in the table. Every
+REPUTATION_ORPHAN_SWEEP_SECONDS the flush also applies credits older than
+REPUTATION_ORPHAN_SECONDS, whichever process buffered them, so the flush thread
+runs from startup (start_flusher()). Ticks with nothing buffered here and no sweep
+due do not touch the database.
+"""
+
+import atexit
+import os
+import threading
+import time
+from db import get_db
+from cache_bus import bus
+
+REPUTATION_FLUSH_SECONDS = float(os.getenv('REPUTATION_FLUSH_SECONDS', 2))
+REPUTATION_ORPHAN_SECONDS = float(os.getenv('REPUTATION_ORPHAN_SECONDS', 60))
+REPUTATION_ORPHAN_SWEEP_SECONDS = float(os.getenv('REPUTATION_ORPHAN_SWEEP_SECONDS', 60))
+
+# {credits} picks the credits to apply: the buffered ones, plus the orphaned ones
+# (idx_reputation_credits_created_at) when sweeping
+FLUSH_SQL = '''
+    WITH credited AS (
+        DELETE FROM reputation_credits
+        WHERE {credits}
+        RETURNING user_id
+    )
+    UPDATE users u
+    SET reputation_score = u.reputation_score + c.credits,
+        vote_count = u.vote_count + c.credits
+    FROM (SELECT user_id, COUNT(*) AS credits FROM credited GROUP BY user_id) c
+    WHERE u.id = c.user_id
+'''
+
+BUFFERED_CREDITS = 'id = ANY(%(ids)s)'
+ORPHANED_CREDITS = "id = ANY(%(ids)s) OR created_at < NOW() - %(orphan_seconds)s * INTERVAL '1 second'"
+
+_pending_ids = []
+_lock = threading.Lock()
+_flusher_started = False
+
+def add_credit(cursor, user_id):
+    """Record one reputation point for user_id in the caller's transaction, return its id"""
+    cursor.execute('INSERT INTO reputation_credits (user_id) VALUES (%s) RETURNING id', (user_id,))
+    return cursor.fetchone()['id']
+
+def buffer_credit(credit_id):
+    """Queue a committed credit for the next flush"""
+    with _lock:
+        _pending_ids.append(credit_id)
+    start_flusher()
+
+def flush(sweep_orphans=False):
+    """Apply the buffered credits (and orphaned ones if sweep_orphans) to users, return
+    the number of users updated"""
+    with _lock:
+        ids = _pending_ids[:]
+        _pending_ids.clear()
+    if not ids and not sweep_orphans:
+        return 0
+    conn = get_db()
+    if not conn:
+        with _lock:
+            _pending_ids.extend(ids)
+        return 0
+    try:
+        sql = FLUSH_SQL.format(credits=ORPHANED_CREDITS if sweep_orphans else BUFFERED_CREDITS)
+        updated = conn.execute(sql, {'ids': ids, 'orphan_seconds': REPUTATION_ORPHAN_SECONDS}).rowcount
+        conn.commit()
+        if updated:
+            bus.publish('users')
+        return updated
+    except Exception as e:
+        # Nothing was applied, the credits are retried by the next flush
+        conn.rollback()
+        with _lock:
+            _pending_ids.extend(ids)
+        print(f"Reputation flush error: {e}")
+        return 0
+    finally:
+        conn.close()
+
+def _flush_periodically():
+    next_sweep = 0
+    while True:
+        time.sleep(REPUTATION_FLUSH_SECONDS)
+        sweep_orphans = time.monotonic() >= next_sweep
+        if sweep_orphans:
+            next_sweep = time.monotonic() + REPUTATION_ORPHAN_SWEEP_SECONDS
+        flush(sweep_orphans)
+
+def start_flusher():
+    """Start the background flush thread once per process, and flush once more at exit"""
+    global _flusher_started
+    with _lock:
+        if _flusher_started:
+            return
+        _flusher_started = True
+    threading.Thread(target=_flush_periodically, daemon=True).start()
+    atexit.register(flush)
@@ -1,69 +1,133 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import psycopg
-from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
 import bcrypt
 import jwt
 import os
-from datetime import datetime, timedelta
+import base64
+import binascii
+import math
+import queue
+import threading
+import time
+from collections import Counter
+from contextlib import closing, nullcontext
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from db import (get_db, get_read_db, note_write, replica_status, database_status, query_guard,
+                set_query_budget, DB_REPLICAS, DB_STATEMENT_TIMEOUT_MS)
+from export import EXPORT_FORMATS, EXPORT_QUERIES, export_stream, parquet_available
+from corridor import RouteCorridor
+from geo import geohash_bounds, geohash_cell_size, geohash_cover, polygon_bounds
+from heatmap import start_folder
+from geofence import Area, GeofenceIndex
+from reputation import add_credit, buffer_credit, start_flusher
+from cache_bus import bus
+from write_queue import GroupCommitQueue
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*", "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"], "allow_headers": ["Content-Type", "Authorization"]}})
+CORS(app, resources={r"/api/*": {"origins": "*", "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"], "allow_headers": ["Content-Type", "Authorization", "Idempotency-Key"]}})
 
 # Configuration
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'port': os.getenv('DB_PORT', '5432'),
-    'database': os.getenv('DB_NAME', 'roadalert'),
-    'user': os.getenv('DB_USER', 'postgres'),
-    'password': os.getenv('DB_PASSWORD', '')
-}
-
 JWT_SECRET = os.getenv('JWT_SECRET', 'roadalert_super_secret_key')
 JWT_EXPIRES_DAYS = 7
 
-# Database connection
-def get_db():
-    """Get database connection"""
+# reports and report_votes are partitioned by month (see migrations/V002__partition_reports.sql).
+# Partitions are created this many months ahead of the current month.
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', 3))
+_partitions_checked_month = None
+
+def ensure_report_partitions(conn):
+    """Create upcoming monthly partitions, at most once per calendar month per process"""
+    global _partitions_checked_month
+    month = datetime.utcnow().strftime('%Y-%m')
+    if _partitions_checked_month == month:
+        return
+    _partitions_checked_month = month
     try:
-        conn = psycopg.connect(
-            host=DB_CONFIG['host'],
-            port=DB_CONFIG['port'],
-            dbname=DB_CONFIG['database'],
-            user=DB_CONFIG['user'],
-            password=DB_CONFIG['password'],
-            sslmode=os.getenv('DB_SSLMODE', 'prefer'),
-            row_factory=dict_row
-        )
-        return conn
+        conn.execute('SELECT create_report_partitions(%s)', (PARTITION_MONTHS_AHEAD,))
+        conn.commit()
     except Exception as e:
-        print(f"Database connection error: {e}")
-        return None
+        conn.rollback()
+        print(f"Partition maintenance error: {e}")
+
+def publish_write(channel, user_id):
+    """After a committed write: send the user's next reads to the primary and tell
+    every worker (see cache_bus.py) that data on channel changed"""
+    note_write(user_id)
+    bus.publish(channel, {'user_id': user_id})
+
+def _note_other_worker_write(payload):
+    if payload and payload.get('user_id'):
+        note_write(payload['user_id'])
+
+# A user's write may have been handled by another worker, their reads still have to go to the primary
+if DB_REPLICAS:
+    bus.subscribe('reports', _note_other_worker_write)
+    bus.subscribe('users', _note_other_worker_write)
+
+def stale_response(body, taken_at):
+    """Answer with a result saved while the database still answered, marked as stale"""
+    return jsonify({'success': True, **body, 'stale': True, 'stale_since': taken_at.isoformat()})
+
+def database_unavailable():
+    return jsonify({
+        'success': False,
+        'message': 'Database unavailable, try again later'
+    }), 503
+
+# Statement time budget (ms) per route, see db.py. Other routes get DB_STATEMENT_TIMEOUT_MS.
+ROUTE_QUERY_BUDGETS_MS = {
+    'get_reports': 2000,
+    'get_reports_along_route': 2000,
+    'get_notifications': 2000,
+    'get_heatmap': 3000,
+    'get_statistics': 10000,
+    'export_data': 30000
+}
+
+@app.before_request
+def set_route_query_budget():
+    set_query_budget(ROUTE_QUERY_BUDGETS_MS.get(request.endpoint, DB_STATEMENT_TIMEOUT_MS))
 
 # Test database connection on startup
 try:
     conn = get_db()
     if conn:
         print("Database connected successfully")
+        ensure_report_partitions(conn)
         conn.close()
     else:
         print("Failed to connect to database")
 except Exception as e:
     print(f"Database connection error: {e}")
 
+# New reports reach the heatmap rollups in batches, see heatmap.py. Reputation
+# credits left behind by other (crashed) processes are applied even without votes here.
+start_folder()
+start_flusher()
+
 # ==================== ROUTES ====================
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    result = {
         'status': 'OK',
         'message': 'RoadAlert API is running'
-    })
+    }
+    # Only in-memory state, the health check must answer even when the database does not
+    result['database'] = database_status()
+    if DB_REPLICAS:
+        result['replicas'] = replica_status()
+    result['cache_bus'] = bus.stats()
+    if report_writer:
+        result['report_writer'] = report_writer.stats()
+    return jsonify(result)
 
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -95,37 +159,35 @@ def register():
                 'message': 'Database connection failed'
             }), 500
         
-        cursor = conn.cursor()
-        
-        # Check if user already exists
-        cursor.execute(
-            'SELECT * FROM users WHERE email = %s OR username = %s',
-            (email, username)
-        )
-        existing_user = cursor.fetchone()
-        
-        if existing_user:
-            cursor.close()
-            conn.close()
-            return jsonify({
-                'success': False,
-                'message': 'User with this email or username already exists'
-            }), 400
-        
-        # Hash password
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        
-        # Create user
-        cursor.execute(
-            '''INSERT INTO users (username, email, password_hash, reputation_score) 
-               VALUES (%s, %s, %s, 0) 
-               RETURNING id, username, email, reputation_score, created_at''',
-            (username, email, password_hash)
-        )
-        user = cursor.fetchone()
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with closing(conn):
+            cursor = conn.cursor()
+            
+            # Check if user already exists
+            cursor.execute(
+                'SELECT * FROM users WHERE email = %s OR username = %s',
+                (email, username)
+            )
+            existing_user = cursor.fetchone()
+            
+            if existing_user:
+                return jsonify({
+                    'success': False,
+                    'message': 'User with this email or username already exists'
+                }), 400
+            
+            # Hash password
+            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            
+            # Create user
+            cursor.execute(
+                '''INSERT INTO users (username, email, password_hash, reputation_score) 
+                   VALUES (%s, %s, %s, 0) 
+                   RETURNING id, username, email, reputation_score, created_at''',
+                (username, email, password_hash)
+            )
+            user = cursor.fetchone()
+            conn.commit()
+        publish_write('users', user['id'])
         
         # Generate JWT token
         token = jwt.encode(
@@ -179,19 +241,18 @@ def login():
                 'message': 'Database connection failed'
             }), 500
         
-        cursor = conn.cursor()
-        
-        # Find user
-        cursor.execute('SELECT * FROM users WHERE email = %s', (email,))
-        user = cursor.fetchone()
-        
-        if not user:
-            cursor.close()
-            conn.close()
-            return jsonify({
-                'success': False,
-                'message': 'Invalid email or password'
-            }), 401
+        with closing(conn):
+            cursor = conn.cursor()
+            
+            # Find user
+            cursor.execute('SELECT * FROM users WHERE email = %s', (email,))
+            user = cursor.fetchone()
+            
+            if not user:
+                return jsonify({
+                    'success': False,
+                    'message': 'Invalid email or password'
+                }), 401
         
         # Check password
         is_valid = bcrypt.checkpw(
@@ -199,9 +260,6 @@ def login():
             user['password_hash'].encode('utf-8')
         )
         
-        cursor.close()
-        conn.close()
-        
         if not is_valid:
             return jsonify({
                 'success': False,
@@ -254,6 +312,20 @@ def verify_token():
     except jwt.InvalidTokenError:
         return None, "Invalid token"
 
+def encode_cursor(*key):
+    """Opaque pagination cursor holding the sort key of the last row of a page"""
+    return base64.urlsafe_b64encode('|'.join(str(value) for value in key).encode()).decode()
+
+def decode_cursor(cursor, *types):
+    """Return the sort key of a cursor converted with types, ValueError if it is not valid"""
+    try:
+        values = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    except (binascii.Error, UnicodeError):
+        raise ValueError('Invalid cursor')
+    if len(values) != len(types):
+        raise ValueError('Invalid cursor')
+    return tuple(convert(value) for convert, value in zip(types, values))
+
 # ==================== REPORTS ENDPOINTS ====================
 
 # TTL for reports in seconds (10 seconds for testing, change to e.g. 3600 for 1 hour in production)
@@ -262,6 +334,124 @@ REPORT_TTL_SECONDS = 30
 # Number of votes needed to remove or extend a report
 VOTES_THRESHOLD = 2
 
+# GET /api/reports returns one page of reports, clients follow next_cursor for the rest
+REPORTS_PAGE_SIZE = int(os.getenv('REPORTS_PAGE_SIZE', 100))
+REPORTS_MAX_PAGE_SIZE = int(os.getenv('REPORTS_MAX_PAGE_SIZE', 500))
+BBOX_PARAMS = ('min_lat', 'min_lon', 'max_lat', 'max_lon')
+
+# The last pages of GET /api/reports, served (marked stale) while the database is unavailable
+REPORTS_SNAPSHOT_PAGES = 20
+_reports_snapshots = {}
+
+def serve_reports_snapshot(key):
+    snapshot = _reports_snapshots.get(key)
+    if not snapshot:
+        return database_unavailable()
+    taken_at, reports, next_cursor = snapshot
+    return stale_response({'reports': reports, 'next_cursor': next_cursor, 'votes_threshold': VOTES_THRESHOLD}, taken_at)
+
+# Expired reports are marked EXPIRED at most this often, so the listing only walks
+# ACTIVE reports in idx_reports_status_created_at_id (see migrations/V005)
+EXPIRY_SWEEP_INTERVAL_SECONDS = int(os.getenv('EXPIRY_SWEEP_INTERVAL_SECONDS', 10))
+_last_expiry_sweep = 0
+
+def sweep_expired_reports(conn):
+    """Mark reports whose TTL ran out as EXPIRED, throttled per process"""
+    global _last_expiry_sweep
+    now = time.monotonic()
+    if now - _last_expiry_sweep < EXPIRY_SWEEP_INTERVAL_SECONDS:
+        return
+    _last_expiry_sweep = now
+    try:
+        expired = conn.execute("UPDATE reports SET status = 'EXPIRED' WHERE status = 'ACTIVE' AND expires_at <= NOW()").rowcount
+        conn.commit()
+        if expired:
+            bus.publish('reports')
+    except Exception as e:
+        conn.rollback()
+        print(f"Expiry sweep error: {e}")
+
+# Reports are created with the type looked up and the username for the response in one statement.
+# With an idempotency key, the key is claimed first and the report only inserted if the claim
+# worked; a claim racing an uncommitted one with the same key waits for it (ON CONFLICT).
+INSERT_REPORT_SQL = '''
+    WITH new_report AS (
+        SELECT nextval('reports_id_seq')::int AS id, CURRENT_TIMESTAMP::timestamp AS created_at
+    ), claim AS (
+        INSERT INTO report_idempotency_keys (user_id, idempotency_key, report_id, report_created_at)
+        SELECT %(user_id)s, %(idempotency_key)s::varchar, id, created_at FROM new_report
+        WHERE %(idempotency_key)s::varchar IS NOT NULL
+        ON CONFLICT DO NOTHING
+        RETURNING report_id
+    ), report AS (
+        INSERT INTO reports (id, user_id, type_id, latitude, longitude, description, status, created_at, expires_at)
+        SELECT n.id, %(user_id)s, it.id, %(latitude)s, %(longitude)s, %(description)s, 'ACTIVE', n.created_at, %(expires_at)s
+        FROM new_report n JOIN incident_types it ON it.type_name = %(type_name)s
+        WHERE %(idempotency_key)s::varchar IS NULL OR EXISTS (SELECT 1 FROM claim)
+        RETURNING id, user_id, type_id, latitude, longitude, description, status, created_at, expires_at
+    )
+    SELECT report.*, u.username FROM report LEFT JOIN users u ON u.id = report.user_id
+'''
+
+# The report created earlier with the user's idempotency key
+KEYED_REPORT_SQL = '''
+    SELECT r.id, r.user_id, r.type_id, r.latitude, r.longitude, r.description, r.status, r.created_at, r.expires_at, u.username
+    FROM report_idempotency_keys k
+    JOIN reports r ON r.id = k.report_id AND r.created_at = k.report_created_at
+    LEFT JOIN users u ON u.id = r.user_id
+    WHERE k.user_id = %s AND k.idempotency_key = %s
+'''
+
+def insert_reports(conn, new_reports):
+    """Insert reports, notify area subscribers and count the reports in
+    users.report_count, without committing.
+    Returns the created rows in order, None for a report with an unknown type. A report
+    whose idempotency key was used before gets the report created then, marked 'duplicate'."""
+    with conn.cursor() as cursor:
+        # executemany sends all the inserts in one pipeline
+        cursor.executemany(INSERT_REPORT_SQL, new_reports, returning=True)
+        reports = []
+        while True:
+            reports.append(cursor.fetchone())
+            if not cursor.nextset():
+                break
+        notify_area_subscribers(cursor, new_reports, reports)
+        report_counts = Counter(report['user_id'] for report in reports if report)
+        user_ids = sorted(report_counts)
+        cursor.execute('''
+            UPDATE users SET report_count = report_count + c.count
+            FROM unnest(%s::int[], %s::int[]) AS c(user_id, count)
+            WHERE users.id = c.user_id
+        ''', (user_ids, [report_counts[user_id] for user_id in user_ids]))
+        for i, new_report in enumerate(new_reports):
+            if reports[i] is None and new_report['idempotency_key']:
+                cursor.execute(KEYED_REPORT_SQL, (new_report['user_id'], new_report['idempotency_key']))
+                existing = cursor.fetchone()
+                if existing:
+                    reports[i] = {**existing, 'duplicate': True}
+    return reports
+
+def write_report_batch(conn, new_reports):
+    ensure_report_partitions(conn)
+    sweep_expired_reports(conn)
+    return insert_reports(conn, new_reports)
+
+# Optional group commit for create_report (see write_queue.py): reports of concurrent
+# requests are queued and committed together every few milliseconds. Off by default.
+REPORT_GROUP_COMMIT = os.getenv('REPORT_GROUP_COMMIT', '0') == '1'
+REPORT_GROUP_COMMIT_MAX_ITEMS = int(os.getenv('REPORT_GROUP_COMMIT_MAX_ITEMS', 64))
+REPORT_GROUP_COMMIT_MAX_WAIT_MS = float(os.getenv('REPORT_GROUP_COMMIT_MAX_WAIT_MS', 5))
+REPORT_QUEUE_SIZE = int(os.getenv('REPORT_QUEUE_SIZE', 1000))
+REPORT_WRITE_TIMEOUT_SECONDS = 10
+IDEMPOTENCY_KEY_MAX_LENGTH = 100
+
+report_writer = GroupCommitQueue(
+    write_report_batch, get_db,
+    max_items=REPORT_GROUP_COMMIT_MAX_ITEMS,
+    max_wait_ms=REPORT_GROUP_COMMIT_MAX_WAIT_MS,
+    max_queued=REPORT_QUEUE_SIZE
+) if REPORT_GROUP_COMMIT else None
+
 @app.route('/api/reports', methods=['POST'])
 def create_report():
     """Create a new map report (police or accident)"""
@@ -290,55 +480,75 @@ def create_report():
                 'message': 'Type must be POLICE or ACCIDENT'
             }), 400
         
-        conn = get_db()
-        if not conn:
+        # Optional: a retry with the same key returns the report created the first time
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key is not None and not 0 < len(idempotency_key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
             return jsonify({
                 'success': False,
-                'message': 'Database connection failed'
-            }), 500
+                'message': f'Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters'
+            }), 400
         
-        cursor = conn.cursor()
+        # Calculate expires_at
+        expires_at = datetime.utcnow() + timedelta(seconds=REPORT_TTL_SECONDS)
+        new_report = {
+            'user_id': user_id,
+            'type_name': report_type,
+            'latitude': latitude,
+            'longitude': longitude,
+            'description': description,
+            'expires_at': expires_at,
+            'idempotency_key': idempotency_key
+        }
         
-        # Get the type_id from incident_types
-        cursor.execute('SELECT id FROM incident_types WHERE type_name = %s', (report_type,))
-        type_row = cursor.fetchone()
+        try:
+            if report_writer:
+                # Committed together with other requests' reports by the writer thread
+                report = report_writer.submit(new_report).result(timeout=REPORT_WRITE_TIMEOUT_SECONDS)
+            else:
+                conn = get_db()
+                if not conn:
+                    raise ConnectionError('Database connection failed')
+                try:
+                    ensure_report_partitions(conn)
+                    sweep_expired_reports(conn)
+                    report = insert_reports(conn, [new_report])[0]
+                    conn.commit()
+                finally:
+                    conn.close()
+        except queue.Full:
+            return jsonify({
+                'success': False,
+                'message': 'Server busy, try again'
+            }), 503
+        except ConnectionError:
+            return jsonify({
+                'success': False,
+                'message': 'Database connection failed'
+            }), 500
+        except (TimeoutError, psycopg.OperationalError) as e:
+            # The write may still commit (it is queued, or the commit's answer got lost)
+            print(f"Create report not confirmed: {e!r}")
+            return jsonify({
+                'success': False,
+                'message': 'The report could not be confirmed and may still be saved. '
+                           'Retry with the same Idempotency-Key to avoid a duplicate.'
+            }), 503
         
-        if not type_row:
-            cursor.close()
-            conn.close()
+        if not report:
             return jsonify({
                 'success': False,
                 'message': 'Invalid report type'
             }), 400
         
-        type_id = type_row['id']
-        
-        # Calculate expires_at
-        expires_at = datetime.utcnow() + timedelta(seconds=REPORT_TTL_SECONDS)
-        
-        # Create the report with expires_at
-        cursor.execute(
-            '''INSERT INTO reports (user_id, type_id, latitude, longitude, description, status, expires_at) 
-               VALUES (%s, %s, %s, %s, %s, 'ACTIVE', %s) 
-               RETURNING id, user_id, type_id, latitude, longitude, description, status, created_at, expires_at''',
-            (user_id, type_id, latitude, longitude, description, expires_at)
-        )
-        report = cursor.fetchone()
-        conn.commit()
-        
-        # Get the username for the response
-        cursor.execute('SELECT username FROM users WHERE id = %s', (user_id,))
-        user = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
+        if not report.get('duplicate'):
+            publish_write('reports', user_id)
         
         return jsonify({
             'success': True,
             'report': {
                 'id': report['id'],
                 'user_id': report['user_id'],
-                'username': user['username'] if user else 'Unknown',
+                'username': report['username'] or 'Unknown',
                 'type_name': report_type,
                 'latitude': float(report['latitude']),
                 'longitude': float(report['longitude']),
@@ -347,8 +557,8 @@ def create_report():
                 'created_at': report['created_at'].isoformat() if report['created_at'] else None,
                 'expires_at': report['expires_at'].isoformat() if report['expires_at'] else None
             },
-            'message': 'Report created successfully'
-        }), 201
+            'message': 'Report already created' if report.get('duplicate') else 'Report created successfully'
+        }), 200 if report.get('duplicate') else 201
         
     except Exception as e:
         print(f"Create report error: {e}")
@@ -359,54 +569,95 @@ def create_report():
 
 @app.route('/api/reports', methods=['GET'])
 def get_reports():
-    """Get all active (non-expired) reports for the map"""
+    """Get one page of active (non-expired) reports for the map, newest first"""
     try:
         user_id, error = verify_token()
         if error:
             return jsonify({'success': False, 'message': error}), 401
         
-        conn = get_db()
-        if not conn:
+        limit = request.args.get('limit', REPORTS_PAGE_SIZE, type=int)
+        if limit < 1:
             return jsonify({
                 'success': False,
-                'message': 'Database connection failed'
-            }), 500
-        
-        cursor = conn.cursor()
+                'message': 'limit must be a positive number'
+            }), 400
+        limit = min(limit, REPORTS_MAX_PAGE_SIZE)
         
-        # Get all active reports that haven't expired with vote counts
-        cursor.execute('''
-            SELECT r.id, r.user_id, u.username, it.type_name, 
-                   r.latitude, r.longitude, r.description, r.status, r.created_at, r.expires_at,
-                   COALESCE(keep_votes.count, 0) as keep_votes,
-                   COALESCE(remove_votes.count, 0) as remove_votes
-            FROM reports r
-            JOIN incident_types it ON r.type_id = it.id
-            JOIN users u ON r.user_id = u.id
-            LEFT JOIN (
-                SELECT report_id, COUNT(*) as count 
-                FROM report_votes WHERE vote_type = 'keep' 
-                GROUP BY report_id
-            ) keep_votes ON r.id = keep_votes.report_id
-            LEFT JOIN (
-                SELECT report_id, COUNT(*) as count 
-                FROM report_votes WHERE vote_type = 'remove' 
-                GROUP BY report_id
-            ) remove_votes ON r.id = remove_votes.report_id
-            WHERE r.status = 'ACTIVE' 
-              AND (r.expires_at IS NULL OR r.expires_at > NOW())
-            ORDER BY r.created_at DESC
-        ''')
-        reports = cursor.fetchall()
-        
-        # Check which reports the current user has voted on
-        cursor.execute('''
-            SELECT report_id, vote_type FROM report_votes WHERE user_id = %s
-        ''', (user_id,))
-        user_votes = {row['report_id']: row['vote_type'] for row in cursor.fetchall()}
+        after = None
+        if request.args.get('cursor'):
+            try:
+                after = decode_cursor(request.args['cursor'], datetime.fromisoformat, int)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Invalid cursor'
+                }), 400
+        
+        # Optional bounding box, e.g. the visible part of the map
+        bbox = None
+        if any(name in request.args for name in BBOX_PARAMS):
+            try:
+                bbox = {name: float(request.args[name]) for name in BBOX_PARAMS}
+            except (KeyError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'message': 'min_lat, min_lon, max_lat and max_lon must all be numbers'
+                }), 400
         
-        cursor.close()
-        conn.close()
+        snapshot_key = (limit, request.args.get('cursor'), tuple(bbox.values()) if bbox else None)
+        conn = get_read_db(user_id)
+        if not conn:
+            return serve_reports_snapshot(snapshot_key)
+        
+        with closing(conn):
+            cursor = conn.cursor()
+            
+            # Keyset pagination: continue after the last report of the previous page.
+            # One extra row tells whether there is a next page.
+            after_sql = 'AND (created_at, id) < (%(after_created_at)s, %(after_id)s)' if after else ''
+            # Same expression as idx_reports_active_location (V009)
+            bbox_sql = '''AND point(longitude::float8, latitude::float8)
+                          <@ box(point(%(min_lon)s, %(min_lat)s), point(%(max_lon)s, %(max_lat)s))''' if bbox else ''
+            cursor.execute(f'''
+                SELECT r.id, r.user_id, u.username, it.type_name, 
+                       r.latitude, r.longitude, r.description, r.status, r.created_at, r.expires_at,
+                       vote_counts.keep_votes, vote_counts.remove_votes
+                FROM (
+                    SELECT * FROM reports
+                    WHERE status = 'ACTIVE'
+                      AND (expires_at IS NULL OR expires_at > NOW())
+                      {after_sql}
+                      {bbox_sql}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %(limit)s
+                ) r
+                JOIN incident_types it ON r.type_id = it.id
+                JOIN users u ON r.user_id = u.id
+                -- Count votes per report of the page instead of grouping the whole report_votes table
+                CROSS JOIN LATERAL (
+                    SELECT COUNT(*) FILTER (WHERE vote_type = 'keep') as keep_votes,
+                           COUNT(*) FILTER (WHERE vote_type = 'remove') as remove_votes
+                    FROM report_votes v
+                    WHERE v.report_id = r.id AND v.report_created_at = r.created_at
+                ) vote_counts
+                ORDER BY r.created_at DESC, r.id DESC
+            ''', {
+                'after_created_at': after[0] if after else None,
+                'after_id': after[1] if after else None,
+                'limit': limit + 1,
+                **(bbox or {})
+            })
+            reports = cursor.fetchall()
+            next_cursor = None
+            if len(reports) > limit:
+                reports = reports[:limit]
+                next_cursor = encode_cursor(reports[-1]['created_at'], reports[-1]['id'])
+            
+            # Check which reports of the page the current user has voted on
+            cursor.execute('''
+                SELECT report_id, vote_type FROM report_votes WHERE user_id = %s AND report_id = ANY(%s)
+            ''', (user_id, [report['id'] for report in reports]))
+            user_votes = {row['report_id']: row['vote_type'] for row in cursor.fetchall()}
         
         # Convert to list of dicts with proper types
         reports_list = []
@@ -427,12 +678,22 @@ def get_reports():
                 'user_vote': user_votes.get(report['id'])  # 'keep', 'remove', or None
             })
         
+        # Without the user's votes, the snapshot is shared by everyone
+        _reports_snapshots.pop(snapshot_key, None)
+        _reports_snapshots[snapshot_key] = (datetime.utcnow(), [{**report, 'user_vote': None} for report in reports_list], next_cursor)
+        if len(_reports_snapshots) > REPORTS_SNAPSHOT_PAGES:
+            del _reports_snapshots[next(iter(_reports_snapshots))]
+        
         return jsonify({
             'success': True,
             'reports': reports_list,
+            'next_cursor': next_cursor,
             'votes_threshold': VOTES_THRESHOLD
         })
         
+    except psycopg.OperationalError as e:
+        print(f"Get reports error, serving the last snapshot: {e}")
+        return serve_reports_snapshot(snapshot_key)
     except Exception as e:
         print(f"Get reports error: {e}")
         return jsonify({
@@ -440,6 +701,142 @@ def get_reports():
             'message': 'Internal server error'
         }), 500
 
+# POST /api/reports/route: active reports within width_m of a route, see corridor.py
+ROUTE_MAX_POINTS = 10000
+ROUTE_MAX_LENGTH_M = 2000000
+ROUTE_DEFAULT_WIDTH_M = 200
+ROUTE_MIN_WIDTH_M = 10
+ROUTE_MAX_WIDTH_M = 5000
+ROUTE_MAX_REPORTS = 500
+
+def parse_route(data):
+    """Return the RouteCorridor of a route request, or an error message"""
+    try:
+        path = data.get('path') or []
+        lats = [float(lat) for lat, _ in path]
+        lons = [float(lon) for _, lon in path]
+        width_m = float(data.get('width_m', ROUTE_DEFAULT_WIDTH_M))
+    except (TypeError, ValueError):
+        return None, 'path must be a list of [latitude, longitude] points'
+    if not 2 <= len(lats) <= ROUTE_MAX_POINTS:
+        return None, f'A route needs 2 to {ROUTE_MAX_POINTS} points'
+    # NaN is false in every comparison, so the range check alone lets it through
+    if not all(map(math.isfinite, lats + lons)):
+        return None, 'Invalid route point'
+    if min(lats) < -90 or max(lats) > 90 or min(lons) < -180 or max(lons) > 180:
+        return None, 'Invalid route point'
+    if not ROUTE_MIN_WIDTH_M <= width_m <= ROUTE_MAX_WIDTH_M:
+        return None, f'width_m must be between {ROUTE_MIN_WIDTH_M} and {ROUTE_MAX_WIDTH_M}'
+    try:
+        return RouteCorridor(lats, lons, width_m, max_length_m=ROUTE_MAX_LENGTH_M), None
+    except ValueError:
+        return None, f'A route can be at most {ROUTE_MAX_LENGTH_M // 1000} km long'
+
+@app.route('/api/reports/route', methods=['POST'])
+def get_reports_along_route():
+    """Active reports within width_m of a route, in the order the route passes them"""
+    try:
+        user_id, error = verify_token()
+        if error:
+            return jsonify({'success': False, 'message': error}), 401
+        
+        corridor, error = parse_route(request.get_json() or {})
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
+        
+        conn = get_read_db(user_id)
+        if not conn:
+            return jsonify({
+                'success': False,
+                'message': 'Database connection failed'
+            }), 500
+        
+        with closing(conn):
+            cursor = conn.cursor()
+            
+            # One index search per chunk of the route (idx_reports_active_location, see
+            # migrations/V009). A report near several chunks comes back once, with all of them.
+            boxes = corridor.boxes()
+            cursor.execute('''
+                SELECT r.id, r.user_id, u.username, it.type_name,
+                       r.latitude, r.longitude, r.description, r.status, r.created_at, r.expires_at, r.chunks
+                FROM (
+                    SELECT c.id, c.user_id, c.type_id, c.latitude, c.longitude, c.description, c.status,
+                           c.created_at, c.expires_at, array_agg(b.chunk - 1) as chunks
+                    FROM unnest(%s::float8[], %s::float8[], %s::float8[], %s::float8[])
+                        WITH ORDINALITY AS b(min_lat, min_lon, max_lat, max_lon, chunk)
+                    CROSS JOIN LATERAL (
+                        SELECT id, user_id, type_id, latitude, longitude, description, status, created_at, expires_at
+                        FROM reports
+                        WHERE status = 'ACTIVE'
+                          AND (expires_at IS NULL OR expires_at > NOW())
+                          AND point(longitude::float8, latitude::float8)
+                              <@ box(point(b.min_lon, b.min_lat), point(b.max_lon, b.max_lat))
+                    ) c
+                    GROUP BY c.id, c.user_id, c.type_id, c.latitude, c.longitude, c.description, c.status,
+                             c.created_at, c.expires_at
+                ) r
+                JOIN incident_types it ON r.type_id = it.id
+                JOIN users u ON r.user_id = u.id
+            ''', [list(column) for column in zip(*boxes)])
+            
+            # Exact distance to the segments of the chunks each report was found in
+            reports = []
+            for report in cursor.fetchall():
+                located = corridor.locate(float(report['latitude']), float(report['longitude']), report['chunks'])
+                if located:
+                    report['distance_from_route_m'], report['distance_along_route_m'] = located
+                    reports.append(report)
+            reports.sort(key=lambda report: report['distance_along_route_m'])
+            reports = reports[:ROUTE_MAX_REPORTS]
+            
+            # Votes of the reports on the route, and the current user's own
+            cursor.execute('''
+                SELECT report_id,
+                       COUNT(*) FILTER (WHERE vote_type = 'keep') as keep_votes,
+                       COUNT(*) FILTER (WHERE vote_type = 'remove') as remove_votes,
+                       MAX(vote_type) FILTER (WHERE user_id = %s) as user_vote
+                FROM report_votes
+                WHERE report_id = ANY(%s)
+                GROUP BY report_id
+            ''', (user_id, [report['id'] for report in reports]))
+            votes = {row['report_id']: row for row in cursor.fetchall()}
+        
+        reports_list = []
+        for report in reports:
+            report_votes = votes.get(report['id'], {})
+            reports_list.append({
+                'id': report['id'],
+                'user_id': report['user_id'],
+                'username': report['username'],
+                'type_name': report['type_name'],
+                'latitude': float(report['latitude']),
+                'longitude': float(report['longitude']),
+                'description': report['description'],
+                'status': report['status'],
+                'created_at': report['created_at'].isoformat() if report['created_at'] else None,
+                'expires_at': report['expires_at'].isoformat() if report['expires_at'] else None,
+                'keep_votes': report_votes.get('keep_votes', 0),
+                'remove_votes': report_votes.get('remove_votes', 0),
+                'user_vote': report_votes.get('user_vote'),
+                'distance_from_route_m': round(report['distance_from_route_m'], 1),
+                'distance_along_route_m': round(report['distance_along_route_m'], 1)
+            })
+        
+        return jsonify({
+            'success': True,
+            'reports': reports_list,
+            'route_length_m': round(corridor.length_m, 1),
+            'votes_threshold': VOTES_THRESHOLD
+        })
+        
+    except Exception as e:
+        print(f"Reports along route error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
 @app.route('/api/reports/<int:report_id>/vote', methods=['POST'])
 def vote_on_report(report_id):
     """Vote to keep or remove a report. 3 votes needed for action."""
@@ -464,106 +861,468 @@ def vote_on_report(report_id):
                 'message': 'Database connection failed'
             }), 500
         
-        cursor = conn.cursor()
+        with closing(conn):
+            cursor = conn.cursor()
+            
+            # Check if report exists and is active
+            cursor.execute('SELECT id, created_at, expires_at FROM reports WHERE id = %s AND status = %s', (report_id, 'ACTIVE'))
+            report = cursor.fetchone()
+            
+            if not report:
+                return jsonify({
+                    'success': False,
+                    'message': 'Report not found or already expired'
+                }), 404
+            
+            # created_at is the partition key of reports and report_votes, passing it lets
+            # PostgreSQL go straight to the right monthly partition
+            report_created_at = report['created_at']
+            
+            # Check if user already voted on this report
+            cursor.execute(
+                'SELECT id, vote_type FROM report_votes WHERE report_id = %s AND report_created_at = %s AND user_id = %s',
+                (report_id, report_created_at, user_id)
+            )
+            existing_vote = cursor.fetchone()
+            credit_id = None
+            
+            if existing_vote:
+                if existing_vote['vote_type'] == vote_type:
+                    # Same vote - get current counts and return
+                    cursor.execute('''
+                        SELECT vote_type, COUNT(*) as count 
+                        FROM report_votes 
+                        WHERE report_id = %s AND report_created_at = %s 
+                        GROUP BY vote_type
+                    ''', (report_id, report_created_at))
+                    vote_counts = {row['vote_type']: row['count'] for row in cursor.fetchall()}
+                    return jsonify({
+                        'success': True,
+                        'message': 'You already voted this way',
+                        'already_voted': True,
+                        'keep_votes': vote_counts.get('keep', 0),
+                        'remove_votes': vote_counts.get('remove', 0),
+                        'votes_threshold': VOTES_THRESHOLD
+                    })
+                else:
+                    # Change vote
+                    cursor.execute(
+                        'UPDATE report_votes SET vote_type = %s WHERE id = %s AND report_created_at = %s',
+                        (vote_type, existing_vote['id'], report_created_at)
+                    )
+            else:
+                # New vote - insert and increase reputation
+                cursor.execute(
+                    'INSERT INTO report_votes (report_id, report_created_at, user_id, vote_type) VALUES (%s, %s, %s, %s)',
+                    (report_id, report_created_at, user_id, vote_type)
+                )
+                # Increase reputation score by 1 for participating in voting. The point is
+                # added to users in batches by reputation.py, so votes never wait on users row locks.
+                credit_id = add_credit(cursor, user_id)
+            
+            conn.commit()
+            if credit_id is not None:
+                buffer_credit(credit_id)
+            
+            # Count votes
+            cursor.execute('''
+                SELECT vote_type, COUNT(*) as count 
+                FROM report_votes 
+                WHERE report_id = %s AND report_created_at = %s 
+                GROUP BY vote_type
+            ''', (report_id, report_created_at))
+            vote_counts = {row['vote_type']: row['count'] for row in cursor.fetchall()}
+            
+            keep_votes = vote_counts.get('keep', 0)
+            remove_votes = vote_counts.get('remove', 0)
+            
+            result = {
+                'success': True,
+                'keep_votes': keep_votes,
+                'remove_votes': remove_votes,
+                'votes_threshold': VOTES_THRESHOLD,
+                'action_taken': None
+            }
+            
+            # Check if threshold reached
+            if remove_votes >= VOTES_THRESHOLD:
+                # Delete the report
+                cursor.execute('DELETE FROM reports WHERE id = %s AND created_at = %s', (report_id, report_created_at))
+                conn.commit()
+                result['action_taken'] = 'removed'
+                result['message'] = 'Report removed! (3 votes reached)'
+            elif keep_votes >= VOTES_THRESHOLD:
+                # Extend TTL and reset votes
+                new_expires_at = datetime.utcnow() + timedelta(seconds=REPORT_TTL_SECONDS)
+                cursor.execute(
+                    'UPDATE reports SET expires_at = %s WHERE id = %s AND created_at = %s',
+                    (new_expires_at, report_id, report_created_at)
+                )
+                cursor.execute(
+                    'DELETE FROM report_votes WHERE report_id = %s AND report_created_at = %s',
+                    (report_id, report_created_at)
+                )
+                conn.commit()
+                result['action_taken'] = 'extended'
+                result['message'] = 'Report confirmed! TTL extended and votes reset.'
+                result['keep_votes'] = 0
+                result['remove_votes'] = 0
+                result['expires_at'] = new_expires_at.isoformat()
+            else:
+                result['message'] = f'Vote recorded! ({keep_votes}/3 keep, {remove_votes}/3 remove)'
+        publish_write('reports', user_id)
         
-        # Check if report exists and is active
-        cursor.execute('SELECT id, expires_at FROM reports WHERE id = %s AND status = %s', (report_id, 'ACTIVE'))
-        report = cursor.fetchone()
+        return jsonify(result)
         
-        if not report:
-            cursor.close()
+    except Exception as e:
+        print(f"Vote on report error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
+# ==================== AREA SUBSCRIPTIONS ====================
+
+SUBSCRIPTION_TYPES = ['POLICE', 'ACCIDENT']
+SUBSCRIPTIONS_PER_USER = 20
+SUBSCRIPTION_MIN_RADIUS_M = 50
+SUBSCRIPTION_MAX_RADIUS_M = 50000
+# Polygons: at most this many vertices and this many degrees across
+SUBSCRIPTION_MAX_VERTICES = 100
+SUBSCRIPTION_MAX_POLYGON_DEGREES = 1.0
+NOTIFICATIONS_PAGE_SIZE = 50
+
+# Every subscription, in memory, for matching new reports (see geofence.py). Built by a
+# background thread at startup, again whenever bus messages may have been missed, and
+# every GEOFENCES_RELOAD_SECONDS in case a worker died before publishing its change;
+# changes from the other workers arrive over the 'subscriptions' bus channel.
+GEOFENCES_FIRST_LOAD_WAIT_SECONDS = float(os.getenv('GEOFENCES_FIRST_LOAD_WAIT_SECONDS', 2))
+GEOFENCES_RELOAD_SECONDS = float(os.getenv('GEOFENCES_RELOAD_SECONDS', 300))
+geofences = GeofenceIndex()
+_geofences_lock = threading.Lock()
+# Set once the first load attempt ended; reports before that wait for it, briefly
+_geofences_ready = threading.Event()
+_geofences_reload = threading.Event()
+# Bus messages received while a load runs, replayed on the new index before the swap
+_geofences_replay = None
+
+def subscription_area(row):
+    """Area for geofence matching from an area_subscriptions row"""
+    if row['polygon'] is not None:
+        return Area(row['id'], row['user_id'], row['types'], polygon=row['polygon'])
+    return Area(row['id'], row['user_id'], row['types'],
+                center=(row['center_latitude'], row['center_longitude']), radius_m=row['radius_m'])
+
+def subscription_dict(row):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'types': row['types'],
+        'circle': {
+            'latitude': row['center_latitude'],
+            'longitude': row['center_longitude'],
+            'radius_m': row['radius_m']
+        } if row['polygon'] is None else None,
+        'polygon': row['polygon']
+    }
+
+def apply_subscription_change(index, payload):
+    if payload['action'] == 'add':
+        index.add(subscription_area(payload['subscription']))
+    else:
+        index.remove(payload['id'])
+
+def load_geofences():
+    """Build a new geofence index from every subscription and swap it in. Messages that
+    arrive meanwhile go to the current index and are replayed on the new one, as the
+    query may or may not have seen their change."""
+    global geofences, _geofences_replay
+    with _geofences_lock:
+        _geofences_replay = []
+    try:
+        conn = get_db()
+        if not conn:
+            raise ConnectionError('database unavailable')
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, user_id, types, center_latitude, center_longitude, radius_m, polygon FROM area_subscriptions')
+            index = GeofenceIndex()
+            for row in cursor.fetchall():
+                index.add(subscription_area(row))
+        finally:
             conn.close()
+        with _geofences_lock:
+            for payload in _geofences_replay:
+                apply_subscription_change(index, payload)
+            geofences = index
+    finally:
+        with _geofences_lock:
+            _geofences_replay = None
+        # Reports only wait for the first attempt; if it failed they match against the
+        # empty index until a retry works, instead of waiting in every transaction
+        _geofences_ready.set()
+
+def _load_geofences_forever():
+    while True:
+        _geofences_reload.wait(GEOFENCES_RELOAD_SECONDS)
+        _geofences_reload.clear()
+        try:
+            load_geofences()
+        except Exception as e:
+            print(f"Geofence load error, retrying: {e}")
+            _geofences_reload.set()
+            time.sleep(5)
+
+def _on_subscription_change(payload):
+    if payload is None:
+        # Messages may have been missed, rebuild from the database
+        _geofences_reload.set()
+        return
+    with _geofences_lock:
+        apply_subscription_change(geofences, payload)
+        if _geofences_replay is not None:
+            _geofences_replay.append(payload)
+
+bus.subscribe('subscriptions', _on_subscription_change)
+_geofences_reload.set()
+threading.Thread(target=_load_geofences_forever, daemon=True).start()
+
+def notify_area_subscribers(cursor, new_reports, reports):
+    """Store a notification for every subscription matching one of the new reports"""
+    _geofences_ready.wait(GEOFENCES_FIRST_LOAD_WAIT_SECONDS)
+    notifications = []
+    for new_report, report in zip(new_reports, reports):
+        if not report:
+            continue
+        latitude, longitude = float(report['latitude']), float(report['longitude'])
+        for area in geofences.match(latitude, longitude, new_report['type_name']):
+            # No alert for your own report
+            if area.user_id != report['user_id']:
+                notifications.append((area.user_id, area.id, report['id'], new_report['type_name'], latitude, longitude))
+    if notifications:
+        # The join skips subscriptions deleted since this worker heard about them
+        cursor.execute('''
+            INSERT INTO area_notifications (user_id, subscription_id, report_id, type_name, latitude, longitude)
+            SELECT n.* FROM unnest(%s::int[], %s::int[], %s::int[], %s::text[], %s::float8[], %s::float8[])
+                AS n(user_id, subscription_id, report_id, type_name, latitude, longitude)
+            JOIN area_subscriptions s ON s.id = n.subscription_id
+        ''', [list(column) for column in zip(*notifications)])
+
+def parse_area(data):
+    """Return the area columns of a subscription request, or an error message"""
+    circle = data.get('circle')
+    polygon = data.get('polygon')
+    if bool(circle) == bool(polygon):
+        return None, 'Give either a circle or a polygon'
+    try:
+        if circle:
+            latitude = float(circle['latitude'])
+            longitude = float(circle['longitude'])
+            radius_m = float(circle['radius_m'])
+            if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+                return None, 'Invalid circle center'
+            if not SUBSCRIPTION_MIN_RADIUS_M <= radius_m <= SUBSCRIPTION_MAX_RADIUS_M:
+                return None, f'radius_m must be between {SUBSCRIPTION_MIN_RADIUS_M} and {SUBSCRIPTION_MAX_RADIUS_M}'
+            return {'center_latitude': latitude, 'center_longitude': longitude, 'radius_m': radius_m, 'polygon': None}, None
+        points = [[float(lat), float(lon)] for lat, lon in polygon]
+    except (KeyError, TypeError, ValueError):
+        return None, 'Invalid area'
+    if not 3 <= len(points) <= SUBSCRIPTION_MAX_VERTICES:
+        return None, f'A polygon needs 3 to {SUBSCRIPTION_MAX_VERTICES} points'
+    min_lat, min_lon, max_lat, max_lon = polygon_bounds(points)
+    if max_lat - min_lat > SUBSCRIPTION_MAX_POLYGON_DEGREES or max_lon - min_lon > SUBSCRIPTION_MAX_POLYGON_DEGREES:
+        return None, f'A polygon can be at most {SUBSCRIPTION_MAX_POLYGON_DEGREES} degrees across'
+    return {'center_latitude': None, 'center_longitude': None, 'radius_m': None, 'polygon': points}, None
+
+@app.route('/api/subscriptions', methods=['POST'])
+def create_subscription():
+    """Subscribe to reports inside a circle or polygon, optionally of some types only"""
+    try:
+        user_id, error = verify_token()
+        if error:
+            return jsonify({'success': False, 'message': error}), 401
+        
+        data = request.get_json() or {}
+        area, error = parse_area(data)
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
+        
+        types = data.get('types') or None
+        if types is not None and (not isinstance(types, list) or not set(types) <= set(SUBSCRIPTION_TYPES)):
             return jsonify({
                 'success': False,
-                'message': 'Report not found or already expired'
-            }), 404
+                'message': f"types must be a list of {', '.join(SUBSCRIPTION_TYPES)}"
+            }), 400
         
-        # Check if user already voted on this report
-        cursor.execute('SELECT id, vote_type FROM report_votes WHERE report_id = %s AND user_id = %s', (report_id, user_id))
-        existing_vote = cursor.fetchone()
+        conn = get_db()
+        if not conn:
+            return jsonify({
+                'success': False,
+                'message': 'Database connection failed'
+            }), 500
         
-        if existing_vote:
-            if existing_vote['vote_type'] == vote_type:
-                # Same vote - get current counts and return
-                cursor.execute('''
-                    SELECT vote_type, COUNT(*) as count 
-                    FROM report_votes 
-                    WHERE report_id = %s 
-                    GROUP BY vote_type
-                ''', (report_id,))
-                vote_counts = {row['vote_type']: row['count'] for row in cursor.fetchall()}
-                cursor.close()
-                conn.close()
+        with closing(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) as count FROM area_subscriptions WHERE user_id = %s', (user_id,))
+            if cursor.fetchone()['count'] >= SUBSCRIPTIONS_PER_USER:
                 return jsonify({
-                    'success': True,
-                    'message': 'You already voted this way',
-                    'already_voted': True,
-                    'keep_votes': vote_counts.get('keep', 0),
-                    'remove_votes': vote_counts.get('remove', 0),
-                    'votes_threshold': VOTES_THRESHOLD
-                })
-            else:
-                # Change vote
-                cursor.execute('UPDATE report_votes SET vote_type = %s WHERE id = %s', (vote_type, existing_vote['id']))
-        else:
-            # New vote - insert and increase reputation
-            cursor.execute(
-                'INSERT INTO report_votes (report_id, user_id, vote_type) VALUES (%s, %s, %s)',
-                (report_id, user_id, vote_type)
-            )
-            # Increase reputation score by 1 for participating in voting
-            cursor.execute('UPDATE users SET reputation_score = reputation_score + 1 WHERE id = %s', (user_id,))
+                    'success': False,
+                    'message': f'At most {SUBSCRIPTIONS_PER_USER} subscriptions per user'
+                }), 400
+            
+            cursor.execute('''
+                INSERT INTO area_subscriptions (user_id, name, types, center_latitude, center_longitude, radius_m, polygon)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                RETURNING id, user_id, name, types, center_latitude, center_longitude, radius_m, polygon
+            ''', (user_id, str(data.get('name', ''))[:100], types, area['center_latitude'], area['center_longitude'],
+                  area['radius_m'], Jsonb(area['polygon']) if area['polygon'] else None))
+            subscription = cursor.fetchone()
+            conn.commit()
         
-        conn.commit()
+        bus.publish('subscriptions', {'action': 'add', 'subscription': subscription})
         
-        # Count votes
-        cursor.execute('''
-            SELECT vote_type, COUNT(*) as count 
-            FROM report_votes 
-            WHERE report_id = %s 
-            GROUP BY vote_type
-        ''', (report_id,))
-        vote_counts = {row['vote_type']: row['count'] for row in cursor.fetchall()}
+        return jsonify({
+            'success': True,
+            'subscription': subscription_dict(subscription)
+        }), 201
         
-        keep_votes = vote_counts.get('keep', 0)
-        remove_votes = vote_counts.get('remove', 0)
+    except Exception as e:
+        print(f"Create subscription error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
+@app.route('/api/subscriptions', methods=['GET'])
+def get_subscriptions():
+    """List the current user's area subscriptions"""
+    try:
+        user_id, error = verify_token()
+        if error:
+            return jsonify({'success': False, 'message': error}), 401
+        
+        conn = get_read_db(user_id)
+        if not conn:
+            return jsonify({
+                'success': False,
+                'message': 'Database connection failed'
+            }), 500
         
-        result = {
+        with closing(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, user_id, name, types, center_latitude, center_longitude, radius_m, polygon
+                FROM area_subscriptions WHERE user_id = %s ORDER BY id
+            ''', (user_id,))
+            subscriptions = [subscription_dict(row) for row in cursor.fetchall()]
+        
+        return jsonify({
             'success': True,
-            'keep_votes': keep_votes,
-            'remove_votes': remove_votes,
-            'votes_threshold': VOTES_THRESHOLD,
-            'action_taken': None
-        }
+            'subscriptions': subscriptions
+        })
         
-        # Check if threshold reached
-        if remove_votes >= VOTES_THRESHOLD:
-            # Delete the report
-            cursor.execute('DELETE FROM reports WHERE id = %s', (report_id,))
-            conn.commit()
-            result['action_taken'] = 'removed'
-            result['message'] = 'Report removed! (3 votes reached)'
-        elif keep_votes >= VOTES_THRESHOLD:
-            # Extend TTL and reset votes
-            new_expires_at = datetime.utcnow() + timedelta(seconds=REPORT_TTL_SECONDS)
-            cursor.execute('UPDATE reports SET expires_at = %s WHERE id = %s', (new_expires_at, report_id))
-            cursor.execute('DELETE FROM report_votes WHERE report_id = %s', (report_id,))
+    except Exception as e:
+        print(f"Get subscriptions error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
+@app.route('/api/subscriptions/<int:subscription_id>', methods=['DELETE'])
+def delete_subscription(subscription_id):
+    """Remove one of the current user's area subscriptions"""
+    try:
+        user_id, error = verify_token()
+        if error:
+            return jsonify({'success': False, 'message': error}), 401
+        
+        conn = get_db()
+        if not conn:
+            return jsonify({
+                'success': False,
+                'message': 'Database connection failed'
+            }), 500
+        
+        with closing(conn):
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM area_subscriptions WHERE id = %s AND user_id = %s', (subscription_id, user_id))
+            deleted = cursor.rowcount
             conn.commit()
-            result['action_taken'] = 'extended'
-            result['message'] = 'Report confirmed! TTL extended and votes reset.'
-            result['keep_votes'] = 0
-            result['remove_votes'] = 0
-            result['expires_at'] = new_expires_at.isoformat()
-        else:
-            result['message'] = f'Vote recorded! ({keep_votes}/3 keep, {remove_votes}/3 remove)'
         
-        cursor.close()
-        conn.close()
+        if not deleted:
+            return jsonify({
+                'success': False,
+                'message': 'Subscription not found'
+            }), 404
         
-        return jsonify(result)
+        bus.publish('subscriptions', {'action': 'remove', 'id': subscription_id})
+        
+        return jsonify({
+            'success': True,
+            'message': 'Subscription removed'
+        })
         
     except Exception as e:
-        print(f"Vote on report error: {e}")
+        print(f"Delete subscription error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
+@app.route('/api/notifications', methods=['GET'])
+def get_notifications():
+    """Alerts for reports inside the user's subscribed areas, newer than `after`"""
+    try:
+        user_id, error = verify_token()
+        if error:
+            return jsonify({'success': False, 'message': error}), 401
+        
+        after = request.args.get('after', type=int)
+        
+        conn = get_read_db(user_id)
+        if not conn:
+            return jsonify({
+                'success': False,
+                'message': 'Database connection failed'
+            }), 500
+        
+        with closing(conn):
+            cursor = conn.cursor()
+            if after is None:
+                # The latest ones, so a client can start from there
+                cursor.execute('''
+                    SELECT * FROM (
+                        SELECT n.id, n.subscription_id, s.name as subscription_name, n.report_id, n.type_name,
+                               n.latitude, n.longitude, n.created_at
+                        FROM area_notifications n
+                        JOIN area_subscriptions s ON s.id = n.subscription_id
+                        WHERE n.user_id = %s
+                        ORDER BY n.id DESC
+                        LIMIT %s
+                    ) latest ORDER BY id
+                ''', (user_id, NOTIFICATIONS_PAGE_SIZE))
+            else:
+                cursor.execute('''
+                    SELECT n.id, n.subscription_id, s.name as subscription_name, n.report_id, n.type_name,
+                           n.latitude, n.longitude, n.created_at
+                    FROM area_notifications n
+                    JOIN area_subscriptions s ON s.id = n.subscription_id
+                    WHERE n.user_id = %s AND n.id > %s
+                    ORDER BY n.id
+                    LIMIT %s
+                ''', (user_id, after, NOTIFICATIONS_PAGE_SIZE))
+            notifications = cursor.fetchall()
+        
+        for notification in notifications:
+            notification['created_at'] = notification['created_at'].isoformat() if notification['created_at'] else None
+        
+        return jsonify({
+            'success': True,
+            'notifications': notifications
+        })
+        
+    except Exception as e:
+        print(f"Get notifications error: {e}")
         return jsonify({
             'success': False,
             'message': 'Internal server error'
@@ -598,21 +1357,21 @@ def get_profile():
                 'message': 'Invalid token'
             }), 403
         
-        conn = get_db()
+        conn = get_read_db(user_id)
         if not conn:
             return jsonify({
                 'success': False,
                 'message': 'Database connection failed'
             }), 500
         
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT id, username, email, reputation_score, created_at FROM users WHERE id = %s',
-            (user_id,)
-        )
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with closing(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, username, email, reputation_score, report_count, vote_count, created_at,
+                       reputation_rank(reputation_score) as rank
+                FROM users WHERE id = %s
+            ''', (user_id,))
+            user = cursor.fetchone()
         
         if not user:
             return jsonify({
@@ -634,136 +1393,174 @@ def get_profile():
 
 # ==================== STATISTICS ====================
 
+# Every query behind /api/statistics, by name. run_statistics_queries() sends them all at once.
+STATISTICS_QUERIES = {
+    # 1. Reports by type (all time)
+    'reports_by_type': '''
+        SELECT it.type_name, COUNT(r.id) as count
+        FROM incident_types it
+        LEFT JOIN reports r ON r.type_id = it.id
+        GROUP BY it.id, it.type_name
+        ORDER BY count DESC
+    ''',
+    # 2. Reports per day (last 30 days)
+    'reports_per_day': '''
+        SELECT DATE(created_at) as date, COUNT(*) as count
+        FROM reports
+        WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
+        GROUP BY DATE(created_at)
+        ORDER BY date ASC
+    ''',
+    # 3. Reports per month (last 12 months)
+    'reports_per_month': '''
+        SELECT TO_CHAR(created_at, 'YYYY-MM') as month, COUNT(*) as count
+        FROM reports
+        WHERE created_at >= CURRENT_DATE - INTERVAL '12 months'
+        GROUP BY TO_CHAR(created_at, 'YYYY-MM')
+        ORDER BY month ASC
+    ''',
+    # 4. Reports by type per day (last 7 days) for stacked chart
+    'reports_by_type_daily': '''
+        SELECT DATE(r.created_at) as date, it.type_name, COUNT(*) as count
+        FROM reports r
+        JOIN incident_types it ON r.type_id = it.id
+        WHERE r.created_at >= CURRENT_DATE - INTERVAL '7 days'
+        GROUP BY DATE(r.created_at), it.type_name
+        ORDER BY date ASC
+    ''',
+    # 5. Total statistics
+    'total_reports': 'SELECT COUNT(*) as total FROM reports',
+    'active_reports': "SELECT COUNT(*) as total FROM reports WHERE status = 'ACTIVE'",
+    'total_users': 'SELECT COUNT(*) as total FROM users',
+    'total_votes': 'SELECT COUNT(*) as total FROM report_votes',
+    # 6. Top reporters (users with most reports), report_count is kept up to date by create_report
+    'top_reporters': '''
+        SELECT username, report_count, reputation_score
+        FROM users
+        ORDER BY report_count DESC
+        LIMIT 5
+    ''',
+    # 7. Reports by hour distribution (also gives the most active hour)
+    'reports_by_hour': '''
+        SELECT EXTRACT(HOUR FROM created_at) as hour, COUNT(*) as count
+        FROM reports
+        GROUP BY EXTRACT(HOUR FROM created_at)
+        ORDER BY hour ASC
+    '''
+}
+
+def run_statistics_queries(conn):
+    """Run all STATISTICS_QUERIES and return {name: rows}
+
+    In pipeline mode every query is sent without waiting for the result of the
+    previous one, so the whole set costs about one network round trip to the
+    database instead of one per query.
+    """
+    cursors = {}
+    batch = conn.pipeline() if psycopg.Pipeline.is_supported() else nullcontext()
+    # The results arrive when the pipeline ends, outside of the cursors' own guards
+    with query_guard(conn), batch:
+        for name, sql in STATISTICS_QUERIES.items():
+            cursors[name] = conn.cursor()
+            cursors[name].execute(sql)
+    results = {name: cursor.fetchall() for name, cursor in cursors.items()}
+    for cursor in cursors.values():
+        cursor.close()
+    return results
+
+# The last /api/statistics result, dropped when any worker writes reports or users.
+# STATISTICS_CACHE_SECONDS bounds how stale it gets if an invalidation is lost.
+STATISTICS_CACHE_SECONDS = int(os.getenv('STATISTICS_CACHE_SECONDS', 30))
+_statistics_cache = {'generation': 0, 'cached_at': None, 'statistics': None}
+
+# The last result, also after invalidations, served (marked stale) while the database is unavailable
+_statistics_snapshot = {'taken_at': None, 'statistics': None}
+
+def serve_statistics_snapshot():
+    if not _statistics_snapshot['statistics']:
+        return database_unavailable()
+    return stale_response({'statistics': _statistics_snapshot['statistics']}, _statistics_snapshot['taken_at'])
+
+def _clear_statistics_cache(payload):
+    _statistics_cache['generation'] += 1
+    _statistics_cache['statistics'] = None
+
+bus.subscribe('reports', _clear_statistics_cache)
+bus.subscribe('users', _clear_statistics_cache)
+
 @app.route('/api/statistics', methods=['GET'])
 def get_statistics():
     """Get statistics about reports and users"""
     try:
-        conn = get_db()
+        cached = _statistics_cache['statistics']
+        if cached and time.monotonic() - _statistics_cache['cached_at'] < STATISTICS_CACHE_SECONDS:
+            return jsonify({'success': True, 'statistics': cached})
+        generation = _statistics_cache['generation']
+        
+        conn = get_read_db()
         if not conn:
-            return jsonify({
-                'success': False,
-                'message': 'Database connection failed'
-            }), 500
+            return serve_statistics_snapshot()
         
-        cursor = conn.cursor()
+        with closing(conn):
+            results = run_statistics_queries(conn)
+        
+        reports_by_type = [{'type': row['type_name'], 'count': row['count']} for row in results['reports_by_type']]
+        reports_per_day = [{'date': row['date'].isoformat(), 'count': row['count']} for row in results['reports_per_day']]
+        reports_per_month = [{'month': row['month'], 'count': row['count']} for row in results['reports_per_month']]
         
-        # 1. Reports by type (all time)
-        cursor.execute('''
-            SELECT it.type_name, COUNT(r.id) as count
-            FROM incident_types it
-            LEFT JOIN reports r ON r.type_id = it.id
-            GROUP BY it.id, it.type_name
-            ORDER BY count DESC
-        ''')
-        reports_by_type = [{'type': row['type_name'], 'count': row['count']} for row in cursor.fetchall()]
-        
-        # 2. Reports per day (last 30 days)
-        cursor.execute('''
-            SELECT DATE(created_at) as date, COUNT(*) as count
-            FROM reports
-            WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
-            GROUP BY DATE(created_at)
-            ORDER BY date ASC
-        ''')
-        reports_per_day = [{'date': row['date'].isoformat(), 'count': row['count']} for row in cursor.fetchall()]
-        
-        # 3. Reports per month (last 12 months)
-        cursor.execute('''
-            SELECT TO_CHAR(created_at, 'YYYY-MM') as month, COUNT(*) as count
-            FROM reports
-            WHERE created_at >= CURRENT_DATE - INTERVAL '12 months'
-            GROUP BY TO_CHAR(created_at, 'YYYY-MM')
-            ORDER BY month ASC
-        ''')
-        reports_per_month = [{'month': row['month'], 'count': row['count']} for row in cursor.fetchall()]
-        
-        # 4. Reports by type per day (last 7 days) for stacked chart
-        cursor.execute('''
-            SELECT DATE(r.created_at) as date, it.type_name, COUNT(*) as count
-            FROM reports r
-            JOIN incident_types it ON r.type_id = it.id
-            WHERE r.created_at >= CURRENT_DATE - INTERVAL '7 days'
-            GROUP BY DATE(r.created_at), it.type_name
-            ORDER BY date ASC
-        ''')
         reports_by_type_daily = {}
-        for row in cursor.fetchall():
+        for row in results['reports_by_type_daily']:
             date_str = row['date'].isoformat()
             if date_str not in reports_by_type_daily:
                 reports_by_type_daily[date_str] = {'date': date_str, 'ACCIDENT': 0, 'POLICE': 0, 'POTHOLE': 0, 'TRAFFIC_JAM': 0}
             reports_by_type_daily[date_str][row['type_name']] = row['count']
         reports_by_type_daily_list = list(reports_by_type_daily.values())
         
-        # 5. Total statistics
-        cursor.execute('SELECT COUNT(*) as total FROM reports')
-        total_reports = cursor.fetchone()['total']
+        total_reports = results['total_reports'][0]['total']
+        active_reports = results['active_reports'][0]['total']
+        total_users = results['total_users'][0]['total']
+        total_votes = results['total_votes'][0]['total']
         
-        cursor.execute('SELECT COUNT(*) as total FROM reports WHERE status = %s', ('ACTIVE',))
-        active_reports = cursor.fetchone()['total']
+        top_reporters = [{'username': row['username'], 'reports': row['report_count'], 'reputation': row['reputation_score']} for row in results['top_reporters']]
         
-        cursor.execute('SELECT COUNT(*) as total FROM users')
-        total_users = cursor.fetchone()['total']
+        # Average reports per user
+        avg_reports_per_user = round(total_reports / max(total_users, 1), 2)
         
-        cursor.execute('SELECT COUNT(*) as total FROM report_votes')
-        total_votes = cursor.fetchone()['total']
+        reports_by_hour = [{'hour': int(row['hour']), 'count': row['count']} for row in results['reports_by_hour']]
         
-        # 6. Top reporters (users with most reports)
-        cursor.execute('''
-            SELECT u.username, COUNT(r.id) as report_count, u.reputation_score
-            FROM users u
-            LEFT JOIN reports r ON r.user_id = u.id
-            GROUP BY u.id, u.username, u.reputation_score
-            ORDER BY report_count DESC
-            LIMIT 5
-        ''')
-        top_reporters = [{'username': row['username'], 'reports': row['report_count'], 'reputation': row['reputation_score']} for row in cursor.fetchall()]
-        
-        # 7. Average reports per user
-        avg_reports_per_user = round(total_reports / max(total_users, 1), 2)
+        # Most active hour of the day
+        peak_hour = max(reports_by_hour, key=lambda h: h['count'])['hour'] if reports_by_hour else 0
         
-        # 8. Most active hour of the day
-        cursor.execute('''
-            SELECT EXTRACT(HOUR FROM created_at) as hour, COUNT(*) as count
-            FROM reports
-            GROUP BY EXTRACT(HOUR FROM created_at)
-            ORDER BY count DESC
-            LIMIT 1
-        ''')
-        peak_hour_row = cursor.fetchone()
-        peak_hour = int(peak_hour_row['hour']) if peak_hour_row else 0
-        
-        # 9. Reports by hour distribution
-        cursor.execute('''
-            SELECT EXTRACT(HOUR FROM created_at) as hour, COUNT(*) as count
-            FROM reports
-            GROUP BY EXTRACT(HOUR FROM created_at)
-            ORDER BY hour ASC
-        ''')
-        reports_by_hour = [{'hour': int(row['hour']), 'count': row['count']} for row in cursor.fetchall()]
+        statistics = {
+            'summary': {
+                'total_reports': total_reports,
+                'active_reports': active_reports,
+                'total_users': total_users,
+                'total_votes': total_votes,
+                'avg_reports_per_user': avg_reports_per_user,
+                'peak_hour': peak_hour
+            },
+            'reports_by_type': reports_by_type,
+            'reports_per_day': reports_per_day,
+            'reports_per_month': reports_per_month,
+            'reports_by_type_daily': reports_by_type_daily_list,
+            'reports_by_hour': reports_by_hour,
+            'top_reporters': top_reporters
+        }
         
-        cursor.close()
-        conn.close()
+        # Not cached if a write was published while the queries ran
+        if generation == _statistics_cache['generation']:
+            _statistics_cache.update(cached_at=time.monotonic(), statistics=statistics)
+        _statistics_snapshot.update(taken_at=datetime.utcnow(), statistics=statistics)
         
         return jsonify({
             'success': True,
-            'statistics': {
-                'summary': {
-                    'total_reports': total_reports,
-                    'active_reports': active_reports,
-                    'total_users': total_users,
-                    'total_votes': total_votes,
-                    'avg_reports_per_user': avg_reports_per_user,
-                    'peak_hour': peak_hour
-                },
-                'reports_by_type': reports_by_type,
-                'reports_per_day': reports_per_day,
-                'reports_per_month': reports_per_month,
-                'reports_by_type_daily': reports_by_type_daily_list,
-                'reports_by_hour': reports_by_hour,
-                'top_reporters': top_reporters
-            }
+            'statistics': statistics
         })
         
+    except psycopg.OperationalError as e:
+        print(f"Statistics error, serving the last snapshot: {e}")
+        return serve_statistics_snapshot()
     except Exception as e:
         print(f"Statistics error: {e}")
         return jsonify({
@@ -771,6 +1568,363 @@ def get_statistics():
             'message': 'Internal server error'
         }), 500
 
+# ==================== LEADERBOARD ====================
+
+LEADERBOARD_PAGE_SIZE = 20
+LEADERBOARD_MAX_PAGE_SIZE = 100
+
+@app.route('/api/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """Users ranked by reputation score, one page at a time"""
+    try:
+        limit = request.args.get('limit', LEADERBOARD_PAGE_SIZE, type=int)
+        if limit < 1:
+            return jsonify({
+                'success': False,
+                'message': 'limit must be a positive number'
+            }), 400
+        limit = min(limit, LEADERBOARD_MAX_PAGE_SIZE)
+        
+        after = None
+        if request.args.get('cursor'):
+            try:
+                after = decode_cursor(request.args['cursor'], int, int)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Invalid cursor'
+                }), 400
+        
+        conn = get_read_db()
+        if not conn:
+            return jsonify({
+                'success': False,
+                'message': 'Database connection failed'
+            }), 500
+        
+        with closing(conn):
+            # Keyset pagination on (reputation_score, id) DESC over idx_users_reputation_score_id,
+            # ranks come from the reputation_rank_counts tree (see migrations/V012)
+            after_sql = 'WHERE (reputation_score, id) < (%(after_score)s, %(after_id)s)' if after else ''
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT id, username, reputation_score, report_count, vote_count,
+                       reputation_rank(reputation_score) as rank
+                FROM users
+                {after_sql}
+                ORDER BY reputation_score DESC, id DESC
+                LIMIT %(limit)s
+            ''', {
+                'after_score': after[0] if after else None,
+                'after_id': after[1] if after else None,
+                'limit': limit + 1
+            })
+            users = cursor.fetchall()
+        
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(users[-1]['reputation_score'], users[-1]['id'])
+        
+        return jsonify({
+            'success': True,
+            'leaderboard': [{
+                'rank': user['rank'],
+                'user_id': user['id'],
+                'username': user['username'],
+                'reputation': user['reputation_score'],
+                'reports': user['report_count'],
+                'votes': user['vote_count']
+            } for user in users],
+            'next_cursor': next_cursor
+        })
+        
+    except Exception as e:
+        print(f"Leaderboard error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
+# ==================== HEATMAP ====================
+
+# The finest rollup stores cells at this geohash precision (about 4.9 x 4.9 km)
+HEATMAP_MAX_PRECISION = 5
+
+# Rollup tiers, coarsest first: time unit -> (table, time column, geohash precision).
+# See migrations/V010__heatmap_tiers.sql, heatmap.py keeps them up to date.
+HEATMAP_TIERS = {
+    'month': ('report_heatmap_monthly', 'month', 4),
+    'day': ('report_heatmap_daily', 'day', 5),
+    'hour': ('report_heatmap', 'hour', 5)
+}
+
+# The precision is lowered until the bounding box covers at most this many cells
+HEATMAP_MAX_CELLS = 4096
+
+# The bounding box is narrowed in SQL with at most this many geohash prefixes
+HEATMAP_MAX_PREFIXES = 64
+
+HEATMAP_DEFAULT_DAYS = 7
+
+def heatmap_precision(min_lat, min_lon, max_lat, max_lon, precision):
+    """Lower the precision until the bounding box covers at most HEATMAP_MAX_CELLS cells"""
+    while precision > 1:
+        height, width = geohash_cell_size(precision)
+        if (max_lat - min_lat) / height * (max_lon - min_lon) / width <= HEATMAP_MAX_CELLS:
+            break
+        precision -= 1
+    return precision
+
+def heatmap_prefixes(min_lat, min_lon, max_lat, max_lon, precision):
+    """Return (prefix length, geohash prefixes) covering the bounding box with few enough prefixes"""
+    for length in range(precision, 0, -1):
+        height, width = geohash_cell_size(length)
+        estimate = ((max_lat - min_lat) / height + 2) * ((max_lon - min_lon) / width + 2)
+        if estimate <= HEATMAP_MAX_PREFIXES or length == 1:
+            return length, geohash_cover(min_lat, min_lon, max_lat, max_lon, length)
+
+def parse_utc(value):
+    """Parse an ISO date as a naive UTC datetime; dates with an offset are converted,
+    dates without one are taken as UTC like the stored timestamps"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def truncate_time(moment, unit):
+    """Start of the month, day or hour containing moment"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if unit == 'hour':
+        return moment
+    moment = moment.replace(hour=0)
+    return moment.replace(day=1) if unit == 'month' else moment
+
+def ceil_time(moment, unit):
+    """Start of the first month, day or hour that begins at or after moment"""
+    start = truncate_time(moment, unit)
+    if start == moment:
+        return start
+    if unit == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + (timedelta(days=1) if unit == 'day' else timedelta(hours=1))
+
+def heatmap_ranges(time_from, time_to, units):
+    """Split [time_from, time_to) into [(unit, start, end), ...] with as much as possible
+    in whole buckets of the coarsest unit; the finest unit takes the rest at both ends"""
+    unit, finer = units[0], units[1:]
+    if not finer:
+        return [(unit, time_from, time_to)] if time_from < time_to else []
+    start, end = ceil_time(time_from, unit), truncate_time(time_to, unit)
+    if start >= end:
+        return heatmap_ranges(time_from, time_to, finer)
+    return heatmap_ranges(time_from, start, finer) + [(unit, start, end)] + heatmap_ranges(end, time_to, finer)
+
+@app.route('/api/heatmap', methods=['GET'])
+def get_heatmap():
+    """Get report counts per geohash cell for a bounding box and time range"""
+    try:
+        try:
+            min_lat = float(request.args['min_lat'])
+            min_lon = float(request.args['min_lon'])
+            max_lat = float(request.args['max_lat'])
+            max_lon = float(request.args['max_lon'])
+        except (KeyError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'min_lat, min_lon, max_lat and max_lon are required'
+            }), 400
+        
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+            return jsonify({
+                'success': False,
+                'message': 'Invalid bounding box'
+            }), 400
+        
+        precision = request.args.get('precision', HEATMAP_MAX_PRECISION, type=int)
+        if not 1 <= precision <= HEATMAP_MAX_PRECISION:
+            return jsonify({
+                'success': False,
+                'message': f'Precision must be between 1 and {HEATMAP_MAX_PRECISION}'
+            }), 400
+        
+        # Time range in UTC, the rollup has one bucket per hour
+        try:
+            time_to = parse_utc(request.args['to']) if 'to' in request.args else datetime.utcnow()
+            time_from = (parse_utc(request.args['from']) if 'from' in request.args
+                         else time_to - timedelta(days=HEATMAP_DEFAULT_DAYS))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'from and to must be ISO dates'
+            }), 400
+        time_from = truncate_time(time_from, 'hour')
+        
+        types = [t for t in request.args.get('types', '').split(',') if t] or None
+        
+        conn = get_read_db()
+        if not conn:
+            return jsonify({
+                'success': False,
+                'message': 'Database connection failed'
+            }), 500
+        
+        with closing(conn):
+            precision = heatmap_precision(min_lat, min_lon, max_lat, max_lon, precision)
+            prefix_length, prefixes = heatmap_prefixes(min_lat, min_lon, max_lat, max_lon, precision)
+            
+            # Whole months and days come from the coarser tiers (if they are precise
+            # enough), the hours at both ends of the range from the hourly one
+            units = [unit for unit, (_, _, tier_precision) in HEATMAP_TIERS.items() if tier_precision >= precision]
+            parts = []
+            params = []
+            # The prefixes lie between the first and the last one in "C" order, a range
+            # the geohash indexes can read
+            first_prefix, last_prefix = min(prefixes), max(prefixes) + '~'
+            for unit, start, end in heatmap_ranges(time_from, time_to, units):
+                table, column, _ = HEATMAP_TIERS[unit]
+                parts.append(f'''
+                    SELECT LEFT(h.geohash COLLATE "C", %s) AS cell, h.type_id, h.count
+                    FROM {table} h
+                    WHERE h.{column} >= %s AND h.{column} < %s
+                      AND h.geohash COLLATE "C" >= %s AND h.geohash COLLATE "C" < %s
+                      AND LEFT(h.geohash, %s) = ANY(%s)
+                ''')
+                params += [precision, start, end, first_prefix, last_prefix, prefix_length, prefixes]
+            
+            rows = []
+            if parts:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT r.cell, it.type_name, SUM(r.count) AS count
+                    FROM ({' UNION ALL '.join(parts)}) r
+                    JOIN incident_types it ON r.type_id = it.id
+                    WHERE %s::text[] IS NULL OR it.type_name = ANY(%s)
+                    GROUP BY 1, 2
+                    HAVING SUM(r.count) > 0
+                ''', (*params, types, types))
+                rows = cursor.fetchall()
+        
+        cells = {}
+        for row in rows:
+            cell = cells.get(row['cell'])
+            if cell is None:
+                bounds = geohash_bounds(row['cell'])
+                # The prefixes can cover more than the bounding box
+                if bounds[0] > max_lat or bounds[2] < min_lat or bounds[1] > max_lon or bounds[3] < min_lon:
+                    continue
+                cell = cells[row['cell']] = {
+                    'geohash': row['cell'],
+                    'latitude': (bounds[0] + bounds[2]) / 2,
+                    'longitude': (bounds[1] + bounds[3]) / 2,
+                    'bounds': list(bounds),
+                    'count': 0,
+                    'by_type': {}
+                }
+            cell['count'] += row['count']
+            cell['by_type'][row['type_name']] = row['count']
+        cells_list = sorted(cells.values(), key=lambda c: c['count'], reverse=True)
+        
+        return jsonify({
+            'success': True,
+            'heatmap': {
+                'precision': precision,
+                'from': time_from.isoformat(),
+                'to': time_to.isoformat(),
+                'max_count': cells_list[0]['count'] if cells_list else 0,
+                'cells': cells_list
+            }
+        })
+        
+    except Exception as e:
+        print(f"Heatmap error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
+# ==================== EXPORT ====================
+
+EXPORT_FILE_EXTENSIONS = {'ndjson': 'ndjson', 'csv': 'csv', 'parquet': 'parquet'}
+
+# Exports hold every user's individual reports and votes, only these user ids
+# (comma separated) may download them. Empty: nobody, use export.py instead.
+EXPORT_USER_IDS = {int(user_id) for user_id in os.getenv('EXPORT_USER_IDS', '').split(',') if user_id.strip()}
+
+@app.route('/api/export/<dataset>', methods=['GET'])
+def export_data(dataset):
+    """Stream all reports or votes in a time range as NDJSON, CSV or Parquet"""
+    try:
+        user_id, error = verify_token()
+        if error:
+            return jsonify({'success': False, 'message': error}), 401
+        
+        if user_id not in EXPORT_USER_IDS:
+            return jsonify({
+                'success': False,
+                'message': 'Exports are only available to analysts'
+            }), 403
+        
+        if dataset not in EXPORT_QUERIES:
+            return jsonify({
+                'success': False,
+                'message': 'Dataset must be reports or votes'
+            }), 404
+        
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({
+                'success': False,
+                'message': 'Format must be ndjson, csv or parquet'
+            }), 400
+        
+        if export_format == 'parquet' and not parquet_available():
+            return jsonify({
+                'success': False,
+                'message': 'Parquet export is not available on this server'
+            }), 400
+        
+        try:
+            time_from = parse_utc(request.args['from']) if 'from' in request.args else datetime(1970, 1, 1)
+            time_to = parse_utc(request.args['to']) if 'to' in request.args else datetime.utcnow()
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'from and to must be ISO dates'
+            }), 400
+        
+        types = [t for t in request.args.get('types', '').split(',') if t] or None
+        
+        conn = get_read_db(user_id)
+        if not conn:
+            return jsonify({
+                'success': False,
+                'message': 'Database connection failed'
+            }), 500
+        
+        def generate():
+            try:
+                yield from export_stream(conn, dataset, export_format, time_from, time_to, types)
+            except Exception as e:
+                # The status line is already sent, the client sees a truncated file
+                print(f"Export error: {e}")
+            finally:
+                conn.close()
+        
+        filename = f"{dataset}.{EXPORT_FILE_EXTENSIONS[export_format]}"
+        return Response(
+            stream_with_context(generate()),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+        
+    except Exception as e:
+        print(f"Export error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
 # ==================== RUN SERVER ====================
 
 if __name__ == '__main__':
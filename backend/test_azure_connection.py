@@ -61,7 +61,7 @@ try:
         for table in tables:
             print(f"  {table[0]}")
     else:
-        print("No tables found! Run database.sql to create them.")
+        print("No tables found! Run python migrate.py to create them.")
     
     cursor.close()
     conn.close()
@@ -0,0 +1,139 @@
+"""
+Group commit - one writer thread commits many requests' writes together.
+
+Request threads submit() an item and wait on the returned Future. The writer takes
+the first waiting item, keeps collecting until it has max_items or max_wait_ms has
+passed, writes the whole batch in one transaction on its own connection and hands
+every caller its result. Under a burst the database sees one commit per batch
+instead of one commit (and one new connection) per request, and no caller waits
+longer than max_wait_ms plus one batch for its turn.
+
+The queue is bounded: submit() raises queue.Full when max_queued items are
+waiting, so callers can shed load instead of piling up.
+
+If writing a batch fails, its items are retried one transaction each, so a bad item
+only fails its own caller. If the commit itself fails nobody knows whether the batch
+was saved, so it is not written again: every caller gets a psycopg.OperationalError.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import psycopg
+
+class CommitFailed(Exception):
+    """The commit of a batch raised, the batch may or may not have been saved"""
+
+class GroupCommitQueue:
+    """Bounded queue of writes committed in batches by a background writer thread"""
+
+    def __init__(self, write_batch, get_conn, max_items=64, max_wait_ms=5, max_queued=1000):
+        # write_batch(conn, items) writes the items without committing and returns one result per item
+        self.write_batch = write_batch
+        self.get_conn = get_conn
+        self.max_items = max_items
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.lock = threading.Lock()
+        self.started = False
+        self.batches = 0
+        self.committed = 0
+
+    def submit(self, item):
+        """Queue an item, return a Future resolved with its result once committed"""
+        future = Future()
+        self.queue.put_nowait((item, future))
+        self._start()
+        return future
+
+    def stats(self):
+        """Batches and items committed so far, and how many items are waiting"""
+        return {
+            'batches': self.batches,
+            'committed': self.committed,
+            'avg_batch_size': round(self.committed / self.batches, 2) if self.batches else 0,
+            'queued': self.queue.qsize()
+        }
+
+    def _start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _collect(self):
+        """Wait for an item, then gather more until the batch is full or max_wait has passed"""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_items:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, conn, batch):
+        results = self.write_batch(conn, [item for item, _ in batch])
+        try:
+            conn.commit()
+        except Exception as e:
+            raise CommitFailed(e) from e
+        self.batches += 1
+        self.committed += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _connection(self, conn):
+        """Return conn if usable, otherwise a new connection (None if that fails)"""
+        if conn is not None and not conn.closed:
+            return conn
+        return self.get_conn()
+
+    def _rollback(self, conn):
+        """Roll back a failed batch, drop the connection if it is broken"""
+        try:
+            conn.rollback()
+            return conn
+        except Exception:
+            conn.close()
+            return None
+
+    def _fail_unknown(self, batch, error):
+        print(f"Commit of {len(batch)} items failed, they may have been saved: {error.__cause__}")
+        for _, future in batch:
+            future.set_exception(psycopg.OperationalError(f'commit failed, the write may have been saved: {error.__cause__}'))
+
+    def _run(self):
+        conn = None
+        while True:
+            batch = self._collect()
+            conn = self._connection(conn)
+            if conn and len(batch) > 1:
+                try:
+                    self._write(conn, batch)
+                    continue
+                except CommitFailed as e:
+                    self._fail_unknown(batch, e)
+                    conn = self._rollback(conn)
+                    continue
+                except Exception as e:
+                    print(f"Group commit of {len(batch)} items failed, retrying one by one: {e}")
+                    conn = self._rollback(conn)
+            for entry in batch:
+                conn = self._connection(conn)
+                if not conn:
+                    entry[1].set_exception(ConnectionError('Database connection failed'))
+                    continue
+                try:
+                    self._write(conn, [entry])
+                except CommitFailed as e:
+                    self._fail_unknown([entry], e)
+                    conn = self._rollback(conn)
+                except Exception as e:
+                    conn = self._rollback(conn)
+                    entry[1].set_exception(e)
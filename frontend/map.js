@@ -50,8 +50,9 @@ require([
     "esri/symbols/SimpleMarkerSymbol",
     "esri/symbols/SimpleLineSymbol",
     "esri/symbols/SimpleFillSymbol",
-    "esri/core/reactiveUtils"
-], function(esriConfig, Map, MapView, GraphicsLayer, Graphic, Locate, BasemapGallery, Expand, Search, route, RouteParameters, FeatureSet, locator, Point, Circle, SimpleMarkerSymbol, SimpleLineSymbol, SimpleFillSymbol, reactiveUtils) {
+    "esri/core/reactiveUtils",
+    "esri/geometry/support/webMercatorUtils"
+], function(esriConfig, Map, MapView, GraphicsLayer, Graphic, Locate, BasemapGallery, Expand, Search, route, RouteParameters, FeatureSet, locator, Point, Circle, SimpleMarkerSymbol, SimpleLineSymbol, SimpleFillSymbol, reactiveUtils, webMercatorUtils) {
     
     // ArcGIS API Key - Set your key here for routing functionality
     // Get your free key at: https://developers.arcgis.com/
@@ -672,7 +673,9 @@ require([
             }),
             returnDirections: true,
             directionsLanguage: "en",
-            directionsLengthUnits: "kilometers"
+            directionsLengthUnits: "kilometers",
+            // Route paths in longitude / latitude, for the incidents along the route
+            outSpatialReference: { wkid: 4326 }
         });
         
         // Add polygon barriers if there are any incidents to avoid
@@ -706,6 +709,7 @@ require([
                 
                 // Display turn-by-turn directions
                 displayDirections(routeResult);
+                showIncidentsAlongRoute(routeResult.route.geometry);
             } else {
                 throw new Error("No route found between these locations.");
             }
@@ -771,6 +775,46 @@ require([
         directionsResults.innerHTML = html;
     }
     
+    // Incidents within ROUTE_CORRIDOR_METERS of the route, in the order the route reaches them
+    const ROUTE_CORRIDOR_METERS = 200;
+    
+    async function showIncidentsAlongRoute(routeGeometry) {
+        // Paths are [longitude, latitude] points, the API takes [latitude, longitude]
+        const path = routeGeometry.paths.flat().map(([longitude, latitude]) => [latitude, longitude]);
+        try {
+            const response = await fetch('http://localhost:5000/api/reports/route', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${token}`
+                },
+                body: JSON.stringify({ path: path, width_m: ROUTE_CORRIDOR_METERS })
+            });
+            if (!response.ok) return;
+            
+            const data = await response.json();
+            const reports = data.reports || [];
+            let html = '<div class="route-incidents">';
+            if (reports.length === 0) {
+                html += '<div class="route-incidents-title">✅ No incidents reported along this route</div>';
+            } else {
+                html += `<div class="route-incidents-title">⚠️ ${reports.length} incident${reports.length > 1 ? 's' : ''} along this route</div>`;
+                reports.forEach(report => {
+                    const typeLabel = report.type_name === 'POLICE' ? '🚔 Police' : '🚗 Accident';
+                    html += `<div class="route-incident">${typeLabel} <span>after ${(report.distance_along_route_m / 1000).toFixed(1)} km</span></div>`;
+                });
+            }
+            html += '</div>';
+            
+            const summary = directionsResults.querySelector('.route-summary');
+            if (summary) {
+                summary.insertAdjacentHTML('afterend', html);
+            }
+        } catch (error) {
+            console.error('Error loading incidents along the route:', error);
+        }
+    }
+    
     // Format time in minutes to hours and minutes
     function formatTime(minutes) {
         if (minutes < 60) {
@@ -966,27 +1010,59 @@ require([
     // REAL-TIME UPDATES (POLLING)
     // ==========================================
     let knownReportIds = new Set();
+    // Highest report id seen so far, only reports above it are announced as new
+    let newestReportId = null;
+    
+    // At most this many reports are shown, the newest ones (REPORTS_MAX_PAGE_SIZE on the server)
+    const REPORTS_LIMIT = 500;
+    // A report that got 503 or no answer is sent again this many times
+    const REPORT_RETRIES = 2;
+    
+    // The visible part of the map as bounding box query parameters, empty before the map is ready
+    function visibleBboxParams() {
+        if (!view.extent) return '';
+        const extent = webMercatorUtils.webMercatorToGeographic(view.extent);
+        if (extent.xmin > extent.xmax) return '';
+        return `&min_lat=${Math.max(extent.ymin, -90)}&min_lon=${Math.max(extent.xmin, -180)}` +
+               `&max_lat=${Math.min(extent.ymax, 90)}&max_lon=${Math.min(extent.xmax, 180)}`;
+    }
+    
+    // One page of GET /api/reports for the visible part of the map, newest first.
+    // Returns null if the request fails.
+    async function fetchActiveReports() {
+        const url = `http://localhost:5000/api/reports?limit=${REPORTS_LIMIT}${visibleBboxParams()}`;
+        const response = await fetch(url, {
+            headers: {
+                'Authorization': `Bearer ${token}`
+            }
+        });
+        if (!response.ok) return null;
+        
+        const data = await response.json();
+        return data.success ? (data.reports || []) : null;
+    }
+    
+    // Poll for new reports every 5 seconds and whenever the map stops moving.
+    // A poll that comes while one is running runs once more after it.
+    let pollRunning = false;
+    let pollAgain = false;
     
-    // Poll for new reports every 5 seconds
     async function pollForNewReports() {
+        if (pollRunning) {
+            pollAgain = true;
+            return;
+        }
+        pollRunning = true;
         try {
-            const response = await fetch('http://localhost:5000/api/reports', {
-                headers: {
-                    'Authorization': `Bearer ${token}`
-                }
-            });
-            
-            if (!response.ok) return;
-            
-            const data = await response.json();
+            const reports = await fetchActiveReports();
+            if (!reports) return;
             
             // Get the set of active report IDs from the server
-            const activeReportIds = new Set(data.reports?.map(r => r.id) || []);
+            const activeReportIds = new Set(reports.map(r => r.id));
             
-            // Remove expired reports from the map (reports we have locally but not on server)
+            // Remove reports that expired, were removed or are no longer in view
             knownReportIds.forEach(reportId => {
                 if (!activeReportIds.has(reportId)) {
-                    console.log('Report expired or removed:', reportId);
                     const graphicToRemove = incidentsLayer.graphics.find(g => g.reportId === reportId);
                     if (graphicToRemove) {
                         incidentsLayer.remove(graphicToRemove);
@@ -996,56 +1072,98 @@ require([
             });
             
             // Add new reports
-            if (data.reports && data.reports.length > 0) {
-                data.reports.forEach(report => {
+            if (reports.length > 0) {
+                reports.forEach(report => {
                     // Only add new reports that we haven't seen
                     if (!knownReportIds.has(report.id)) {
-                        console.log('New report detected:', report);
                         addIncidentToMap(report);
                         knownReportIds.add(report.id);
                         
-                        // Show notification for new reports from other users
-                        if (report.user_id !== user.id) {
+                        // Show notification for new reports from other users, not for
+                        // older ones that came into view
+                        if (newestReportId !== null && report.id > newestReportId && report.user_id !== user.id) {
+                            console.log('New report detected:', report);
                             const typeLabel = report.type_name === 'POLICE' ? '🚔 Police' : '🚗 Accident';
                             showToast(`New ${typeLabel} reported nearby!`, 'success');
                         }
                     }
                 });
+                newestReportId = Math.max(newestReportId ?? 0, ...reports.map(r => r.id));
             }
         } catch (error) {
             console.error('Error polling for reports:', error);
+        } finally {
+            pollRunning = false;
+            if (pollAgain) {
+                pollAgain = false;
+                pollForNewReports();
+            }
         }
     }
     
-    // Load incidents and start polling for real-time updates
-    async function loadIncidentsAndStartPolling() {
+    // Alerts for reports inside the user's subscribed areas (POST /api/subscriptions)
+    let lastNotificationId = null;
+    
+    async function pollNotifications() {
         try {
-            const response = await fetch('http://localhost:5000/api/reports', {
+            const url = 'http://localhost:5000/api/notifications' + (lastNotificationId !== null ? `?after=${lastNotificationId}` : '');
+            const response = await fetch(url, {
                 headers: {
                     'Authorization': `Bearer ${token}`
                 }
             });
             
-            if (!response.ok) {
+            if (!response.ok) return;
+            
+            const data = await response.json();
+            const notifications = data.notifications || [];
+            
+            // The first call only tells us where to start, older alerts are not shown again
+            if (lastNotificationId !== null) {
+                notifications.forEach(notification => {
+                    const typeLabel = notification.type_name === 'POLICE' ? '🚔 Police' : '🚗 Accident';
+                    showToast(`${typeLabel} reported in ${notification.subscription_name || 'your area'}!`, 'success');
+                });
+            }
+            if (notifications.length > 0) {
+                lastNotificationId = notifications[notifications.length - 1].id;
+            } else if (lastNotificationId === null) {
+                lastNotificationId = 0;
+            }
+        } catch (error) {
+            console.error('Error polling notifications:', error);
+        }
+    }
+    
+    // Load incidents and start polling for real-time updates
+    async function loadIncidentsAndStartPolling() {
+        try {
+            const reports = await fetchActiveReports();
+            
+            if (!reports) {
                 console.log('No incidents loaded yet');
                 // Still start polling even if no initial incidents
                 setInterval(pollForNewReports, 5000);
                 return;
             }
             
-            const data = await response.json();
-            console.log(`Loaded ${data.reports?.length || 0} incidents`);
+            console.log(`Loaded ${reports.length} incidents`);
             
             // Add incidents to map and track their IDs
-            if (data.reports && data.reports.length > 0) {
-                data.reports.forEach(incident => {
+            if (reports.length > 0) {
+                reports.forEach(incident => {
                     addIncidentToMap(incident);
                     knownReportIds.add(incident.id);
                 });
             }
+            newestReportId = Math.max(0, ...reports.map(r => r.id));
             
-            // Start polling for new reports every 5 seconds
+            // Start polling for new reports and area alerts every 5 seconds, and
+            // load the reports of the new area whenever the map stops moving
             setInterval(pollForNewReports, 5000);
+            reactiveUtils.when(() => view.stationary, pollForNewReports);
+            pollNotifications();
+            setInterval(pollNotifications, 5000);
             console.log('Started real-time polling for new reports');
             
         } catch (error) {
@@ -1061,13 +1179,10 @@ require([
         // Function to refresh all reports from server
         async function refreshReports() {
             try {
-                const response = await fetch('http://localhost:5000/api/reports', {
-                    headers: { 'Authorization': `Bearer ${token}` }
-                });
-                const data = await response.json();
+                const reports = await fetchActiveReports();
                 
-                if (data.success && data.reports) {
-                    const currentReportIds = new Set(data.reports.map(r => r.id));
+                if (reports) {
+                    const currentReportIds = new Set(reports.map(r => r.id));
                     
                     // Remove reports no longer in the list
                     incidentsLayer.graphics.toArray().forEach(graphic => {
@@ -1079,7 +1194,7 @@ require([
                     });
                     
                     // Update or add reports
-                    data.reports.forEach(report => {
+                    reports.forEach(report => {
                         const existingGraphic = incidentsLayer.graphics.find(g => g.attributes?.id === report.id);
                         if (existingGraphic) {
                             // Remove and re-add to update popup content
@@ -1276,19 +1391,32 @@ require([
             reportOptions.forEach(opt => opt.disabled = true);
             
             try {
-                const response = await fetch('http://localhost:5000/api/reports', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                        'Authorization': `Bearer ${token}`
-                    },
-                    body: JSON.stringify({
-                        latitude: pendingReportLocation.latitude,
-                        longitude: pendingReportLocation.longitude,
-                        type: reportType,
-                        description: ''
-                    })
+                // Retries send the same key, so the report is saved at most once
+                const idempotencyKey = crypto.randomUUID();
+                const body = JSON.stringify({
+                    latitude: pendingReportLocation.latitude,
+                    longitude: pendingReportLocation.longitude,
+                    type: reportType,
+                    description: ''
                 });
+                let response;
+                for (let attempt = 0; ; attempt++) {
+                    try {
+                        response = await fetch('http://localhost:5000/api/reports', {
+                            method: 'POST',
+                            headers: {
+                                'Content-Type': 'application/json',
+                                'Authorization': `Bearer ${token}`,
+                                'Idempotency-Key': idempotencyKey
+                            },
+                            body: body
+                        });
+                        if (response.status !== 503 || attempt >= REPORT_RETRIES) break;
+                    } catch (error) {
+                        if (attempt >= REPORT_RETRIES) throw error;
+                    }
+                    await new Promise(resolve => setTimeout(resolve, 1000 * (attempt + 1)));
+                }
                 
                 const data = await response.json();
                 
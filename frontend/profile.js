@@ -65,6 +65,8 @@ async function loadProfile() {
             document.getElementById('username').textContent = userData.username;
             document.getElementById('email').textContent = userData.email;
             document.getElementById('reputationScore').textContent = userData.reputation_score || 0;
+            document.getElementById('leaderboardRank').textContent = userData.rank ? `#${userData.rank}` : '-';
+            document.getElementById('activityCounts').textContent = `${userData.report_count || 0} reports / ${userData.vote_count || 0} votes`;
             
             // Format created_at date
             const createdDate = new Date(userData.created_at);